@@ -17,6 +17,8 @@ from pathlib import Path
 REPO_ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(REPO_ROOT))
 
+from services.etl import columnar  # noqa: E402
+
 
 def load_jsonl(path):
     """Load JSONL file."""
@@ -51,11 +53,12 @@ def augment_gold_with_llm(validate=True):
     # Load LLM extractions
     llm_path = REPO_ROOT / "fixtures" / "enriched" / "entities" / "run=llm" / "part-000.jsonl"
     
-    if not llm_path.exists():
+    if columnar.entity_part(llm_path) is None:
         print("ERROR: No LLM extractions found. Run: EXTRACTOR=llm python services/etl/etl_local.py")
         return
     
-    llm_entities = load_jsonl(llm_path)
+    # Reads the Parquet part instead when the ETL wrote one
+    llm_entities = columnar.read_entity_rows(llm_path)
     print(f"Loaded {len(llm_entities)} LLM entities")
     
     # Filter LLM entities if validating
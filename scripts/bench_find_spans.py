@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark rule_extract.find_spans (compiled term matcher) against the legacy
+one-regex-per-term scan, and check both return identical spans.
+
+Runs over fixtures/notes with the rule dictionaries and with the larger
+enhanced-extractor dictionaries to show how each approach scales.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Sequence, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.etl.rule_extract import (  # noqa: E402
+    DOSAGE_RE,
+    MEDICATION_TERMS,
+    PROBLEM_TERMS,
+    find_spans,
+)
+from services.extractors.enhanced_rule_extract import (  # noqa: E402
+    EnhancedRuleExtractor,
+)
+
+NOTES_DIR = REPO_ROOT / "fixtures" / "notes"
+
+
+def legacy_find_spans(
+    text: str, terms: Iterable[str], with_dose: bool = False
+) -> Iterator[Tuple[int, int, str, str]]:
+    for term in terms:
+        pattern = (
+            rf"\b({re.escape(term)}){DOSAGE_RE}\b"
+            if with_dose
+            else rf"\b({re.escape(term)})\b"
+        )
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            yield match.start(), match.end(), text[
+                match.start() : match.end()
+            ], match.group(1).lower()
+
+
+def load_texts(limit: int) -> List[str]:
+    texts = []
+    for path in sorted(NOTES_DIR.glob("*.json"))[: limit or None]:
+        with path.open("r", encoding="utf-8") as fh:
+            texts.append(json.load(fh).get("text", "") or "")
+    return texts
+
+
+def time_scan(fn: Callable, texts: Sequence[str], terms, with_dose: bool):
+    start = time.perf_counter()
+    results = [list(fn(text, terms, with_dose)) for text in texts]
+    return time.perf_counter() - start, results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, default=500, help="Notes to scan (0=all).")
+    args = parser.parse_args()
+
+    texts = load_texts(args.limit)
+    enhanced = EnhancedRuleExtractor()
+    suites = [
+        ("rule problems", PROBLEM_TERMS, False),
+        ("rule medications", MEDICATION_TERMS, True),
+        (
+            "enhanced dictionaries",
+            sorted(enhanced.problems | enhanced.medications | enhanced.tests),
+            True,
+        ),
+    ]
+
+    print(f"[bench] notes={len(texts)} chars={sum(len(t) for t in texts)}")
+    ok = True
+    for label, terms, with_dose in suites:
+        legacy_s, legacy_rows = time_scan(legacy_find_spans, texts, terms, with_dose)
+        trie_s, trie_rows = time_scan(find_spans, texts, terms, with_dose)
+        same = legacy_rows == trie_rows
+        ok = ok and same
+        print(
+            f"[bench] {label:22s} terms={len(terms):4d} "
+            f"legacy={legacy_s * 1000:8.1f}ms matcher={trie_s * 1000:8.1f}ms "
+            f"speedup={legacy_s / trie_s if trie_s else 0:5.1f}x parity={'OK' if same else 'MISMATCH'}"
+        )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
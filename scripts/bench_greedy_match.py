@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark services.eval.matching.greedy_match (indexed) against the legacy
+pairwise bucket scan, and check both return identical matches.
+
+The gold set is synthesized by sampling spans from the LOCAL predictions so
+it can be grown well past the 330 rows in gold/gold_DEMO.jsonl. --notes folds
+everything into fewer, denser notes (long discharge summaries) where the
+per-bucket pairwise scan hurts most.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.etl import columnar  # noqa: E402
+from services.eval.matching import greedy_match, matchable  # noqa: E402
+
+PRED_PATH = REPO_ROOT / "fixtures/enriched/entities/run=LOCAL/part-000.jsonl"
+
+
+def legacy_greedy_match(
+    golds: List[Dict], preds: List[Dict], relaxed: bool = False
+) -> Tuple[Set[int], Set[int]]:
+    used_pred: Set[int] = set()
+    used_gold: Set[int] = set()
+    buckets: Dict = defaultdict(lambda: {"g": [], "p": []})
+    for gi, gold in enumerate(golds):
+        buckets[(gold["note_id"], gold["entity_type"])]["g"].append((gi, gold))
+    for pi, pred in enumerate(preds):
+        buckets[(pred["note_id"], pred["entity_type"])]["p"].append((pi, pred))
+    for group in buckets.values():
+        for gi, g in group["g"]:
+            for pi, p in group["p"]:
+                if pi in used_pred:
+                    continue
+                if matchable(g, p, relaxed=relaxed):
+                    used_pred.add(pi)
+                    used_gold.add(gi)
+                    break
+    return used_gold, used_pred
+
+
+def fold_notes(rows: List[Dict], notes: int) -> List[Dict]:
+    """Concatenate notes round-robin into `notes` long notes."""
+    if not notes:
+        return rows
+    order = {nid: i for i, nid in enumerate(sorted({r["note_id"] for r in rows}))}
+    folded = []
+    for row in rows:
+        slot = order[row["note_id"]]
+        offset = (slot // notes) * 10_000
+        folded.append(
+            dict(
+                row,
+                note_id=f"dense_{slot % notes:04d}",
+                begin=row["begin"] + offset,
+                end=row["end"] + offset,
+            )
+        )
+    return folded
+
+
+def synth_gold(preds: List[Dict], size: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    golds = []
+    for _ in range(size):
+        row = dict(rng.choice(preds))
+        shift = rng.choice((0, 0, 0, -2, 3))
+        row["begin"] = max(0, row["begin"] + shift)
+        row["end"] = row["end"] + shift
+        golds.append(row)
+    return golds
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pred", default=str(PRED_PATH), help="Predictions JSONL.")
+    parser.add_argument(
+        "--gold-sizes", default="330,3000,30000", help="Comma-separated gold sizes."
+    )
+    parser.add_argument(
+        "--notes", type=int, default=0, help="Fold predictions into N notes (0=off)."
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    pred_path = Path(args.pred)
+    if columnar.entity_part(pred_path) is None:
+        print(f"[bench] missing {pred_path}; run `make etl-local` first")
+        return 1
+    # Reads the Parquet part instead when the ETL wrote one
+    preds = columnar.read_entity_rows(pred_path)
+    preds = fold_notes(preds, args.notes)
+
+    ok = True
+    for size in (int(s) for s in args.gold_sizes.split(",") if s):
+        golds = synth_gold(preds, size, args.seed)
+        for relaxed in (False, True):
+            start = time.perf_counter()
+            legacy = legacy_greedy_match(golds, preds, relaxed=relaxed)
+            legacy_s = time.perf_counter() - start
+            start = time.perf_counter()
+            indexed = greedy_match(golds, preds, relaxed=relaxed)
+            indexed_s = time.perf_counter() - start
+            same = legacy == indexed
+            ok = ok and same
+            print(
+                f"[bench] gold={size:6d} preds={len(preds)} "
+                f"{'relaxed' if relaxed else 'strict ':7s} tp={len(indexed[0]):6d} "
+                f"legacy={legacy_s * 1000:8.1f}ms indexed={indexed_s * 1000:7.1f}ms "
+                f"parity={'OK' if same else 'MISMATCH'}"
+            )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark a full corpus scan (open + parse every note) from the per-file
+notes directory against the packed corpus, and check both yield the same
+notes in the same order.
+
+Each scan runs in a fresh subprocess so the reader starts cold, as the ETL,
+validator and API do; the OS page cache is left warm.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.etl import note_corpus  # noqa: E402
+
+NOTES_DIR = REPO_ROOT / "fixtures" / "notes"
+
+SCAN = """
+import hashlib, sys, time
+sys.path.append({root!r})
+from services.etl.note_corpus import open_corpus
+start = time.perf_counter()
+corpus = open_corpus({path!r})
+digest = hashlib.sha256()
+for name in corpus.names():
+    note = corpus.load(name)
+    digest.update(name.encode() + note.get("note_id", "").encode())
+print(time.perf_counter() - start, len(corpus), digest.hexdigest())
+"""
+
+
+def cold_scan(path: Path):
+    out = subprocess.run(
+        [sys.executable, "-c", SCAN.format(root=str(REPO_ROOT), path=str(path))],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return float(out[0]) * 1000, int(out[1]), out[2]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", default=str(NOTES_DIR), help="Notes directory.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    notes_dir = Path(args.notes)
+    if not notes_dir.is_dir():
+        print(f"[bench] missing {notes_dir}; run `make ingest-100` first")
+        return 1
+    with tempfile.TemporaryDirectory() as tmp:
+        pack_path = Path(tmp) / "notes.pack"
+        note_corpus.pack(notes_dir, pack_path)
+        results = {}
+        for label, path in (("files", notes_dir), ("packed", pack_path)):
+            runs = [cold_scan(path) for _ in range(args.repeat)]
+            results[label] = (statistics.median(r[0] for r in runs), runs[0][1:])
+        same = results["files"][1] == results["packed"][1]
+        for label, (ms, (count, _)) in results.items():
+            print(f"[bench] {label:6s} notes={count} scan={ms:8.1f}ms")
+        speedup = results["files"][0] / max(results["packed"][0], 1e-9)
+        print(f"[bench] speedup={speedup:.2f}x parity={'OK' if same else 'MISMATCH'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark etl_cloud's S3 note prefetch against sequential reads using moto
+as a local S3 stand-in, with an injected per-request round-trip latency.
+
+Requires moto (pip install -r requirements-dev.txt).
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+NOTES_DIR = REPO_ROOT / "fixtures" / "notes"
+BUCKET = "hc-tap-bench-raw"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark S3 note prefetch.")
+    parser.add_argument("--notes", type=int, default=200, help="Notes to upload.")
+    parser.add_argument(
+        "--latency-ms", type=float, default=20.0, help="Simulated GET round trip."
+    )
+    parser.add_argument(
+        "--in-flight",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16, 32],
+        help="Concurrency limits to compare (1 = sequential).",
+    )
+    args = parser.parse_args()
+
+    try:
+        from moto import mock_aws
+    except ImportError:
+        print("[bench] moto not installed: pip install -r requirements-dev.txt")
+        return 1
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+
+    with mock_aws():
+        from services.etl import etl_cloud
+
+        s3 = etl_cloud.s3
+        s3.create_bucket(Bucket=BUCKET)
+        keys = []
+        for path in sorted(NOTES_DIR.glob("*.json"))[: args.notes]:
+            key = f"notes/{path.name}"
+            s3.put_object(Bucket=BUCKET, Key=key, Body=path.read_bytes())
+            keys.append(key)
+
+        def add_latency(**_kwargs):
+            time.sleep(args.latency_ms / 1000)
+
+        s3.meta.events.register("before-send.s3.GetObject", add_latency)
+
+        print(f"[bench] notes={len(keys)} simulated_latency={args.latency_ms:.0f}ms")
+        baseline = None
+        for limit in args.in_flight:
+            start = time.perf_counter()
+            bodies = 0
+            for key, fetched in etl_cloud.prefetch_s3_notes(BUCKET, keys, limit):
+                note = fetched.result()
+                bodies += 1 if note.get("note_id") else 0
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"[bench] in_flight={limit:3d} notes={bodies} "
+                f"elapsed={elapsed * 1000:8.1f}ms "
+                f"notes_per_s={bodies / elapsed:7.1f} speedup={baseline / elapsed:5.1f}x"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark API /search filtering: the legacy list scan against EntityIndex,
+across corpus sizes, and check both return identical results.
+
+Corpora are built by replicating the LOCAL entity part (note ids are
+suffixed per copy) up to each requested size.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.api.search_index import EntityIndex  # noqa: E402
+from services.etl import columnar  # noqa: E402
+
+PRED_PATH = REPO_ROOT / "fixtures/enriched/entities/run=LOCAL/part-000.jsonl"
+QUERIES = [
+    (None, None),
+    (None, "MEDICATION"),
+    ("asthma", None),
+    ("pain", "PROBLEM"),
+    ("in", None),
+    ("metformin", "MEDICATION"),
+    ("zzzz-not-there", None),
+]
+
+
+def legacy_search(
+    entities: List[Dict], q: Optional[str], entity_type: Optional[str], limit: int
+) -> List[Dict]:
+    items = entities
+    if entity_type:
+        items = [e for e in items if e.get("entity_type") == entity_type]
+    if q:
+        ql = q.lower()
+        items = [e for e in items if (e.get("norm_text") and ql in e.get("norm_text"))]
+    return items[:limit]
+
+
+def build_corpus(base: List[Dict], size: int) -> List[Dict]:
+    corpus: List[Dict] = []
+    copy = 0
+    while len(corpus) < size:
+        for row in base[: size - len(corpus)]:
+            corpus.append(dict(row, note_id=f"{row['note_id']}_{copy}"))
+        copy += 1
+    return corpus
+
+
+def time_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pred", default=str(PRED_PATH), help="Entities JSONL.")
+    parser.add_argument(
+        "--sizes", default="10000,100000,1000000", help="Comma-separated corpus sizes."
+    )
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pred_path = Path(args.pred)
+    if columnar.entity_part(pred_path) is None:
+        print(f"[bench] missing {pred_path}; run `make etl-local` first")
+        return 1
+    # Reads the Parquet part instead when the ETL wrote one
+    base = columnar.read_entity_rows(pred_path)
+
+    ok = True
+    for size in (int(s) for s in args.sizes.split(",") if s):
+        corpus = build_corpus(base, size)
+        start = time.perf_counter()
+        index = EntityIndex(corpus)
+        build_ms = (time.perf_counter() - start) * 1000
+        legacy_total = indexed_total = 0.0
+        for q, entity_type in QUERIES:
+            same = legacy_search(corpus, q, entity_type, args.limit) == index.search(
+                q, entity_type, args.limit
+            )
+            ok = ok and same
+            legacy_total += time_ms(
+                lambda: legacy_search(corpus, q, entity_type, args.limit), args.repeat
+            )
+            indexed_total += time_ms(
+                lambda: index.search(q, entity_type, args.limit), args.repeat
+            )
+            if not same:
+                print(f"[bench] MISMATCH size={size} q={q!r} type={entity_type}")
+        n = len(QUERIES)
+        print(
+            f"[bench] entities={size:8d} build={build_ms:8.1f}ms "
+            f"legacy={legacy_total / n:8.2f}ms/query "
+            f"indexed={indexed_total / n:6.3f}ms/query"
+        )
+    print(f"[bench] parity={'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark SpacyExtractor on the notes corpus: one nlp(text) call per note
+against extract_batch (nlp.pipe), reporting notes/sec for each and checking
+both produce the same entities. With --worker local|docker, also time the
+persistent spaCy worker used by EXTRACTOR=docker-spacy (its standalone
+extractor labels entities differently, so it is timed but not compared).
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.etl.note_corpus import open_corpus  # noqa: E402
+from services.etl.preprocess import normalize_text  # noqa: E402
+from services.extractors.spacy_extract import SpacyExtractor  # noqa: E402
+
+NOTES_DIR = REPO_ROOT / "fixtures" / "notes"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", default=str(NOTES_DIR), help="Notes dir or pack.")
+    parser.add_argument("--limit", type=int, default=0, help="Notes to use (0 = all).")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--n-process", type=int, default=1)
+    parser.add_argument(
+        "--worker", choices=("local", "docker"), help="Also time the spaCy worker."
+    )
+    args = parser.parse_args()
+
+    if not Path(args.notes).exists():
+        print(f"[bench] missing {args.notes}; run `make ingest-100` first")
+        return 1
+    corpus = open_corpus(args.notes)
+    names = corpus.names()[: args.limit or None]
+    notes = []
+    for name in names:
+        note = corpus.load(name)
+        notes.append(dict(note, text=normalize_text(note.get("text", ""))))
+
+    extractor = SpacyExtractor(batch_size=args.batch_size, n_process=args.n_process)
+    print(
+        f"[bench] model={extractor.model_name} notes={len(notes)} "
+        f"disabled={extractor.disabled_components}"
+    )
+    extractor.extract_batch(notes[:2], "BENCH")  # warm up
+
+    start = time.perf_counter()
+    per_note = [extractor.extract(n["text"], n["note_id"], "BENCH") for n in notes]
+    per_note_s = time.perf_counter() - start
+    start = time.perf_counter()
+    batched = extractor.extract_batch(notes, "BENCH")
+    batched_s = time.perf_counter() - start
+
+    timings = [("per-note", per_note_s), ("batched", batched_s)]
+    if args.worker:
+        from services.extractors.docker_spacy_extract import DockerSpacyExtractor
+
+        worker = DockerSpacyExtractor(mode=args.worker)
+        start = time.perf_counter()
+        worker.extract_batch(notes, "BENCH")
+        timings.append((f"worker-{args.worker}", time.perf_counter() - start))
+        worker.close()
+
+    same = per_note == batched
+    for label, seconds in timings:
+        rate = len(notes) / max(seconds, 1e-9)
+        print(f"[bench] {label:12s} {seconds * 1000:9.1f}ms {rate:8.1f} notes/sec")
+    speedup = per_note_s / max(batched_s, 1e-9)
+    print(f"[bench] speedup={speedup:.2f}x parity={'OK' if same else 'MISMATCH'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,6 +21,8 @@ REPO_ROOT = Path(__file__).resolve().parents[1]
 if str(REPO_ROOT) not in sys.path:
     sys.path.append(str(REPO_ROOT))
 
+from services.etl import columnar  # noqa: E402
+
 PRED_PATH = Path("fixtures/enriched/entities/run=LOCAL/part-000.jsonl")
 GOLD_PATH = Path("gold/gold_LOCAL.jsonl")
 DRAFT_PATH = Path("gold/gold_DRAFT.jsonl")
@@ -48,7 +50,8 @@ def gather_note_ids(rows: Iterable[Dict]) -> set[str]:
 
 
 def main() -> None:
-    preds = load_jsonl(PRED_PATH)
+    # Reads the Parquet part instead when the ETL wrote one
+    preds = columnar.read_entity_rows(PRED_PATH)
     if not preds:
         print(
             f"[gold-bootstrap] No predictions found at {PRED_PATH}. Run `make etl-local` first."
@@ -6,9 +6,16 @@ Provide a per-note relaxed evaluation report to surface FP-heavy notes.
 from __future__ import annotations
 
 import json
+import sys
 from pathlib import Path
 from typing import Dict, List, Set, Tuple
 
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.etl import columnar  # noqa: E402
+
 GOLD_PATH = Path("gold/gold_LOCAL.jsonl")
 PRED_PATH = Path("fixtures/enriched/entities/run=LOCAL/part-000.jsonl")
 TYPES = ("PROBLEM", "MEDICATION")
@@ -78,7 +85,8 @@ def greedy_match(golds: List[Dict], preds: List[Dict]) -> Tuple[Set[int], Set[in
 
 
 def per_note_report() -> None:
-    preds = dedupe(load_jsonl(PRED_PATH))
+    # Reads the Parquet part instead when the ETL wrote one
+    preds = dedupe(columnar.read_entity_rows(PRED_PATH))
     golds = dedupe(load_jsonl(GOLD_PATH))
 
     if not preds or not golds:
@@ -7,8 +7,15 @@ Outputs data/missing_note_ids.txt (one per line).
 from __future__ import annotations
 
 import json
+import sys
 from pathlib import Path
 
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.etl import columnar  # noqa: E402
+
 GOLD_PATH = Path("gold/gold_LOCAL.jsonl")
 PRED_PATH = Path("fixtures/enriched/entities/run=LOCAL/part-000.jsonl")
 OUTPUT_PATH = Path("data/missing_note_ids.txt")
@@ -35,7 +42,12 @@ def load_note_ids(path: Path) -> set[str]:
 
 def main() -> None:
     gold_ids = load_note_ids(GOLD_PATH)
-    pred_ids = load_note_ids(PRED_PATH)
+    # Reads the Parquet part instead when the ETL wrote one
+    pred_ids = {
+        row["note_id"]
+        for row in columnar.read_entity_rows(PRED_PATH)
+        if row.get("note_id")
+    }
 
     missing = sorted(gold_ids - pred_ids)
     OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
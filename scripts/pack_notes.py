@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Pack fixtures/notes/*.json into a single memory-mapped corpus file, or
+unpack one back into per-note files (see services/etl/note_corpus.py).
+
+    python scripts/pack_notes.py pack                  # -> fixtures/notes.pack
+    python scripts/pack_notes.py unpack --out /tmp/notes
+    NOTES_DIR=fixtures/notes.pack make etl-local       # readers take either
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.etl import note_corpus  # noqa: E402
+
+NOTES_DIR = Path("fixtures/notes")
+PACK_PATH = Path("fixtures/notes.pack")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="Pack a notes directory into one file.")
+    pack.add_argument("--src", default=str(NOTES_DIR))
+    pack.add_argument("--out", default=str(PACK_PATH))
+    unpack = sub.add_parser("unpack", help="Write a pack back out as files.")
+    unpack.add_argument("--src", default=str(PACK_PATH))
+    unpack.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    src = Path(args.src)
+    if not src.exists():
+        print(f"[pack] missing {src}")
+        return 1
+    if args.command == "unpack" and not src.is_file():
+        print(f"[pack] {src} is not a pack file")
+        return 1
+
+    start = time.perf_counter()
+    if args.command == "pack":
+        count = note_corpus.pack(src, args.out)
+        size = Path(args.out).stat().st_size
+        detail = f"{size / 1e6:.1f} MB"
+    else:
+        count = note_corpus.unpack(src, args.out)
+        detail = "files"
+    elapsed = time.perf_counter() - start
+    print(
+        f"[pack] {args.command}: {count} notes {src} -> {args.out} ({detail}) "
+        f"in {elapsed:.2f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
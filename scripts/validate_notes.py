@@ -1,18 +1,26 @@
 #!/usr/bin/env python3
 """
 Validate fixtures/notes/*.json against contracts/note.schema.json,
-enforcing unique note_id and non-empty text.
+enforcing unique note_id and non-empty text. NOTES_DIR may also point at a
+packed corpus (scripts/pack_notes.py).
 """
 
 from __future__ import annotations
 
 import json
+import os
 import sys
 from pathlib import Path
 
 from jsonschema import Draft202012Validator
 
-NOTES_DIR = Path("fixtures/notes")
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.etl.note_corpus import open_corpus  # noqa: E402
+
+NOTES_DIR = Path(os.getenv("NOTES_DIR", "fixtures/notes"))
 NOTE_SCHEMA = Path("contracts/note.schema.json")
 
 
@@ -32,13 +40,14 @@ def main() -> int:
     note_ids = set()
     errors = []
 
-    for note_path in sorted(NOTES_DIR.glob("*.json")):
-        with note_path.open("r", encoding="utf-8") as fh:
-            try:
-                note = json.load(fh)
-            except json.JSONDecodeError as exc:
-                errors.append(f"{note_path}: invalid JSON ({exc})")
-                continue
+    corpus = open_corpus(NOTES_DIR)
+    for name in corpus.names():
+        note_path = corpus.label(name)
+        try:
+            note = corpus.load(name)
+        except json.JSONDecodeError as exc:
+            errors.append(f"{note_path}: invalid JSON ({exc})")
+            continue
 
         for err in validator.iter_errors(note):
             errors.append(f"{note_path}: {err.message}")
@@ -1,3 +1,4 @@
+import io
 import json
 import os
 from pathlib import Path
@@ -51,28 +52,58 @@ def load_entities(path: str, run_id: str = None):
             import boto3
 
             s3 = boto3.client("s3")
-            # Cloud entities are at: s3://hc-tap-enriched-entities/runs/{run_id}/entities.jsonl
+            # Cloud entities are at: s3://hc-tap-enriched-entities/entities/run={run_id}/part-*.jsonl
             bucket = "hc-tap-enriched-entities"
-            key = f"runs/{run_id}/entities.jsonl"
-
-            resp = s3.get_object(Bucket=bucket, Key=key)
-            body = resp["Body"].read().decode("utf-8")
-
-            for line in body.split("\n"):
-                line = line.strip()
-                if line:
-                    try:
-                        rows.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        log("Skipping malformed JSON in S3 object")
-
-            log(f"Loaded {len(rows)} entities from S3: {bucket}/{key}")
+            paginator = s3.get_paginator("list_objects_v2")
+
+            # Prefer the Parquet copy (ENTITY_FORMAT=parquet|both) when present
+            parquet_prefix = f"entities_parquet/run={run_id}/part-"
+            parquet_keys = []
+            for page in paginator.paginate(Bucket=bucket, Prefix=parquet_prefix):
+                parquet_keys.extend(obj["Key"] for obj in page.get("Contents", []))
+            if parquet_keys:
+                frames = [
+                    pd.read_parquet(
+                        io.BytesIO(s3.get_object(Bucket=bucket, Key=key)["Body"].read()),
+                        partitioning=None,
+                    )
+                    for key in sorted(parquet_keys)
+                ]
+                log(f"Loaded {len(parquet_keys)} Parquet part(s) from S3: {bucket}")
+                return pd.concat(frames, ignore_index=True)
+
+            prefix = f"entities/run={run_id}/part-"
+            keys = []
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                keys.extend(obj["Key"] for obj in page.get("Contents", []))
+            if not keys:
+                # Runs written before part files used a single object
+                keys = [f"runs/{run_id}/entities.jsonl"]
+
+            for key in sorted(keys):
+                resp = s3.get_object(Bucket=bucket, Key=key)
+                for line in resp["Body"].iter_lines():
+                    line = line.strip()
+                    if line:
+                        try:
+                            rows.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            log("Skipping malformed JSON in S3 object")
+
+            log(f"Loaded {len(rows)} entities from S3: {bucket}/{prefix}*")
             return pd.DataFrame(rows)
         except Exception as e:
             log(f"Error loading from S3: {e}, falling back to local")
 
-    # Fallback to local file
+    # Fallback to local file, preferring its Parquet sibling
     p = Path(path)
+    parquet_path = p.with_suffix(".parquet")
+    if parquet_path.exists():
+        try:
+            # partitioning=None: no "run" column inferred from run=<id>/
+            return pd.read_parquet(parquet_path, partitioning=None)
+        except Exception as e:
+            log(f"Error reading {parquet_path}: {e}, falling back to {p}")
     if not p.exists():
         return pd.DataFrame(rows)
     with p.open("r", encoding="utf-8") as fh:
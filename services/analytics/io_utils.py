@@ -56,16 +56,25 @@ def infer_runs_from_folders(base_path: str) -> List[str]:
 
 
 def load_entities_for_run(base_path: str, run_id: str) -> pd.DataFrame:
-    """Read all JSONL from enriched/entities/run=<run_id> into a DataFrame."""
+    """Read enriched/entities/run=<run_id> into a DataFrame.
+
+    Parquet parts are preferred; JSONL parts are read when a run has none.
+    """
     folder = os.path.join(base_path, f"run={run_id}")
-    files = sorted(glob(os.path.join(folder, "*.jsonl")))
+    files = sorted(glob(os.path.join(folder, "*.parquet"))) or sorted(
+        glob(os.path.join(folder, "*.jsonl"))
+    )
     if not files:
         return pd.DataFrame(columns=list(REQUIRED_ENTITY_KEYS))
 
     frames = []
     for fp in files:
         try:
-            frames.append(pd.read_json(fp, lines=True))
+            if fp.endswith(".parquet"):
+                # partitioning=None: no "run" column inferred from run=<id>/
+                frames.append(pd.read_parquet(fp, partitioning=None))
+            else:
+                frames.append(pd.read_json(fp, lines=True))
         except ValueError:
             # skip malformed file but continue
             continue
@@ -1,21 +1,53 @@
+import asyncio
 import json
 import logging
+import math
 import os
+import threading
 import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
 
 import boto3
 from botocore.exceptions import ClientError
 from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
+from services.api.batch_extract import BatchExtractor, CharQuota
+from services.api.extract_pool import ExtractPool, PoolSaturated, PoolUnavailable
+from services.api.extractor_registry import (
+    DEFAULT_EXTRACTOR,
+    BackendBusy,
+    BackendUnavailable,
+    ExtractorRegistry,
+    parse_limits,
+)
+from services.api.hot_reload import JsonlTail, PollingReloader, file_signature
+from services.api.metrics import (
+    CHARS_PER_SECOND_BUCKETS,
+    ENTITY_COUNT_BUCKETS,
+    LATENCY_BUCKETS,
+    RELOAD_BUCKETS,
+    MetricsMiddleware,
+    Registry,
+)
+from services.api.note_store import NoteStore
+from services.api.result_cache import ExtractCache, cache_key
+from services.api.search_index import (
+    EntityIndex,
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+)
 from services.api.settings import settings
+from services.etl import columnar
 from services.etl.preprocess import normalize_text
-from services.etl.rule_extract import extract_for_note
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,15 +55,62 @@ logger = logging.getLogger(__name__)
 # Rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
+# Exposed on GET /metrics; gauges are registered next to what they read
+METRICS = Registry()
+HTTP_REQUESTS = METRICS.counter(
+    "hctap_http_requests_total", "HTTP requests by route, method and status."
+)
+HTTP_LATENCY = METRICS.histogram(
+    "hctap_http_request_duration_seconds",
+    "HTTP request latency by route and method.",
+    LATENCY_BUCKETS,
+)
+EXTRACT_CHARS_PER_S = METRICS.histogram(
+    "hctap_extract_chars_per_second",
+    "Characters of note text extracted per second of compute, per /extract call.",
+    CHARS_PER_SECOND_BUCKETS,
+)
+EXTRACT_ENTITIES = METRICS.histogram(
+    "hctap_extract_entities",
+    "Entities returned per /extract call.",
+    ENTITY_COUNT_BUCKETS,
+)
+DATA_RELOAD_SECONDS = METRICS.histogram(
+    "hctap_data_reload_duration_seconds",
+    "Time to rebuild the API data snapshot after a file change.",
+    RELOAD_BUCKETS,
+)
+
 APP_RUN_ID = settings.APP_RUN_ID
 NOTES_DIR = settings.NOTES_DIR
 ENRICHED_FILE = f"{settings.ENRICHED_DIR}/run={APP_RUN_ID}/part-000.jsonl"
+ENRICHED_PARQUET = str(columnar.parquet_sibling(ENRICHED_FILE))
 RUN_MANIFEST = settings.RUN_MANIFEST
 ENRICHED_BUCKET = os.getenv("ENRICHED_BUCKET")
-
-app = FastAPI(title="HC-TAP API", version="1.0.0")
+API_RELOAD_INTERVAL = settings.API_RELOAD_INTERVAL
+NOTE_CACHE_MAX_BYTES = settings.NOTE_CACHE_MAX_BYTES
+EXTRACT_BATCH_MAX_NOTES = settings.EXTRACT_BATCH_MAX_NOTES
+# Largest page /search and /notes/{id}/entities return; bulk reads use cursors
+# or /export/entities
+PAGE_MAX_LIMIT = 200
+EXPORT_CHUNK_ROWS = 1000
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Data changes are picked up off the request path; see DataStore
+    DATA_RELOADER.start()
+    EXTRACTORS.warm_up()
+    yield
+    DATA_RELOADER.stop()
+    EXTRACT_POOL.shutdown()
+    EXTRACT_CACHE.close()
+
+
+app = FastAPI(title="HC-TAP API", version="1.0.0", lifespan=lifespan)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_middleware(MetricsMiddleware, requests=HTTP_REQUESTS, latency=HTTP_LATENCY)
 
 # Add CORS middleware
 app.add_middleware(
@@ -42,14 +121,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Cache for data with timestamp
-_data_cache = {
-    "notes": {},
-    "entities": ([], {}),
-    "last_reload": None,
-    "cache_ttl": 30,  # 30 seconds TTL
-}
-
 
 @app.get("/")
 def root():
@@ -67,8 +138,13 @@ def health():
     # Check if notes directory exists (only required for local)
     try:
         if os.path.exists(NOTES_DIR):
-            note_count = len([f for f in os.listdir(NOTES_DIR) if f.endswith(".json")])
-            health_status["checks"]["notes_dir"] = {"ok": True, "count": note_count}
+            # The snapshot's store already holds the corpus index open
+            notes = DATA_STORE.snapshot.notes
+            health_status["checks"]["notes_dir"] = {
+                "ok": True,
+                "count": len(notes),
+                "layout": notes.layout,
+            }
         else:
             if is_cloud:
                 # In cloud mode, local files not needed
@@ -89,8 +165,10 @@ def health():
 
     # Check if enriched file exists (only required for local)
     try:
-        if os.path.exists(ENRICHED_FILE):
-            health_status["checks"]["enriched_file"] = {"ok": True}
+        if os.path.exists(ENRICHED_PARQUET):
+            health_status["checks"]["enriched_file"] = {"ok": True, "format": "parquet"}
+        elif os.path.exists(ENRICHED_FILE):
+            health_status["checks"]["enriched_file"] = {"ok": True, "format": "jsonl"}
         else:
             if is_cloud:
                 health_status["checks"]["enriched_file"] = {
@@ -136,6 +214,19 @@ def health():
             health_status["checks"]["s3_access"] = {"ok": False, "error": str(e)}
             health_status["ok"] = False
 
+    data = DATA_STORE.snapshot
+    health_status["checks"]["data"] = {
+        "ok": True,
+        "notes": len(data.notes),
+        "entities": len(data.all_ents),
+        "loaded_at": data.loaded_at,
+        "reloads": DATA_STORE.reloads,
+        "reload_interval_s": API_RELOAD_INTERVAL,
+    }
+    health_status["checks"]["note_cache"] = {"ok": True, **data.notes.stats()}
+    health_status["checks"]["extract_pool"] = {"ok": True, **EXTRACT_POOL.stats()}
+    health_status["checks"]["extract_cache"] = {"ok": True, **EXTRACT_CACHE.stats()}
+
     health_status["mode"] = "cloud" if is_cloud else "local"
 
     if not health_status["ok"]:
@@ -144,105 +235,249 @@ def health():
     return health_status
 
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of request, extraction and data metrics."""
+    return PlainTextResponse(
+        METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @app.get("/config")
 def config():
     return {
         "RUN_ID": APP_RUN_ID,
         "NOTES_DIR": NOTES_DIR,
         "ENRICHED_FILE": ENRICHED_FILE,
+        "ENRICHED_PARQUET": ENRICHED_PARQUET,
         "RUN_MANIFEST": RUN_MANIFEST,
         "ENRICHED_BUCKET": ENRICHED_BUCKET,
+        "EXTRACTORS": EXTRACTORS.info(),
     }
 
 
-def load_notes():
-    notes = {}
-    if not os.path.exists(NOTES_DIR):
-        return notes
-    for name in os.listdir(NOTES_DIR):
-        if not name.endswith(".json"):
-            continue
-        path = os.path.join(NOTES_DIR, name)
+def load_notes(previous: Optional[NoteStore] = None) -> NoteStore:
+    """Index NOTES_DIR (directory or pack); bodies load on demand."""
+    if previous is None:
+        return NoteStore(NOTES_DIR, NOTE_CACHE_MAX_BYTES)
+    # Keep the hit/miss counters running across directory reloads
+    return NoteStore(
+        NOTES_DIR, NOTE_CACHE_MAX_BYTES, hits=previous.hits, misses=previous.misses
+    )
+
+
+def index_by_note(entities: List[Dict], by_note: Dict[str, List[Dict]]) -> None:
+    for ent in entities:
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                obj = json.load(f)
-            notes[obj["note_id"]] = obj
-        except Exception as e:
-            logger.warning(f"Failed to load note {name}: {e}")
-    return notes
+            by_note.setdefault(ent["note_id"], []).append(ent)
+        except Exception:
+            pass
 
 
-def load_entities_index():
+def load_entities_index(tail: Optional[JsonlTail] = None):
     """Return (all_entities_list, by_note_id_dict)."""
     all_ents = []
     by_note = {}
 
     # Target specific run if it exists, otherwise empty
     # Ideally this should be dynamic based on query param or fallback to 'spacy' if LOCAL missing
-    target_file = ENRICHED_FILE
 
-    if not os.path.exists(target_file):
-        return all_ents, by_note
-
-    with open(target_file, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                ent = json.loads(line)
-                all_ents.append(ent)
-                by_note.setdefault(ent["note_id"], []).append(ent)
-            except Exception:
-                pass
+    # Prefer the Parquet part (ENTITY_FORMAT=parquet|both) when present
+    if columnar.pq is not None and os.path.exists(ENRICHED_PARQUET):
+        try:
+            all_ents = columnar.read_parquet_rows(ENRICHED_PARQUET)
+        except Exception as e:
+            logger.warning(f"Failed to read {ENRICHED_PARQUET}: {e}")
+            all_ents = []
+        index_by_note(all_ents, by_note)
+        if all_ents:
+            return all_ents, by_note
+
+    all_ents = (tail or JsonlTail(ENRICHED_FILE)).read_all()
+    index_by_note(all_ents, by_note)
     return all_ents, by_note
 
 
-# Load data
-NOTES = load_notes()
-ALL_ENTS, ENTS_BY_NOTE = load_entities_index()
-
-
-def reload_data():
-    """Reload data with caching."""
-    global NOTES, ALL_ENTS, ENTS_BY_NOTE
-
-    now = time.time()
-    if (
-        _data_cache["last_reload"] is not None
-        and now - _data_cache["last_reload"] < _data_cache["cache_ttl"]
+def load_manifest():
+    """Return (manifest, error_message) for RUN_MANIFEST."""
+    if not os.path.exists(RUN_MANIFEST):
+        return None, "manifest not found"
+    try:
+        with open(RUN_MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f), None
+    except Exception:
+        return None, "manifest invalid"
+
+
+class DataSnapshot:
+    """Immutable view of the API data; swapped as a whole on reload."""
+
+    __slots__ = (
+        "notes",
+        "all_ents",
+        "by_note",
+        "index",
+        "manifest",
+        "manifest_error",
+        "generation",
+        "loaded_at",
+        "loaded_ts",
+    )
+
+    def __init__(
+        self,
+        notes,
+        all_ents,
+        by_note,
+        index,
+        manifest,
+        manifest_error,
+        generation: int = 0,
     ):
-        # Use cached data
-        NOTES = _data_cache["notes"]
-        ALL_ENTS, ENTS_BY_NOTE = _data_cache["entities"]
-        return
+        self.notes = notes
+        self.all_ents = all_ents
+        self.by_note = by_note
+        self.index = index
+        self.manifest = manifest
+        self.manifest_error = manifest_error
+        # Bumped whenever entity positions may have moved, i.e. on any reload
+        # that is not a pure append; page cursors are only valid within one
+        self.generation = generation
+        self.loaded_ts = time.time()
+        loaded = datetime.fromtimestamp(self.loaded_ts, timezone.utc)
+        self.loaded_at = loaded.isoformat()
+
+
+class DataStore:
+    """
+    Hold the current DataSnapshot and rebuild only what changed.
+
+    refresh() compares (inode, size, mtime) of the notes directory, the
+    enriched part and the manifest with the last load. A JSONL part that
+    only grew is tailed; a replaced part (the ETL writes via rename) or a
+    Parquet part is re-read. The search index is rebuilt on any entity
+    change. Requests just read `snapshot`, so they never wait on a reload.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tail = JsonlTail(ENRICHED_FILE)
+        self._signatures: Dict = {}
+        self.snapshot: Optional[DataSnapshot] = None
+        self.reloads = 0
+        self.generation = 0
+        self.refresh()
+
+    @staticmethod
+    def _current_signatures() -> Dict:
+        return {
+            "notes": file_signature(NOTES_DIR),
+            "parquet": file_signature(ENRICHED_PARQUET),
+            "jsonl": file_signature(ENRICHED_FILE),
+            "manifest": file_signature(RUN_MANIFEST),
+        }
+
+    def _entities(self, old: Optional[DataSnapshot], sigs: Dict):
+        tailable = (
+            old is not None
+            and sigs["parquet"] is None
+            and self._signatures.get("parquet") is None
+        )
+        appended = self._tail.read_appended() if tailable else None
+        if appended is None:
+            self.generation += 1
+            return load_entities_index(self._tail)
+        by_note = dict(old.by_note)
+        for ent in appended:
+            try:
+                note_id = ent["note_id"]
+            except Exception:
+                continue
+            by_note[note_id] = by_note.get(note_id, []) + [ent]
+        logger.info(f"Appended {len(appended)} entities from {ENRICHED_FILE}")
+        return old.all_ents + appended, by_note
+
+    def refresh(self) -> bool:
+        """Swap in a new snapshot if any watched file changed."""
+        with self._lock:
+            sigs = self._current_signatures()
+            old = self.snapshot
+            if old is not None and sigs == self._signatures:
+                return False
+            start = time.perf_counter()
+
+            def changed(*keys: str) -> bool:
+                return old is None or any(
+                    sigs[k] != self._signatures.get(k) for k in keys
+                )
 
-    try:
-        NOTES = load_notes()
-        ALL_ENTS, ENTS_BY_NOTE = load_entities_index()
+            if changed("notes"):
+                notes = load_notes(old.notes if old is not None else None)
+            else:
+                notes = old.notes
+            if changed("parquet", "jsonl"):
+                all_ents, by_note = self._entities(old, sigs)
+                index = EntityIndex(all_ents)
+            else:
+                all_ents, by_note, index = old.all_ents, old.by_note, old.index
+            if changed("manifest"):
+                manifest, manifest_error = load_manifest()
+            else:
+                manifest, manifest_error = old.manifest, old.manifest_error
+
+            self.snapshot = DataSnapshot(
+                notes,
+                all_ents,
+                by_note,
+                index,
+                manifest,
+                manifest_error,
+                self.generation,
+            )
+            self._signatures = sigs
+            self.reloads += 1
+            DATA_RELOAD_SECONDS.observe(time.perf_counter() - start)
+            return True
 
-        # Update cache
-        _data_cache["notes"] = NOTES
-        _data_cache["entities"] = (ALL_ENTS, ENTS_BY_NOTE)
-        _data_cache["last_reload"] = now
-    except Exception as e:
-        logger.warning(f"Error reloading data: {e}")
-        # Use cached data if available
-        if _data_cache["notes"]:
-            NOTES = _data_cache["notes"]
-            ALL_ENTS, ENTS_BY_NOTE = _data_cache["entities"]
+
+# Load data
+DATA_STORE = DataStore()
+DATA_RELOADER = PollingReloader(DATA_STORE.refresh, API_RELOAD_INTERVAL)
+METRICS.gauge(
+    "hctap_data_age_seconds",
+    "Seconds since the current data snapshot was built.",
+    lambda: time.time() - DATA_STORE.snapshot.loaded_ts,
+)
+METRICS.gauge(
+    "hctap_data_reloads", "Snapshots built since startup.", lambda: DATA_STORE.reloads
+)
+METRICS.gauge(
+    "hctap_index_entities",
+    "Entities in the search index.",
+    lambda: len(DATA_STORE.snapshot.all_ents),
+)
+METRICS.gauge(
+    "hctap_index_notes",
+    "Notes known to the API.",
+    lambda: len(DATA_STORE.snapshot.notes),
+)
+METRICS.gauge(
+    "hctap_note_cache_bytes",
+    "Note bodies held in the note cache, by on-disk size.",
+    lambda: DATA_STORE.snapshot.notes.stats()["cached_bytes"],
+)
 
 
 @app.get("/notes/{note_id}")
 def get_note(note_id: str):
-    reload_data()
-    note = NOTES.get(note_id)
+    data = DATA_STORE.snapshot
+    note = data.notes.get(note_id)
     if not note:
         return JSONResponse(
             status_code=404, content={"error": "not_found", "message": "note not found"}
         )
 
-    entities = ENTS_BY_NOTE.get(note_id, [])
+    entities = data.by_note.get(note_id, [])
     return {
         "note_id": note["note_id"],
         "specialty": note.get("specialty"),
@@ -254,19 +489,12 @@ def get_note(note_id: str):
 
 @app.get("/stats/run/{run_id}")
 def get_run_stats(run_id: str):
-    if not os.path.exists(RUN_MANIFEST):
-        return JSONResponse(
-            status_code=404,
-            content={"error": "not_found", "message": "manifest not found"},
-        )
-
-    try:
-        with open(RUN_MANIFEST, "r", encoding="utf-8") as f:
-            manifest = json.load(f)
-    except Exception:
+    data = DATA_STORE.snapshot
+    manifest = data.manifest
+    if data.manifest_error:
         return JSONResponse(
             status_code=404,
-            content={"error": "not_found", "message": "manifest invalid"},
+            content={"error": "not_found", "message": data.manifest_error},
         )
 
     if manifest.get("run_id") != run_id:
@@ -314,38 +542,134 @@ def get_latest_stats():
     return get_run_stats("LOCAL")
 
 
+def cursor_start(cursor: Optional[str], data: DataSnapshot):
+    """Return (start position, None) or (0, error response) for a page cursor."""
+    if cursor is None:
+        return 0, None
+    try:
+        generation, start = decode_cursor(cursor)
+    except InvalidCursor as e:
+        return 0, JSONResponse(
+            status_code=400, content={"error": "bad_request", "message": str(e)}
+        )
+    if generation != data.generation:
+        return 0, JSONResponse(
+            status_code=410,
+            content={
+                "error": "cursor_expired",
+                "message": "data was reloaded since this cursor was issued",
+            },
+        )
+    return start, None
+
+
 @app.get("/search")
 def search_entities(
     q: str | None = None,
     type: str | None = Query(None, pattern="^(PROBLEM|MEDICATION)$"),
     limit: int = 50,
+    cursor: str | None = None,
 ):
-    if limit < 1 or limit > 200:
+    if limit < 1 or limit > PAGE_MAX_LIMIT:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "error": "bad_request",
+                "message": "invalid query parameter 'limit', "
+                f"must be 1..{PAGE_MAX_LIMIT}",
+            },
+        )
+
+    data = DATA_STORE.snapshot
+    start, error = cursor_start(cursor, data)
+    if error is not None:
+        return error
+    # Same filters as a scan: exact type, q.lower() as a norm_text substring
+    # (norm_text is already lowercase), load order; see search_index.py
+    items, next_start = data.index.page(q, type, limit, start)
+    headers = {}
+    if next_start is not None:
+        headers["X-Next-Cursor"] = encode_cursor(data.generation, next_start)
+    return JSONResponse(content=items, headers=headers)
+
+
+@app.get("/notes/{note_id}/entities")
+def get_note_entities(note_id: str, limit: int = 200, cursor: str | None = None):
+    """One page of a note's entities, for notes too large to take inline."""
+    if limit < 1 or limit > PAGE_MAX_LIMIT:
         return JSONResponse(
             status_code=400,
             content={
                 "error": "bad_request",
-                "message": "invalid query parameter 'limit', must be 1..200",
+                "message": "invalid query parameter 'limit', "
+                f"must be 1..{PAGE_MAX_LIMIT}",
             },
         )
+    data = DATA_STORE.snapshot
+    if note_id not in data.by_note and note_id not in data.notes:
+        return JSONResponse(
+            status_code=404, content={"error": "not_found", "message": "note not found"}
+        )
+    start, error = cursor_start(cursor, data)
+    if error is not None:
+        return error
+    entities = data.by_note.get(note_id, [])
+    end = start + limit
+    return {
+        "note_id": note_id,
+        "entities": entities[start:end],
+        "next_cursor": (
+            encode_cursor(data.generation, end) if end < len(entities) else None
+        ),
+    }
 
-    reload_data()
-    items = ALL_ENTS
 
-    if type:
-        items = [e for e in items if e.get("entity_type") == type]
+def export_lines(rows: Iterable[Dict]) -> Iterator[bytes]:
+    """NDJSON in chunks of EXPORT_CHUNK_ROWS rows."""
+    chunk: List[str] = []
+    for row in rows:
+        chunk.append(json.dumps(row))
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield ("\n".join(chunk) + "\n").encode("utf-8")
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode("utf-8")
 
-    if q:
-        ql = q.lower()
-        # scan enriched over norm_text substring (norm_text is already lowercase)
-        items = [e for e in items if (e.get("norm_text") and ql in e.get("norm_text"))]
 
-    return items[:limit]
+@app.get("/export/entities")
+def export_entities(
+    run_id: str | None = None,
+    note_id: List[str] | None = Query(None),
+    type: str | None = Query(None, pattern="^(PROBLEM|MEDICATION)$"),
+):
+    """
+    Stream every entity of the served run (or of the given notes) as NDJSON.
+    Rows come from the snapshot current when the request started and are
+    serialized as they are sent, so memory does not grow with the export.
+    """
+    if run_id is not None and run_id != APP_RUN_ID:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "not_found", "message": "run not found"},
+        )
+    data = DATA_STORE.snapshot
+    if note_id:
+        rows = (ent for nid in note_id for ent in data.by_note.get(nid, []))
+        if type:
+            rows = (ent for ent in rows if ent.get("entity_type") == type)
+    else:
+        rows = data.index.iter_matches(None, type)
+    return StreamingResponse(
+        export_lines(rows),
+        media_type="application/x-ndjson",
+        headers={"X-Data-Generation": str(data.generation)},
+    )
 
 
 class ExtractRequest(BaseModel):
     text: str
     note_id: str | None = None
+    extractor: str | None = None
 
     def validate_text(self):
         """Validate text field"""
@@ -356,9 +680,59 @@ class ExtractRequest(BaseModel):
         return self.text
 
 
+EXTRACT_POOL = ExtractPool(
+    settings.EXTRACT_WORKERS, settings.EXTRACT_QUEUE_MAX, settings.EXTRACT_TIMEOUT_S
+)
+EXTRACTORS = ExtractorRegistry(
+    [name.strip() for name in settings.EXTRACTOR_BACKENDS.split(",") if name.strip()],
+    parse_limits(settings.EXTRACTOR_CONCURRENCY),
+)
+if DEFAULT_EXTRACTOR not in EXTRACTORS.backends:
+    logger.warning(
+        f"EXTRACTOR_BACKENDS leaves out the default extractor "
+        f"{DEFAULT_EXTRACTOR!r}; /extract requests must name one of {EXTRACTORS.names}"
+    )
+EXTRACT_CACHE = ExtractCache(
+    settings.EXTRACT_CACHE_MAX_ENTRIES,
+    settings.EXTRACT_CACHE_TTL_S,
+    settings.EXTRACT_CACHE_DB,
+)
+METRICS.gauge(
+    "hctap_extract_pool_in_flight",
+    "Notes running or waiting in the extraction pool.",
+    lambda: EXTRACT_POOL.in_flight,
+)
+METRICS.gauge(
+    "hctap_extract_cache_entries",
+    "Results held in memory by the /extract cache.",
+    lambda: EXTRACT_CACHE.stats()["entries"],
+)
+METRICS.gauge(
+    "hctap_extract_cache_hit_ratio",
+    "Share of /extract cache lookups served from the cache.",
+    lambda: EXTRACT_CACHE.stats()["hit_ratio"],
+)
+
+
+def server_timing(timing: Dict[str, float]) -> str:
+    return ", ".join(
+        f"{name[: -len('_ms')]};dur={ms:.1f}" for name, ms in timing.items()
+    )
+
+
+async def cache_call(fn, *args):
+    """
+    Memory-only lookups are cheap enough for the event loop; with a SQLite
+    tier the read, write or prune runs on a worker thread instead.
+    """
+    if EXTRACT_CACHE.persistent:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
 @app.post("/extract")
 @limiter.limit("10/minute")  # Rate limit: 10 requests per minute
-def extract_text(request: Request, extract_request: ExtractRequest):
+async def extract_text(request: Request, extract_request: ExtractRequest):
     try:
         text = extract_request.validate_text()
     except ValueError as e:
@@ -366,11 +740,151 @@ def extract_text(request: Request, extract_request: ExtractRequest):
             status_code=400,
             content={"error": "bad_request", "message": str(e)},
         )
+    extractor = extract_request.extractor or DEFAULT_EXTRACTOR
+    if extractor not in EXTRACTORS.backends:
+        if extract_request.extractor is None:
+            message = (
+                f"no extractor given and the default {DEFAULT_EXTRACTOR!r} is "
+                f"not enabled (EXTRACTOR_BACKENDS={settings.EXTRACTOR_BACKENDS!r}); "
+                f"pass one of {EXTRACTORS.names}"
+            )
+            error = "extractor_disabled"
+        else:
+            message = f"unknown extractor {extractor!r}, available: {EXTRACTORS.names}"
+            error = "bad_request"
+        return JSONResponse(
+            status_code=400,
+            content={"error": error, "message": message},
+        )
 
-    text = normalize_text(text)
     note_payload = {
         "note_id": extract_request.note_id or "demo",
         "text": text,
     }
-    entities = extract_for_note(note_payload)
-    return {"entities": entities}
+    backend = EXTRACTORS.get(extractor)
+    # Identical text (after normalization) with the same extractor, model
+    # and rules gives identical rows, so resubmissions skip extraction
+    key = None
+    if EXTRACT_CACHE.enabled:
+        if not backend.pooled:
+            # The key names the model the backend loaded, so load it first
+            try:
+                await asyncio.to_thread(backend.load)
+            except BackendUnavailable as e:
+                return JSONResponse(
+                    status_code=503,
+                    content={"error": "unavailable", "message": str(e)},
+                )
+        start = time.perf_counter()
+        key = cache_key(normalize_text(text), extractor, model=backend.model_id())
+        cached = await cache_call(EXTRACT_CACHE.get, key, note_payload["note_id"])
+        if cached is not None:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            timing = {"cache_ms": elapsed_ms, "total_ms": elapsed_ms}
+            return JSONResponse(
+                content={"entities": cached},
+                headers={"Server-Timing": server_timing(timing), "X-Cache": "HIT"},
+            )
+    # Extraction runs off the event loop, in EXTRACT_POOL for the
+    # pure-Python backends and on a warm in-process instance otherwise; work
+    # beyond the queue or backend limit is refused rather than left to pile up
+    try:
+        if backend.pooled:
+            entities, timing = await EXTRACT_POOL.run(
+                note_payload, backend.name, APP_RUN_ID
+            )
+        else:
+            entities, timing = await backend.run(note_payload, APP_RUN_ID)
+    except PoolSaturated as e:
+        return JSONResponse(
+            status_code=429,
+            content={"error": "overloaded", "message": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except BackendBusy as e:
+        return JSONResponse(
+            status_code=429,
+            content={"error": "overloaded", "message": str(e)},
+            headers={"Retry-After": "1"},
+        )
+    except PoolUnavailable as e:
+        return JSONResponse(
+            status_code=503,
+            content={"error": "unavailable", "message": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except BackendUnavailable as e:
+        return JSONResponse(
+            status_code=503,
+            content={"error": "unavailable", "message": str(e)},
+        )
+    if key is not None:
+        await cache_call(EXTRACT_CACHE.put, key, entities)
+    compute_s = timing["compute_ms"] / 1000
+    if compute_s > 0:
+        EXTRACT_CHARS_PER_S.observe(len(text) / compute_s, extractor=backend.name)
+    EXTRACT_ENTITIES.observe(len(entities), extractor=backend.name)
+    return JSONResponse(
+        content={"entities": entities},
+        headers={"Server-Timing": server_timing(timing), "X-Cache": "MISS"},
+    )
+
+
+BATCH_EXTRACTOR = BatchExtractor(EXTRACT_POOL)
+BATCH_QUOTA = CharQuota(settings.EXTRACT_BATCH_CHARS_PER_MINUTE)
+
+
+class BatchExtractRequest(BaseModel):
+    notes: List
+
+
+@app.post("/extract/batch")
+def extract_batch(request: Request, batch: BatchExtractRequest):
+    """
+    Extract entities for many notes; streams NDJSON, one line per note in
+    completion order plus a final summary line. Quota is charged in
+    characters of valid note text, not in requests.
+    """
+    if not batch.notes:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "bad_request", "message": "notes cannot be empty"},
+        )
+    if len(batch.notes) > EXTRACT_BATCH_MAX_NOTES:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "error": "bad_request",
+                "message": f"too many notes (max {EXTRACT_BATCH_MAX_NOTES})",
+            },
+        )
+
+    jobs, errors = BATCH_EXTRACTOR.validate(batch.notes)
+    chars = sum(len(note["text"]) for _, note in jobs)
+    if chars > BATCH_QUOTA.capacity:
+        return JSONResponse(
+            status_code=413,
+            content={
+                "error": "payload_too_large",
+                "message": f"batch has {chars} characters, "
+                f"quota allows {BATCH_QUOTA.capacity} per minute",
+            },
+        )
+    granted, retry_after, remaining = BATCH_QUOTA.acquire(
+        get_remote_address(request), chars
+    )
+    quota_headers = {"X-Quota-Remaining-Chars": str(remaining)}
+    if not granted:
+        return JSONResponse(
+            status_code=429,
+            content={
+                "error": "quota_exceeded",
+                "message": f"batch needs {chars} characters, {remaining} available",
+            },
+            headers={"Retry-After": str(math.ceil(retry_after)), **quota_headers},
+        )
+    return StreamingResponse(
+        BATCH_EXTRACTOR.stream(jobs, errors, chars),
+        media_type="application/x-ndjson",
+        headers={"X-Chars-Charged": str(chars), **quota_headers},
+    )
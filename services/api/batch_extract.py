@@ -0,0 +1,181 @@
+"""
+Bulk extraction behind POST /extract/batch.
+
+Notes are checked against contracts/note.schema.json, the valid ones are
+fanned out to the extraction process pool shared with /extract, and one
+NDJSON line is emitted per note as soon as its
+result is ready (so lines arrive out of order; each carries its index).
+
+Instead of counting requests, clients draw from a per-client character
+budget that refills continuously; a batch is charged for the text of its
+valid notes before any work starts.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from jsonschema import Draft202012Validator
+
+from services.api.extract_pool import ExtractPool, extract_note
+
+NOTE_SCHEMA = Path(__file__).resolve().parents[2] / "contracts" / "note.schema.json"
+# Same per-text ceiling as /extract
+MAX_TEXT_CHARS = 100000
+# Notes in flight per worker; bounds memory for large batches
+IN_FLIGHT_PER_WORKER = 4
+
+
+def load_validator() -> Draft202012Validator:
+    with NOTE_SCHEMA.open("r", encoding="utf-8") as fh:
+        return Draft202012Validator(json.load(fh))
+
+
+def note_error(validator: Draft202012Validator, note) -> Optional[str]:
+    errors = sorted(validator.iter_errors(note), key=lambda e: list(e.path))
+    if errors:
+        return "; ".join(e.message for e in errors)
+    if len(note["text"]) > MAX_TEXT_CHARS:
+        return f"text too large (max {MAX_TEXT_CHARS} characters)"
+    if not note["text"].strip():
+        return "text is empty after stripping whitespace"
+    return None
+
+
+class CharQuota:
+    """
+    Per-client token bucket denominated in characters: `capacity` characters
+    are available at once and refill at capacity / `window_s` per second.
+
+    A full bucket is the same as no bucket, so once per window the buckets
+    that have refilled are dropped; only clients seen within roughly the
+    last two windows are kept.
+    """
+
+    def __init__(self, capacity: int, window_s: float = 60.0) -> None:
+        self.capacity = capacity
+        self.window_s = window_s
+        self.rate = capacity / window_s
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._swept = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _level(self, key: str, now: float) -> float:
+        level, at = self._buckets.get(key, (float(self.capacity), now))
+        return min(float(self.capacity), level + (now - at) * self.rate)
+
+    def acquire(self, key: str, chars: int) -> Tuple[bool, float, int]:
+        """
+        Charge `chars` to `key`. Returns (granted, retry_after_s, remaining).
+        A refused charge leaves the bucket untouched.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept >= self.window_s:
+                self._sweep(now)
+            level = self._level(key, now)
+            if chars > level:
+                return False, (chars - level) / self.rate, int(level)
+            self._buckets[key] = (level - chars, now)
+            return True, 0.0, int(level - chars)
+
+    def _sweep(self, now: float) -> None:
+        # Caller holds self._lock
+        full = [k for k in self._buckets if self._level(k, now) >= self.capacity]
+        for key in full:
+            del self._buckets[key]
+        self._swept = now
+
+
+class BatchExtractor:
+    def __init__(self, pool: ExtractPool) -> None:
+        self.pool = pool
+        self.validator = load_validator()
+
+    def validate(self, notes: List) -> Tuple[List[Tuple[int, Dict]], List[Dict]]:
+        """Split notes into (index, note) jobs and per-note error rows."""
+        jobs: List[Tuple[int, Dict]] = []
+        errors: List[Dict] = []
+        for i, note in enumerate(notes):
+            message = note_error(self.validator, note)
+            if message is None:
+                jobs.append((i, note))
+                continue
+            note_id = note.get("note_id") if isinstance(note, dict) else None
+            errors.append(
+                {
+                    "index": i,
+                    "note_id": note_id,
+                    "error": "invalid_note",
+                    "message": message,
+                }
+            )
+        return jobs, errors
+
+    def _results(self, jobs: List[Tuple[int, Dict]]) -> Iterator[Dict]:
+        if self.pool.workers <= 0:
+            for i, note in jobs:
+                yield self._row(i, note, lambda: extract_note(note))
+            return
+        # The batch bounds its own in-flight work, so it never gets a 429
+        # from the pool; single /extract calls still queue behind it.
+        window = self.pool.workers * IN_FLIGHT_PER_WORKER
+        pending: Dict[Future, Tuple[int, Dict]] = {}
+        queue = iter(jobs)
+        try:
+            while True:
+                for i, note in queue:
+                    pending[self.pool.submit(note, enforce_limit=False)] = (i, note)
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, note = pending.pop(future)
+                    yield self._row(i, note, lambda: future.result()[0])
+        finally:
+            # Client went away: drop what has not started
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _failed(i: int, note: Dict, error: Exception) -> Dict:
+        return {
+            "index": i,
+            "note_id": note["note_id"],
+            "error": "extraction_failed",
+            "message": str(error),
+        }
+
+    @classmethod
+    def _row(cls, i: int, note: Dict, result) -> Dict:
+        try:
+            entities = result()
+        except Exception as e:
+            return cls._failed(i, note, e)
+        return {"index": i, "note_id": note["note_id"], "entities": entities}
+
+    def stream(
+        self, jobs: List[Tuple[int, Dict]], errors: List[Dict], chars: int
+    ) -> Iterator[str]:
+        start = time.perf_counter()
+        failed = len(errors)
+        for row in errors:
+            yield json.dumps(row) + "\n"
+        for row in self._results(jobs):
+            failed += "error" in row
+            yield json.dumps(row) + "\n"
+        summary = {
+            "done": True,
+            "notes": len(jobs) + len(errors),
+            "errors": failed,
+            "chars": chars,
+            "duration_ms": int((time.perf_counter() - start) * 1000),
+        }
+        yield json.dumps(summary) + "\n"
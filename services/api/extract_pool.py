@@ -0,0 +1,200 @@
+"""
+Process pool shared by /extract and /extract/batch.
+
+Extraction is pure CPU, so it runs in worker processes instead of on the
+server's threads. The pure-Python backends in POOL_EXTRACTORS run here;
+each worker builds an extractor the first time it is asked for one and
+keeps it for later notes. Admission is bounded: at most `workers + max_queue` notes
+may be running or waiting, and /extract is turned away with a retry hint
+beyond that instead of queueing without limit. Each job reports when it
+started and how long it computed, so callers can split queue time from
+compute time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from services.etl.preprocess import normalize_text
+from services.etl.rule_extract import extract_for_note
+
+# Smoothing for the running average of compute time behind Retry-After
+EWMA_ALPHA = 0.2
+
+# Same names as the ETL's EXTRACTOR setting
+RULE = "rule"
+POOL_EXTRACTORS = (RULE, "enhanced")
+
+# Per-worker extractor instances, built on first use
+_instances: Dict[str, object] = {}
+
+
+def _enhanced():
+    if "enhanced" not in _instances:
+        from services.extractors.enhanced_rule_extract import EnhancedRuleExtractor
+
+        _instances["enhanced"] = EnhancedRuleExtractor()
+    return _instances["enhanced"]
+
+
+def extract_note(note: Dict, extractor: str = RULE, run_id: str = "") -> List[Dict]:
+    """Worker entry point; normalizes the text like the ETL does."""
+    text = normalize_text(note["text"])
+    if extractor == RULE:
+        return extract_for_note(dict(note, text=text))
+    if extractor == "enhanced":
+        return _enhanced().extract(text, note["note_id"], run_id) or []
+    raise ValueError(f"extractor {extractor!r} does not run in the pool")
+
+
+def timed_extract_note(
+    note: Dict, extractor: str = RULE, run_id: str = ""
+) -> Tuple[List[Dict], float, float]:
+    """extract_note plus (wall-clock start, compute seconds)."""
+    started = time.time()
+    begin = time.perf_counter()
+    entities = extract_note(note, extractor, run_id)
+    return entities, started, time.perf_counter() - begin
+
+
+class PoolSaturated(Exception):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("extraction queue is full")
+        self.retry_after = retry_after
+
+
+class PoolUnavailable(Exception):
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ExtractPool:
+    def __init__(self, workers: int, max_queue: int, timeout_s: float) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+        self.avg_compute_s = 0.0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return max(self.workers, 1) + self.max_queue
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Caller holds self._lock
+        if self._pool is None:
+            # spawn: the API process runs threads, which fork does not copy
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        with self._lock:
+            backlog = self.in_flight / max(self.workers, 1)
+            return max(1, math.ceil(backlog * self.avg_compute_s))
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if future.cancelled() or future.exception() is not None:
+                return
+            self.completed += 1
+            compute_s = future.result()[2]
+            if self.completed == 1:
+                self.avg_compute_s = compute_s
+            else:
+                self.avg_compute_s += EWMA_ALPHA * (compute_s - self.avg_compute_s)
+
+    def submit(
+        self,
+        note: Dict,
+        enforce_limit: bool = True,
+        extractor: str = RULE,
+        run_id: str = "",
+    ) -> Future:
+        """
+        Queue `note` for timed_extract_note. Raises PoolSaturated when the
+        queue is full, unless the caller bounds its own in-flight work.
+        """
+        args = (note, extractor, run_id)
+        with self._lock:
+            if enforce_limit and self.in_flight >= self.capacity:
+                self.rejected += 1
+                saturated = True
+            else:
+                saturated = False
+                pool = self._executor()
+                try:
+                    future = pool.submit(timed_extract_note, *args)
+                except BrokenProcessPool:
+                    # A worker died earlier; start over with a fresh pool
+                    self._pool = None
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    future = self._executor().submit(timed_extract_note, *args)
+                self.in_flight += 1
+        if saturated:
+            raise PoolSaturated(self.retry_after())
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(
+        self, note: Dict, extractor: str = RULE, run_id: str = ""
+    ) -> Tuple[List[Dict], Dict[str, float]]:
+        """Extract one note off the event loop; returns (entities, timing)."""
+        submitted = time.time()
+        if self.workers <= 0:
+            entities, started, compute_s = await asyncio.to_thread(
+                timed_extract_note, note, extractor, run_id
+            )
+        else:
+            future = self.submit(note, extractor=extractor, run_id=run_id)
+            try:
+                entities, started, compute_s = await asyncio.wait_for(
+                    asyncio.wrap_future(future), self.timeout_s
+                )
+            except asyncio.TimeoutError:
+                future.cancel()
+                raise PoolUnavailable(
+                    f"extraction timed out after {self.timeout_s:g}s",
+                    self.retry_after(),
+                )
+            except BrokenProcessPool:
+                raise PoolUnavailable("extraction worker crashed", 1)
+        total_s = time.time() - submitted
+        timing = {
+            "queue_ms": max(0.0, (started - submitted) * 1000),
+            "compute_ms": compute_s * 1000,
+            "total_ms": total_s * 1000,
+        }
+        return entities, timing
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_compute_ms": round(self.avg_compute_s * 1000, 3),
+            }
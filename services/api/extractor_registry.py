@@ -0,0 +1,233 @@
+"""
+Extractor backends served by /extract.
+
+The pure-Python backends ("rule" and "enhanced", see POOL_EXTRACTORS) run
+on the shared extraction process pool (see extract_pool.py), so their CPU
+work stays off the server's threads and the GIL. The other backends keep
+one pre-initialized instance in the API process so a model is loaded once
+rather than per request, or per pool worker; they spend their time in
+native code or waiting on a container or an API.
+
+In-process backends are warmed on a background thread at startup; a
+request that arrives first loads the backend itself, and later requests
+wait on the same load. Each of them admits at most `max_concurrency`
+requests at a time and turns the rest away; pooled backends share the
+pool's admission limit instead.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.api.extract_pool import POOL_EXTRACTORS, RULE
+from services.etl.preprocess import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Used when a request names no extractor
+DEFAULT_EXTRACTOR = RULE
+
+
+def _spacy():
+    from services.extractors.spacy_extract import SpacyExtractor
+
+    return SpacyExtractor()
+
+
+def _docker_spacy():
+    from services.extractors.docker_spacy_extract import DockerSpacyExtractor
+
+    return DockerSpacyExtractor()
+
+
+def _llm():
+    from services.extractors.llm_extract import LLMExtractor
+
+    return LLMExtractor()
+
+
+# Same names as the ETL's EXTRACTOR setting
+LOADERS: Dict[str, Optional[Callable[[], object]]] = {
+    **{name: None for name in POOL_EXTRACTORS},
+    "spacy": _spacy,
+    "docker-spacy": _docker_spacy,
+    "llm": _llm,
+}
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process, where /proc is available."""
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class BackendUnavailable(Exception):
+    pass
+
+
+class BackendBusy(Exception):
+    pass
+
+
+class Backend:
+    def __init__(self, name: str, max_concurrency: int) -> None:
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.loader = LOADERS[name]
+        self.pooled = self.loader is None
+        self.instance = None
+        self.state = "ready" if self.loader is None else "cold"
+        self.error: Optional[str] = None
+        self.load_s: Optional[float] = 0.0 if self.loader is None else None
+        self.rss_delta_bytes: Optional[int] = None
+        self.in_flight = 0
+        self.rejected = 0
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Initialize the instance once; concurrent callers wait for it."""
+        if self.state == "ready":
+            return self.instance
+        with self._load_lock:
+            if self.state == "ready":
+                return self.instance
+            if self.state == "failed":
+                raise BackendUnavailable(f"extractor {self.name}: {self.error}")
+            self.state = "loading"
+            rss_before = rss_bytes()
+            start = time.perf_counter()
+            try:
+                instance = self.loader()
+            except Exception as e:
+                self.state, self.error = "failed", str(e)
+                logger.warning(f"Extractor {self.name} failed to load: {e}")
+                raise BackendUnavailable(f"extractor {self.name}: {e}")
+            self.load_s = time.perf_counter() - start
+            rss_after = rss_bytes()
+            if rss_before is not None and rss_after is not None:
+                self.rss_delta_bytes = rss_after - rss_before
+            self.instance = instance
+            self.state = "ready"
+            logger.info(f"Extractor {self.name} ready in {self.load_s:.2f}s")
+            return instance
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self.in_flight >= self.max_concurrency:
+                self.rejected += 1
+                raise BackendBusy(f"extractor {self.name} is at capacity")
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    async def run(self, note: Dict, run_id: str) -> Tuple[List[Dict], Dict]:
+        """
+        Extract one note on a worker thread; returns (entities, timing) with
+        the same keys as ExtractPool.run. Queue time is time spent waiting
+        for the backend to finish loading.
+        """
+        self.acquire()
+        try:
+            start = time.perf_counter()
+            instance = await asyncio.to_thread(self.load)
+            loaded = time.perf_counter()
+            text = normalize_text(note["text"])
+            entities = await asyncio.to_thread(
+                instance.extract, text, note["note_id"], run_id
+            )
+            done = time.perf_counter()
+        finally:
+            self.release()
+        timing = {
+            "queue_ms": (loaded - start) * 1000,
+            "compute_ms": (done - loaded) * 1000,
+            "total_ms": (done - start) * 1000,
+        }
+        return entities or [], timing
+
+    def model_id(self) -> Optional[str]:
+        """
+        Model the loaded instance runs, with its version where the backend
+        reports one (spaCy does); None for the pooled backends and before
+        the backend has loaded.
+        """
+        instance = self.instance
+        name = getattr(instance, "model_name", None) or getattr(instance, "model", None)
+        version = getattr(instance, "model_version", None)
+        return f"{name}-{version}" if name and version else name
+
+    def info(self) -> Dict:
+        return {
+            "state": self.state,
+            "model": self.model_id(),
+            "mode": "process_pool" if self.pooled else "in_process",
+            "startup_ms": None if self.load_s is None else round(self.load_s * 1000, 1),
+            "rss_delta_bytes": self.rss_delta_bytes,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "error": self.error,
+        }
+
+
+def parse_limits(value: str) -> Dict[str, int]:
+    """Parse "enhanced=4,spacy=2" into {"enhanced": 4, "spacy": 2}."""
+    limits: Dict[str, int] = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, limit = item.partition("=")
+        limits[name.strip()] = int(limit)
+    return limits
+
+
+class ExtractorRegistry:
+    def __init__(
+        self,
+        names: Iterable[str],
+        limits: Optional[Dict[str, int]] = None,
+        default_limit: int = 4,
+    ) -> None:
+        limits = limits or {}
+        self.backends: Dict[str, Backend] = {}
+        for name in names:
+            if name not in LOADERS:
+                raise ValueError(
+                    f"unknown extractor {name!r}; choose from {sorted(LOADERS)}"
+                )
+            self.backends[name] = Backend(name, limits.get(name, default_limit))
+        self._warmer: Optional[threading.Thread] = None
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.backends)
+
+    def get(self, name: str) -> Backend:
+        return self.backends[name]
+
+    def _warm_all(self) -> None:
+        for backend in self.backends.values():
+            try:
+                backend.load()
+            except BackendUnavailable:
+                pass
+
+    def warm_up(self) -> None:
+        """Load every enabled backend on a daemon thread."""
+        if self._warmer is None:
+            self._warmer = threading.Thread(
+                target=self._warm_all, name="extractor-warmup", daemon=True
+            )
+            self._warmer.start()
+
+    def info(self) -> Dict[str, Dict]:
+        return {name: backend.info() for name, backend in self.backends.items()}
@@ -0,0 +1,117 @@
+"""
+Change detection and background refresh for the API's in-memory data.
+
+Requests only ever read the current snapshot; a daemon thread polls cheap
+stat() signatures and swaps in a rebuilt snapshot when something changed.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (inode, size, mtime_ns); None when the path does not exist
+Signature = Optional[Tuple[int, int, int]]
+
+
+def file_signature(path: str) -> Signature:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class JsonlTail:
+    """
+    Remember how far a JSONL file has been read so appended lines can be
+    parsed without re-reading the file. Only complete lines are consumed; a
+    half-written last line is picked up on the next read.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.inode: Optional[int] = None
+        self.offset = 0
+
+    def _read_from(self, offset: int) -> List[Dict]:
+        rows: List[Dict] = []
+        with open(self.path, "rb") as fh:
+            fh.seek(offset)
+            data = fh.read()
+            self.inode = os.fstat(fh.fileno()).st_ino
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                pass
+        # An unterminated last line is only consumed once it parses, i.e. the
+        # writer has finished it (a truncated JSON object never does).
+        tail = data[end:].strip()
+        if tail:
+            try:
+                rows.append(json.loads(tail))
+                end = len(data)
+            except ValueError:
+                pass
+        self.offset = offset + end
+        return rows
+
+    def read_all(self) -> List[Dict]:
+        self.inode, self.offset = None, 0
+        if not os.path.exists(self.path):
+            return []
+        return self._read_from(0)
+
+    def read_appended(self) -> Optional[List[Dict]]:
+        """
+        Rows appended since the last read, or None if the file was replaced
+        or truncated and has to be read from the start.
+        """
+        sig = file_signature(self.path)
+        if sig is None or sig[0] != self.inode or sig[1] < self.offset:
+            return None
+        if sig[1] == self.offset:
+            return []
+        return self._read_from(self.offset)
+
+
+class PollingReloader:
+    """Call `refresh` every `interval` seconds on a daemon thread."""
+
+    def __init__(self, refresh: Callable[[], bool], interval: float) -> None:
+        self.refresh = refresh
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="api-data-reloader", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Background data reload failed: {e}")
@@ -0,0 +1,100 @@
+"""
+Lazy note store for the API.
+
+Only a note_id -> name index is kept resident; note bodies are read on
+demand and held in an LRU cache bounded by their on-disk size. For a notes
+directory the index is built from directory entries alone (both ingest
+scripts write <note_id>.json), for a packed corpus from its offset index,
+so neither layout opens a note up front.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from services.etl.note_corpus import open_corpus
+
+logger = logging.getLogger(__name__)
+
+
+class NoteStore:
+    def __init__(
+        self,
+        notes_dir: str,
+        max_bytes: int,
+        hits: int = 0,
+        misses: int = 0,
+    ) -> None:
+        self.notes_dir = notes_dir
+        self.max_bytes = max_bytes
+        self.hits = hits
+        self.misses = misses
+        self._corpus = open_corpus(notes_dir)
+        self._names: Dict[str, str] = self._corpus.note_ids()
+        self._cache: "OrderedDict[str, Tuple[Dict, int]]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def layout(self) -> str:
+        return self._corpus.layout
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, note_id: str) -> bool:
+        return note_id in self._names
+
+    def _read(self, note_id: str) -> Optional[Tuple[Dict, int]]:
+        name = self._names.get(note_id)
+        if name is None:
+            return None
+        try:
+            raw = self._corpus.read_bytes(name)
+            obj = json.loads(raw)
+        except Exception as e:
+            logger.warning(f"Failed to load note {name}: {e}")
+            return None
+        if obj.get("note_id") != note_id:
+            label = self._corpus.label(name)
+            logger.warning(f"Note {label} holds note_id={obj.get('note_id')!r}")
+            return None
+        return obj, len(raw)
+
+    def get(self, note_id: str) -> Optional[Dict]:
+        with self._lock:
+            cached = self._cache.get(note_id)
+            if cached is not None:
+                self._cache.move_to_end(note_id)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+        loaded = self._read(note_id)
+        if loaded is None:
+            return None
+        with self._lock:
+            if note_id not in self._cache and loaded[1] <= self.max_bytes:
+                self._cache[note_id] = loaded
+                self._cached_bytes += loaded[1]
+                while self._cached_bytes > self.max_bytes:
+                    _, (_, size) = self._cache.popitem(last=False)
+                    self._cached_bytes -= size
+        return loaded[0]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "notes": len(self._names),
+                "layout": self._corpus.layout,
+                "cached_notes": len(self._cache),
+                "cached_bytes": self._cached_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+            }
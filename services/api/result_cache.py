@@ -0,0 +1,191 @@
+"""
+Content-addressed cache of /extract results.
+
+Entries are keyed on sha256 of the normalized note text plus the extractor,
+RULES_PROFILE, extractor_version and the extractor's runtime settings,
+including the model a backend loaded (see services/etl/incremental.py), so
+an edit to the rules or the extractor code, or a different model, never
+serves stale rows. The
+memory tier is an LRU bounded by entry count with an optional TTL; an
+optional SQLite file behind it survives restarts and is read on a memory
+miss. Stored rows carry the note_id of the request that computed them and
+are relabelled with the caller's note_id on a hit.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from services.etl.incremental import (
+    RULES_PROFILE,
+    extractor_settings,
+    extractor_version,
+)
+
+logger = logging.getLogger(__name__)
+
+# Disk rows are trimmed to max_disk_entries once per this many writes
+PRUNE_EVERY = 256
+
+
+def cache_key(
+    normalized_text: str,
+    extractor: str,
+    rules_profile: str = RULES_PROFILE,
+    model: Optional[str] = None,
+) -> str:
+    digest = hashlib.sha256(normalized_text.encode("utf-8")).hexdigest()
+    key = f"{digest}:{extractor}:{rules_profile}:{extractor_version(extractor)}"
+    settings = extractor_settings(extractor, model)
+    if settings:
+        key += ":" + json.dumps(settings, sort_keys=True, separators=(",", ":"))
+    return key
+
+
+def relabel(entities: List[Dict], note_id: str) -> List[Dict]:
+    return [dict(ent, note_id=note_id) for ent in entities]
+
+
+class ExtractCache:
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_s: float = 0.0,
+        db_path: Optional[str] = None,
+        max_disk_entries: int = 100_000,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.db_path = db_path or None
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._memory: "OrderedDict[str, Tuple[List[Dict], float]]" = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if self.db_path:
+            try:
+                self._db = self._open(self.db_path)
+            except sqlite3.Error as e:
+                logger.warning(f"Extract cache {self.db_path} unavailable: {e}")
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, entities TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+        return db
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self._db is not None
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None
+
+    def _fresh(self, created: float, now: float) -> bool:
+        return self.ttl_s <= 0 or now - created < self.ttl_s
+
+    def _remember(self, key: str, entities: List[Dict], created: float) -> None:
+        # Caller holds self._lock
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (entities, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str, note_id: str) -> Optional[List[Dict]]:
+        """Cached entities for `key` relabelled to `note_id`, or None."""
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                if self._fresh(cached[1], now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return relabel(cached[0], note_id)
+                del self._memory[key]
+                self.expired += 1
+            row = None
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT entities, created FROM results WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Extract cache read failed: {e}")
+            if row is not None and self._fresh(row[1], now):
+                entities = json.loads(row[0])
+                self._remember(key, entities, row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return relabel(entities, note_id)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, entities: List[Dict]) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, entities, now)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, entities, created) "
+                    "VALUES (?, ?, ?)",
+                    (key, json.dumps(entities), now),
+                )
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._prune(now)
+            except sqlite3.Error as e:
+                logger.warning(f"Extract cache write failed: {e}")
+
+    def _prune(self, now: float) -> None:
+        # Caller holds self._lock
+        if self.ttl_s > 0:
+            self._db.execute(
+                "DELETE FROM results WHERE created < ?", (now - self.ttl_s,)
+            )
+        self._db.execute(
+            "DELETE FROM results WHERE key IN (SELECT key FROM results "
+            "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            db, self._db = self._db, None
+        if db is not None:
+            db.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "disk": self.db_path if self._db is not None else None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_ratio": self.hits / lookups if lookups else None,
+            }
@@ -0,0 +1,136 @@
+"""
+In-memory index behind GET /search.
+
+Built once per data load so a request no longer scans every entity. The
+results are exactly what the original filter produced: entities in load
+order, narrowed by exact entity_type and by `q.lower()` being a substring
+of norm_text, then cut to `limit`.
+
+- type partition: entity_type -> ascending positions
+- exact map: distinct norm_text -> ascending positions
+- trigram map over the distinct norm_text vocabulary for substring queries;
+  queries shorter than a trigram scan the vocabulary, which is far smaller
+  than the entity list.
+
+Every posting list is ascending by position, so a page can resume at any
+position with a bisect instead of re-walking the earlier matches. Cursors
+carry that position plus the data generation they were issued for.
+"""
+
+from __future__ import annotations
+
+import base64
+import heapq
+from bisect import bisect_left
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+GRAM = 3
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(generation: int, position: int) -> str:
+    raw = f"{generation}:{position}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Return (generation, position); raises InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        generation, position = (int(part) for part in raw.decode("ascii").split(":"))
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor("invalid cursor")
+    if position < 0:
+        raise InvalidCursor("invalid cursor")
+    return generation, position
+
+
+def _grams(text: str) -> Set[str]:
+    return {text[i : i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class EntityIndex:
+    def __init__(self, entities: List[Dict]) -> None:
+        self.entities = entities
+        self.by_type: Dict[str, List[int]] = {}
+        self.by_norm: Dict[str, List[int]] = {}
+        for pos, ent in enumerate(entities):
+            self.by_type.setdefault(ent.get("entity_type"), []).append(pos)
+            norm = ent.get("norm_text")
+            if norm:
+                self.by_norm.setdefault(norm, []).append(pos)
+        self.vocab: List[str] = list(self.by_norm)
+        self.by_gram: Dict[str, Set[int]] = {}
+        for norm_id, norm in enumerate(self.vocab):
+            for gram in _grams(norm):
+                self.by_gram.setdefault(gram, set()).add(norm_id)
+
+    def _matching_norms(self, ql: str) -> List[str]:
+        if len(ql) < GRAM:
+            return [norm for norm in self.vocab if ql in norm]
+        postings = sorted((self.by_gram.get(g, set()) for g in _grams(ql)), key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = set.intersection(*postings)
+        return [self.vocab[i] for i in candidates if ql in self.vocab[i]]
+
+    def _positions(
+        self, q: Optional[str], entity_type: Optional[str], start: int = 0
+    ) -> Iterable[int]:
+        if not q:
+            if entity_type:
+                postings = self.by_type.get(entity_type, [])
+                return islice(postings, bisect_left(postings, start), None)
+            return range(start, len(self.entities))
+        lists = [
+            islice(postings, bisect_left(postings, start), None)
+            for postings in (
+                self.by_norm[norm] for norm in self._matching_norms(q.lower())
+            )
+        ]
+        positions: Iterator[int] = lists[0] if len(lists) == 1 else heapq.merge(*lists)
+        if entity_type:
+            entities = self.entities
+            positions = (
+                pos
+                for pos in positions
+                if entities[pos].get("entity_type") == entity_type
+            )
+        return positions
+
+    def search(
+        self,
+        q: Optional[str] = None,
+        entity_type: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Dict]:
+        return [
+            self.entities[pos] for pos in islice(self._positions(q, entity_type), limit)
+        ]
+
+    def iter_matches(
+        self, q: Optional[str] = None, entity_type: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """Every match in load order, produced lazily."""
+        entities = self.entities
+        return (entities[pos] for pos in self._positions(q, entity_type))
+
+    def page(
+        self,
+        q: Optional[str] = None,
+        entity_type: Optional[str] = None,
+        limit: int = 50,
+        start: int = 0,
+    ) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Up to `limit` matches at positions >= `start`, and the position to
+        resume from, or None when no match is left.
+        """
+        positions = list(islice(self._positions(q, entity_type, start), limit + 1))
+        items = [self.entities[pos] for pos in positions[:limit]]
+        next_start = positions[limit] if len(positions) > limit else None
+        return items, next_start
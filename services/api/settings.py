@@ -12,6 +12,34 @@ class Settings(BaseModel):
     NOTES_DIR: str = os.getenv("NOTES_DIR", "fixtures/notes")
     ENRICHED_DIR: str = os.getenv("ENRICHED_DIR", "fixtures/enriched/entities")
     RUN_MANIFEST: str = os.getenv("RUN_MANIFEST", "fixtures/runs_LOCAL.json")
+    # Seconds between change checks on notes/entities/manifest (0 disables)
+    API_RELOAD_INTERVAL: float = float(os.getenv("API_RELOAD_INTERVAL", "5") or 5)
+    # Upper bound on note bodies held in memory, by on-disk size
+    NOTE_CACHE_MAX_BYTES: int = int(
+        os.getenv("NOTE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)) or 32 * 1024 * 1024
+    )
+    # Extraction worker processes (0 = run on the server's threads), notes
+    # allowed to wait for a worker, and seconds /extract waits for a result
+    EXTRACT_WORKERS: int = int(
+        os.getenv("EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1)))
+    )
+    EXTRACT_QUEUE_MAX: int = int(os.getenv("EXTRACT_QUEUE_MAX", "32"))
+    EXTRACT_TIMEOUT_S: float = float(os.getenv("EXTRACT_TIMEOUT_S", "30") or 30)
+    # Backends /extract may select (warmed at startup) and per-backend
+    # concurrency limits, e.g. "enhanced=4,spacy=2"
+    EXTRACTOR_BACKENDS: str = os.getenv("EXTRACTOR_BACKENDS", "rule,enhanced")
+    EXTRACTOR_CONCURRENCY: str = os.getenv("EXTRACTOR_CONCURRENCY", "")
+    # /extract result cache: entries kept in memory (0 disables), seconds an
+    # entry stays valid (0 = until evicted) and an optional SQLite file
+    EXTRACT_CACHE_MAX_ENTRIES: int = int(os.getenv("EXTRACT_CACHE_MAX_ENTRIES", "4096"))
+    EXTRACT_CACHE_TTL_S: float = float(os.getenv("EXTRACT_CACHE_TTL_S", "3600") or 0)
+    EXTRACT_CACHE_DB: str = os.getenv("EXTRACT_CACHE_DB", "")
+    # POST /extract/batch: notes per request and the per-client character
+    # budget that refills every minute
+    EXTRACT_BATCH_MAX_NOTES: int = int(os.getenv("EXTRACT_BATCH_MAX_NOTES", "1000"))
+    EXTRACT_BATCH_CHARS_PER_MINUTE: int = int(
+        os.getenv("EXTRACT_BATCH_CHARS_PER_MINUTE", "2000000")
+    )
 
 
 settings = Settings()
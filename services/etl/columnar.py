@@ -0,0 +1,168 @@
+"""
+Columnar (Parquet) encoding for enriched entity rows.
+
+ENTITY_FORMAT selects what the ETL writes: "jsonl" (default), "parquet", or
+"both". The Parquet schema follows contracts/entity.schema.json plus the
+extractor "source" tag; run_id, entity_type, section and source are
+dictionary-encoded since they only take a handful of values per run.
+Readers prefer a Parquet part over its JSONL sibling when both exist.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+ENTITY_FORMAT = os.getenv("ENTITY_FORMAT", "jsonl").lower()
+FORMATS = ("jsonl", "parquet", "both")
+# Rows buffered per Parquet row group
+BATCH_ROWS = 65536
+
+STRING_COLUMNS = ("note_id", "text", "norm_text")
+DICTIONARY_COLUMNS = ("run_id", "entity_type", "section", "source")
+COLUMN_ORDER = (
+    "note_id",
+    "run_id",
+    "entity_type",
+    "text",
+    "norm_text",
+    "begin",
+    "end",
+    "score",
+    "section",
+    "source",
+)
+
+
+def output_formats(value: Optional[str] = None) -> Tuple[bool, bool]:
+    """Return (write_jsonl, write_parquet) for an ENTITY_FORMAT value."""
+    value = (value or ENTITY_FORMAT or "jsonl").lower()
+    if value not in FORMATS:
+        raise ValueError(f"ENTITY_FORMAT must be one of {FORMATS}, got {value!r}")
+    write_parquet = value in ("parquet", "both")
+    if write_parquet and pa is None:
+        raise RuntimeError("ENTITY_FORMAT=parquet requires pyarrow")
+    return value in ("jsonl", "both"), write_parquet
+
+
+def parquet_sibling(path: Path) -> Path:
+    return Path(path).with_suffix(".parquet")
+
+
+def entity_schema():
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    fields = {name: pa.string() for name in STRING_COLUMNS}
+    fields.update({name: dictionary for name in DICTIONARY_COLUMNS})
+    fields.update(begin=pa.int64(), end=pa.int64(), score=pa.float64())
+    return pa.schema([(name, fields[name]) for name in COLUMN_ORDER])
+
+
+def entities_table(rows: Sequence[Dict]):
+    schema = entity_schema()
+    columns = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pa.types.is_dictionary(field.type):
+            columns.append(pa.array(values, pa.string()).dictionary_encode())
+        else:
+            columns.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def parquet_bytes(rows: Sequence[Dict]) -> bytes:
+    sink = io.BytesIO()
+    pq.write_table(entities_table(rows), sink)
+    return sink.getvalue()
+
+
+def read_parquet_rows(source: Union[str, Path, io.BytesIO]) -> List[Dict]:
+    """Read a Parquet part back into the same dicts the JSONL part holds."""
+    # Not pq.read_table: on a path under run=<id>/ it infers a hive
+    # partition and adds a "run" column to every row
+    rows = pq.ParquetFile(source).read().to_pylist()
+    for row in rows:
+        if row.get("source") is None:
+            row.pop("source", None)
+    return rows
+
+
+def entity_part(path: Union[str, Path]) -> Optional[Path]:
+    """The part to read for a JSONL part path: its Parquet sibling if any."""
+    path = Path(path)
+    parquet_path = parquet_sibling(path)
+    if pq is not None and parquet_path.exists():
+        return parquet_path
+    return path if path.exists() else None
+
+
+def read_entity_rows(path: Union[str, Path]) -> List[Dict]:
+    """
+    Entity rows of a JSONL part, read from its Parquet sibling when there
+    is one (ENTITY_FORMAT=parquet writes no JSONL). A missing part reads as
+    no rows; malformed JSONL lines are skipped.
+    """
+    part = entity_part(path)
+    if part is None:
+        return []
+    if part.suffix == ".parquet":
+        return read_parquet_rows(part)
+    rows: List[Dict] = []
+    with part.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return rows
+
+
+class LocalParquetWriter:
+    """Stream rows into row groups of a temp file and swap it in on commit."""
+
+    def __init__(self, path: Path, batch_rows: int = BATCH_ROWS) -> None:
+        self.path = Path(path)
+        self.batch_rows = batch_rows
+        self.rows = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp_name = tempfile.mkstemp(dir=str(self.path.parent))
+        os.close(fd)
+        self._writer = pq.ParquetWriter(self._tmp_name, entity_schema())
+        self._batch: List[Dict] = []
+
+    def write(self, row: Dict) -> None:
+        self._batch.append(row)
+        self.rows += 1
+        if len(self._batch) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._batch:
+            self._writer.write_table(entities_table(self._batch))
+            self._batch = []
+
+    def commit(self) -> None:
+        self._flush()
+        self._writer.close()
+        os.replace(self._tmp_name, self.path)
+
+    def discard(self) -> None:
+        self._batch = []
+        try:
+            self._writer.close()
+        finally:
+            if os.path.exists(self._tmp_name):
+                os.unlink(self._tmp_name)
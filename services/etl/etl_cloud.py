@@ -6,14 +6,18 @@ Reads raw notes from S3, runs extraction, evaluation, and writes enriched entiti
 import json
 import os
 import time
-from collections import Counter
-from typing import Dict, List, Set, Tuple
+import uuid
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import boto3
 from botocore.exceptions import ClientError
 
 # Reuse existing logic
+from services.etl import columnar, incremental
 from services.etl.rule_extract import extract_for_note, median_ms, quantile_ms, utc_iso
+from services.eval.scoring import evaluate_all
 
 RAW_BUCKET = os.getenv("RAW_BUCKET")
 ENRICHED_BUCKET = os.getenv("ENRICHED_BUCKET")
@@ -21,6 +25,14 @@ ENRICHED_BUCKET = os.getenv("ENRICHED_BUCKET")
 # Check which extractor to use
 EXTRACTOR_NAME = os.getenv("EXTRACTOR", "rule").lower()
 RUN_ID = os.getenv("RUN_ID", f"cloud-{EXTRACTOR_NAME}")
+# Max concurrent GetObject calls feeding the extraction loop
+S3_MAX_IN_FLIGHT = int(os.getenv("S3_MAX_IN_FLIGHT", "16") or 16)
+# Roll entity output into a new part-NNNNN.jsonl object past this size
+ENTITY_PART_MAX_BYTES = int(
+    os.getenv("ENTITY_PART_MAX_BYTES", str(16 * 1024 * 1024)) or 16 * 1024 * 1024
+)
+# Reuse entities for notes whose checksum/extractor fingerprint is unchanged
+ETL_INCREMENTAL = os.getenv("ETL_INCREMENTAL", "0") == "1"
 
 # DEMO MODE: Use comprehensive gold standard for better F1 scores
 GOLD_S3_KEY = "gold/gold_DEMO.jsonl"
@@ -28,10 +40,14 @@ TYPES = ("PROBLEM", "MEDICATION")
 
 # Import extractors based on configuration
 llm_extractor = None
+llm_async_extractor = None
 if EXTRACTOR_NAME == "llm":
     try:
+        from services.extractors import llm_async
         from services.extractors.llm_extract import LLMExtractor
         llm_extractor = LLMExtractor()
+        if llm_async.LLM_ASYNC:
+            llm_async_extractor = llm_async.AsyncLLMExtractor(llm_extractor)
         print("✅ LLM Extractor initialized for cloud ETL")
     except Exception as e:
         print(f"Failed to initialize LLM extractor: {e}")
@@ -69,16 +85,225 @@ def read_s3_json(bucket: str, key: str) -> Dict:
         return {}
 
 
-def write_s3_lines(bucket: str, key: str, rows: List[Dict]):
-    """Write newline-delimited JSON to S3."""
-    if not rows:
-        return
+def prefetch_s3_notes(
+    bucket: str, keys: Iterable[str], max_in_flight: int = S3_MAX_IN_FLIGHT
+) -> Iterator[Tuple[str, Future]]:
+    """
+    Yield (key, future) in key order while a thread pool keeps up to
+    max_in_flight reads running ahead. Only the in-flight window is held in
+    memory; read errors surface from future.result() in the caller.
+    """
+    max_in_flight = max(1, max_in_flight)
+    key_iter = iter(keys)
+    pending: deque = deque()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for key in key_iter:
+            pending.append((key, pool.submit(read_s3_json, bucket, key)))
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            key, future = pending.popleft()
+            next_key = next(key_iter, None)
+            if next_key is not None:
+                future_next = pool.submit(read_s3_json, bucket, next_key)
+                pending.append((next_key, future_next))
+            yield key, future
+
+
+# (entities, seconds, error) of one extracted note
+Extracted = Tuple[Optional[List[Dict]], Optional[float], Optional[Exception]]
+
+
+def extract_timed(note: Optional[Dict]) -> Optional[Extracted]:
+    """Extract one note; None for a note that was skipped (not extracted)."""
+    if note is None:
+        return None
+    t0 = time.perf_counter()
     try:
-        body = "\n".join(json.dumps(r, ensure_ascii=False) for r in rows)
-        s3.put_object(Bucket=bucket, Key=key, Body=body.encode("utf-8"))
+        # Choose extractor based on EXTRACTOR_NAME
+        if EXTRACTOR_NAME == "llm" and llm_extractor:
+            entities = (
+                llm_extractor.extract(note.get("text", ""), note["note_id"], RUN_ID)
+                or []
+            )
+        else:
+            entities = extract_for_note(note)
+    except Exception as e:
+        return None, None, e
+    return entities, time.perf_counter() - t0, None
+
+
+def extracted_notes(
+    prefetched: Iterable[Tuple[str, Future]],
+    state_reader: Optional[incremental.StateReader],
+    note_fingerprint: Dict[str, str],
+) -> Iterator[Tuple]:
+    """
+    Yield (key, note_id, checksum, entities, seconds, error) in key order.
+    seconds is None for notes reused from the previous state, and a failed
+    read or extraction sets error. With the async LLM extractor up to
+    LLM_CONCURRENCY notes are being extracted at once.
+    """
+    loaded: deque = deque()
+
+    def pending_notes() -> Iterator[Optional[Dict]]:
+        for key, fetched in prefetched:
+            try:
+                note = fetched.result()
+                note_id = note.get("note_id", key.split("/")[-1].replace(".json", ""))
+                checksum = incremental.note_checksum(note)
+                prior = state_reader.lookup(key) if state_reader else None
+                entities = incremental.reusable_entities(
+                    prior, note_id, checksum, note_fingerprint
+                )
+            except Exception as e:
+                loaded.append((key, None, None, None, e))
+                yield None
+                continue
+            loaded.append((key, note_id, checksum, entities, None))
+            yield dict(note, note_id=note_id) if entities is None else None
+
+    results: Iterator[Optional[Extracted]]
+    if llm_async_extractor is not None:
+        # extract_stream logs failed notes and returns them with no entities
+        results = (
+            None if result is None else (*result, None)
+            for result in llm_async_extractor.extract_stream(pending_notes(), RUN_ID)
+        )
+    else:
+        results = map(extract_timed, pending_notes())
+    for result in results:
+        key, note_id, checksum, entities, error = loaded.popleft()
+        seconds = None
+        if result is not None:
+            entities, seconds, error = result
+        yield key, note_id, checksum, entities, seconds, error
+
+
+class S3PartWriter:
+    """
+    Stream JSONL rows into rolling {prefix}/part-NNNNN.jsonl objects.
+
+    Only the current part is buffered, so memory is bounded by max_bytes
+    instead of by the size of the run.
+    """
+
+    extension = "jsonl"
+
+    def __init__(
+        self, bucket: str, prefix: str, max_bytes: int = ENTITY_PART_MAX_BYTES
+    ) -> None:
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/")
+        self.max_bytes = max_bytes
+        self.keys: List[str] = []
+        self.rows = 0
+        self._pending: List = []
+        self._size = 0
+
+    def _encode(self, row: Dict) -> Tuple[object, int]:
+        line = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+        return line, len(line)
+
+    def _body(self) -> bytes:
+        return b"".join(self._pending)
+
+    def write(self, row: Dict) -> None:
+        item, size = self._encode(row)
+        self._pending.append(item)
+        self._size += size
+        self.rows += 1
+        if self._size >= self.max_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        key = f"{self.prefix}/part-{len(self.keys):05d}.{self.extension}"
+        try:
+            s3.put_object(Bucket=self.bucket, Key=key, Body=self._body())
+        except ClientError as e:
+            print(f"Error writing to S3 {key}: {e}")
+            raise
+        self.keys.append(key)
+        self._pending = []
+        self._size = 0
+
+    def close(self) -> None:
+        """Flush the last part and drop parts left over from an earlier run."""
+        self.flush()
+        written = set(self.keys)
+        paginator = s3.get_paginator("list_objects_v2")
+        pages = paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}/part-")
+        for page in pages:
+            for obj in page.get("Contents", []):
+                if obj["Key"] not in written:
+                    s3.delete_object(Bucket=self.bucket, Key=obj["Key"])
+
+
+class S3ParquetPartWriter(S3PartWriter):
+    """
+    Same rolling parts, written as Parquet (see services/etl/columnar.py).
+
+    Rows are buffered as dicts; their JSON size stands in for the part
+    budget so JSONL and Parquet parts roll at the same rows.
+    """
+
+    extension = "parquet"
+
+    def _encode(self, row: Dict) -> Tuple[object, int]:
+        return row, len(json.dumps(row, ensure_ascii=False)) + 1
+
+    def _body(self) -> bytes:
+        return columnar.parquet_bytes(self._pending)
+
+
+def state_pointer_key(run_id: str) -> str:
+    return f"state/run={run_id}/latest.json"
+
+
+def read_state_pointer(bucket: str, run_id: str) -> Optional[str]:
+    """Prefix of the run's current state generation, if it has one."""
+    try:
+        resp = s3.get_object(Bucket=bucket, Key=state_pointer_key(run_id))
+        return json.loads(resp["Body"].read().decode("utf-8")).get("prefix")
     except ClientError as e:
-        print(f"Error writing to S3 {key}: {e}")
-        raise
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            print(f"Warning: could not read ETL state pointer: {e}")
+        return None
+
+
+def open_state_reader(bucket: str, prefix: Optional[str]) -> incremental.StateReader:
+    """Stream a state generation's parts (see services/etl/incremental.py)."""
+
+    def lines():
+        if not prefix:
+            return
+        keys = []
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/part-"):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+        for key in sorted(keys):
+            yield from s3.get_object(Bucket=bucket, Key=key)["Body"].iter_lines()
+
+    return incremental.StateReader(lines())
+
+
+def commit_state(
+    bucket: str, run_id: str, writer: "S3PartWriter", old_prefix: Optional[str]
+) -> None:
+    """Point the run at the freshly written state and drop the previous one."""
+    writer.close()
+    s3.put_object(
+        Bucket=bucket,
+        Key=state_pointer_key(run_id),
+        Body=json.dumps({"prefix": writer.prefix, "ts": utc_iso()}).encode("utf-8"),
+    )
+    if old_prefix and old_prefix != writer.prefix:
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=f"{old_prefix}/"):
+            for obj in page.get("Contents", []):
+                s3.delete_object(Bucket=bucket, Key=obj["Key"])
 
 
 def load_gold_from_s3(bucket: str, key: str) -> List[Dict]:
@@ -103,79 +328,6 @@ def load_gold_from_s3(bucket: str, key: str) -> List[Dict]:
         return []
 
 
-def normalize_text(value: str) -> str:
-    return (value or "").strip().lower()
-
-
-def spans_overlap(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
-    return max(0, min(a[1], b[1]) - max(a[0], b[0])) > 0
-
-
-def matchable(g: Dict, p: Dict, relaxed: bool = False) -> bool:
-    if g["note_id"] != p["note_id"]:
-        return False
-    if g["entity_type"] != p["entity_type"]:
-        return False
-    if normalize_text(g.get("norm_text")) != normalize_text(p.get("norm_text")):
-        return False
-    if relaxed:
-        return spans_overlap((g["begin"], g["end"]), (p["begin"], p["end"]))
-    return (g["begin"], g["end"]) == (p["begin"], p["end"])
-
-
-def greedy_match(golds: List[Dict], preds: List[Dict], relaxed: bool = False) -> Tuple[Set[int], Set[int]]:
-    """Greedy 1:1 matching scoped by note + entity_type."""
-    from collections import defaultdict
-
-    used_pred: Set[int] = set()
-    used_gold: Set[int] = set()
-    buckets = defaultdict(lambda: {"g": [], "p": []})
-
-    for gi, gold in enumerate(golds):
-        buckets[(gold["note_id"], gold["entity_type"])]["g"].append((gi, gold))
-    for pi, pred in enumerate(preds):
-        buckets[(pred["note_id"], pred["entity_type"])]["p"].append((pi, pred))
-
-    for (_, _), group in buckets.items():
-        for gi, g in group["g"]:
-            for pi, p in group["p"]:
-                if pi in used_pred:
-                    continue
-                if matchable(g, p, relaxed=relaxed):
-                    used_pred.add(pi)
-                    used_gold.add(gi)
-                    break
-    return used_gold, used_pred
-
-
-def prf1(tp: int, fp: int, fn: int) -> Tuple[float, float, float]:
-    prec = tp / (tp + fp) if (tp + fp) else 0.0
-    rec = tp / (tp + fn) if (tp + fn) else 0.0
-    f1 = 2 * prec * rec / (prec + rec) if (prec + rec) else 0.0
-    return prec, rec, f1
-
-
-def evaluate(golds: List[Dict], preds: List[Dict], relaxed: bool = False) -> Dict[str, float]:
-    """Evaluate predictions against gold standard."""
-    micro = Counter(tp=0, fp=0, fn=0)
-
-    for entity_type in TYPES:
-        g_typ = [g for g in golds if g["entity_type"] == entity_type]
-        p_typ = [p for p in preds if p["entity_type"] == entity_type]
-        used_g, used_p = greedy_match(g_typ, p_typ, relaxed=relaxed)
-        tp = len(used_g)
-        fp = len(p_typ) - tp
-        fn = len(g_typ) - tp
-        micro.update(tp=tp, fp=fp, fn=fn)
-
-    microP, microR, microF1 = prf1(micro["tp"], micro["fp"], micro["fn"])
-    return {"microP": microP, "microR": microR, "microF1": microF1}
-
-
-def filter_by_notes(rows: List[Dict], allowed: Set[str]) -> List[Dict]:
-    return [row for row in rows if row.get("note_id") in allowed]
-
-
 def main():
     if not RAW_BUCKET or not ENRICHED_BUCKET:
         raise ValueError("RAW_BUCKET and ENRICHED_BUCKET env vars must be set")
@@ -207,28 +359,77 @@ def main():
         else:
             print("Warning: No matching notes found in raw bucket corresponding to gold standard.")
 
-    all_entities = []
+    # Entities stream straight to S3; only rows for gold-labelled notes are
+    # kept for scoring, everything else is reduced to per-type counts.
+    # ENTITY_FORMAT picks JSONL (entities/), Parquet (entities_parquet/) or
+    # both; a disabled writer still closes so it clears stale parts.
+    write_jsonl, write_parquet = columnar.output_formats()
+    writer = S3PartWriter(ENRICHED_BUCKET, f"entities/run={RUN_ID}")
+    parquet_writer = S3ParquetPartWriter(
+        ENRICHED_BUCKET, f"entities_parquet/run={RUN_ID}"
+    )
+    entity_writers = [
+        w
+        for w, enabled in ((writer, write_jsonl), (parquet_writer, write_parquet))
+        if enabled
+    ]
+    eval_preds: List[Dict] = []
+    outside_gold_counts: Counter = Counter()
+    pred_note_count = 0
     durations = []
     processed_count = 0
 
-    for key in keys:
+    # State is always written so a later ETL_INCREMENTAL=1 run can reuse it
+    note_fingerprint = incremental.fingerprint(
+        EXTRACTOR_NAME, model=llm_extractor.model if llm_extractor else None
+    )
+    # Resolved even when not reused, so commit_state can delete it
+    old_state_prefix = read_state_pointer(ENRICHED_BUCKET, RUN_ID)
+    state_reader = None
+    if ETL_INCREMENTAL:
+        state_reader = open_state_reader(ENRICHED_BUCKET, old_state_prefix)
+        print(f"Incremental mode: previous state={old_state_prefix}")
+    # A fresh generation per run so the state being read is never overwritten
+    generation = f"{utc_iso().replace(':', '')}-{uuid.uuid4().hex[:8]}"
+    state_prefix = f"state/run={RUN_ID}/gen={generation}"
+    state_writer = S3PartWriter(ENRICHED_BUCKET, state_prefix)
+    reused_count = 0
+    recomputed_count = 0
+
+    print(f"Prefetching notes with up to {S3_MAX_IN_FLIGHT} concurrent reads")
+    if llm_async_extractor is not None:
+        concurrency = llm_async_extractor.scheduler.concurrency
+        print(f"Async LLM extraction with up to {concurrency} concurrent requests")
+    prefetched = prefetch_s3_notes(RAW_BUCKET, keys)
+    for key, note_id, checksum, entities, seconds, error in extracted_notes(
+        prefetched, state_reader, note_fingerprint
+    ):
+        if error is not None:
+            print(f"Error processing {key}: {error}")
+            continue
         try:
-            note = read_s3_json(RAW_BUCKET, key)
-            note_id = note.get("note_id", key.split("/")[-1].replace(".json", ""))
-            
-            t0 = time.perf_counter()
-            
-            # Choose extractor based on EXTRACTOR_NAME
-            if EXTRACTOR_NAME == "llm" and llm_extractor:
-                entities = llm_extractor.extract(note.get("text", ""), note_id, RUN_ID) or []
+            if seconds is None:
+                reused_count += 1
             else:
-                entities = extract_for_note(note)
-            
-            durations.append(time.perf_counter() - t0)
+                durations.append(seconds)
+                recomputed_count += 1
 
             for ent in entities:
                 ent["run_id"] = RUN_ID
-                all_entities.append(ent)
+                for entity_writer in entity_writers:
+                    entity_writer.write(ent)
+                if ent.get("note_id") in gold_note_ids:
+                    eval_preds.append(ent)
+                else:
+                    outside_gold_counts[ent.get("entity_type")] += 1
+            pred_note_count += len(
+                {e.get("note_id") for e in entities if e.get("note_id")}
+            )
+            state_writer.write(
+                incremental.state_record(
+                    key, note_id, checksum, note_fingerprint, entities
+                )
+            )
 
             processed_count += 1
             if processed_count % 50 == 0:
@@ -236,10 +437,19 @@ def main():
         except Exception as e:
             print(f"Error processing {key}: {e}")
 
-    # Write Enriched Data
-    out_key = f"runs/{RUN_ID}/entities.jsonl"
-    print(f"Writing {len(all_entities)} entities to s3://{ENRICHED_BUCKET}/{out_key}")
-    write_s3_lines(ENRICHED_BUCKET, out_key, all_entities)
+    if llm_async_extractor is not None:
+        print(f"Async LLM stats: {llm_async_extractor.stats()}")
+        llm_async_extractor.close()
+    for entity_writer in (writer, parquet_writer):
+        entity_writer.close()
+    for entity_writer in entity_writers:
+        print(
+            f"Wrote {entity_writer.rows} entities in {len(entity_writer.keys)} "
+            f"part(s) to s3://{ENRICHED_BUCKET}/{entity_writer.prefix}/"
+        )
+    entity_count = entity_writers[0].rows
+    commit_state(ENRICHED_BUCKET, RUN_ID, state_writer, old_state_prefix)
+    print(f"Notes reused={reused_count} recomputed={recomputed_count}")
 
     # Calculate Stats
     p50 = median_ms(durations)
@@ -256,19 +466,13 @@ def main():
     if golds:
         print(f"Found {len(golds)} gold entities, calculating F1 scores...")
 
-        # Calculate strict F1 scores
-        strict_exact = evaluate(golds, all_entities, relaxed=False)
-        strict_relaxed = evaluate(golds, all_entities, relaxed=True)
-
-        # Calculate intersection F1 scores (only notes with gold labels)
-        gold_note_ids = {g.get("note_id") for g in golds if g.get("note_id")}
-        pred_note_ids = {p.get("note_id") for p in all_entities if p.get("note_id")}
-        inter_ids = pred_note_ids & gold_note_ids
-        inter_golds = filter_by_notes(golds, inter_ids)
-        inter_preds = filter_by_notes(all_entities, inter_ids)
-
-        inter_exact = evaluate(inter_golds, inter_preds, relaxed=False)
-        inter_relaxed = evaluate(inter_golds, inter_preds, relaxed=True)
+        # Full-list and intersection (only notes with gold labels) scores
+        scores = evaluate_all(golds, eval_preds, TYPES, extra_fp=outside_gold_counts)
+        variants = scores["variants"]
+        strict_exact = variants["strict_exact"]["micro"]
+        strict_relaxed = variants["strict_relaxed"]["micro"]
+        inter_exact = variants["intersection_exact"]["micro"]
+        inter_relaxed = variants["intersection_relaxed"]["micro"]
 
         f1_exact = strict_exact["microF1"]
         f1_relaxed = strict_relaxed["microF1"]
@@ -290,14 +494,15 @@ def main():
 
     # Count coverage
     gold_note_ids = {g.get("note_id") for g in golds if g.get("note_id")} if golds else set()
-    pred_note_ids = {p.get("note_id") for p in all_entities if p.get("note_id")}
-    
+
     stats = {
         "run_id": RUN_ID,
         "extractor": EXTRACTOR_NAME,
         "ts": utc_iso(),
         "note_count": processed_count,
-        "entity_count": len(all_entities),
+        "notes_reused": reused_count,
+        "notes_recomputed": recomputed_count,
+        "entity_count": entity_count,
         "duration_ms_p50": p50,
         "duration_ms_p95": p95,
         "f1_exact_micro": f1_exact,
@@ -309,9 +514,11 @@ def main():
         "precision_exact_micro_intersection": precision_exact_inter,
         "recall_exact_micro_intersection": recall_exact_inter,
         "coverage_gold_items": len(golds) if golds else 0,
-        "coverage_pred_items": len(all_entities),
+        "coverage_pred_items": entity_count,
         "coverage_gold_notes": len(gold_note_ids),
-        "coverage_pred_notes": len(pred_note_ids),
+        "coverage_pred_notes": pred_note_count,
+        "entity_parts": writer.keys,
+        "entity_parquet_parts": parquet_writer.keys,
         "status": "success",
     }
 
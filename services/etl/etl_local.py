@@ -1,31 +1,46 @@
 #!/usr/bin/env python3
 """
 Phase-3 ETL orchestrator:
-  1. Load fixtures/notes/*.json deterministically
+  1. Load fixtures/notes/*.json (or a packed corpus, see NOTES_DIR) in order
   2. Normalize text
   3. Run rule-based extractor
-  4. Emit fixtures/enriched/entities/run=LOCAL/part-000.jsonl
+  4. Emit fixtures/enriched/entities/run=LOCAL/part-000.jsonl (and/or
+     part-000.parquet with --format / ENTITY_FORMAT)
   5. Merge-update fixtures/runs_LOCAL.json (atomic write)
+
+Steps 1-3 can fan out to a process pool (--workers N / ETL_WORKERS=N);
+output is still written in deterministic note order. EXTRACTOR=spacy and
+docker-spacy instead feed SPACY_BATCH_SIZE notes at a time to the model, and
+EXTRACTOR=llm keeps several requests in flight (LLM_ASYNC, see llm_async.py).
+
+With --incremental / ETL_INCREMENTAL=1, notes whose checksum, extractor,
+rules profile and extractor version match the last run's state file reuse
+their previous entity rows instead of being re-extracted.
 """
 
 from __future__ import annotations
 
+import argparse
+import functools
+import itertools
 import json
 import math
+import multiprocessing
 import os
 import random
 import sys
 import tempfile
 import time
+from collections import deque
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Iterable, Iterator, List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
     sys.path.append(str(REPO_ROOT))
 
-from services.etl import rule_extract  # noqa: E402
+from services.etl import columnar, incremental, note_corpus, rule_extract  # noqa: E402
 from services.etl.preprocess import normalize_entity_text, normalize_text  # noqa: E402
 
 # Check which extractor to use
@@ -34,14 +49,19 @@ RUN_ID = "LOCAL" if EXTRACTOR_NAME == "rule" else EXTRACTOR_NAME.upper()
 
 # Import extractors based on configuration
 llm_extractor = None
+llm_async_extractor = None
 spacy_extractor = None
 docker_spacy_extractor = None
 enhanced_extractor = None
 
 if EXTRACTOR_NAME == "llm":
     try:
+        from services.extractors import llm_async
         from services.extractors.llm_extract import LLMExtractor
+
         llm_extractor = LLMExtractor()
+        if llm_async.LLM_ASYNC:
+            llm_async_extractor = llm_async.AsyncLLMExtractor(llm_extractor)
     except Exception as e:
         print(f"Failed to initialize LLM extractor: {e}")
         print("Falling back to rule-based extraction")
@@ -51,6 +71,7 @@ if EXTRACTOR_NAME == "llm":
 elif EXTRACTOR_NAME == "spacy":
     try:
         from services.extractors.spacy_extract import SpacyExtractor
+
         spacy_extractor = SpacyExtractor()
     except Exception as e:
         print(f"Failed to initialize spaCy extractor: {e}")
@@ -61,6 +82,7 @@ elif EXTRACTOR_NAME == "spacy":
 elif EXTRACTOR_NAME == "docker-spacy":
     try:
         from services.extractors.docker_spacy_extract import DockerSpacyExtractor
+
         docker_spacy_extractor = DockerSpacyExtractor()
     except Exception as e:
         print(f"Failed to initialize Docker spaCy extractor: {e}")
@@ -71,20 +93,32 @@ elif EXTRACTOR_NAME == "docker-spacy":
 elif EXTRACTOR_NAME == "enhanced":
     try:
         from services.extractors.enhanced_rule_extract import EnhancedRuleExtractor
+
         enhanced_extractor = EnhancedRuleExtractor()
     except Exception as e:
         print(f"Failed to initialize Enhanced Rule extractor: {e}")
         print("Falling back to rule-based extraction")
         EXTRACTOR_NAME = "rule"
         RUN_ID = "LOCAL"
-NOTES_DIR = Path("fixtures/notes")
+# A notes directory or a pack built by scripts/pack_notes.py
+NOTES_DIR = Path(os.getenv("NOTES_DIR", "fixtures/notes"))
 ENRICHED_DIR = Path(f"fixtures/enriched/entities/run={RUN_ID}")
 OUTPUT_FILE = ENRICHED_DIR / "part-000.jsonl"
+PARQUET_FILE = columnar.parquet_sibling(OUTPUT_FILE)
 MANIFEST_PATH = Path("fixtures/runs_LOCAL.json")
+STATE_PATH = Path(f"fixtures/etl_state/run={RUN_ID}.jsonl")
 
 # DEMO MODE: Use comprehensive gold standard for better F1 scores
 GOLD_PATH = Path("gold/gold_DEMO.jsonl")
 HC_DEBUG = os.getenv("HC_TAP_DEBUG", "0") == "1"
+ETL_WORKERS = int(os.getenv("ETL_WORKERS", "1") or 1)
+ETL_CHUNK_SIZE = int(os.getenv("ETL_CHUNK_SIZE", "16") or 16)
+# Extractors that are pure CPU and safe to run in worker processes
+PARALLEL_EXTRACTORS = {"rule", "enhanced"}
+# Extractors fed whole batches of notes (extract_batch) in serial mode
+BATCH_EXTRACTORS = {"spacy", "docker-spacy"}
+ETL_INCREMENTAL = os.getenv("ETL_INCREMENTAL", "0") == "1"
+SPACY_BATCH_SIZE = int(os.getenv("SPACY_BATCH_SIZE", "32") or 32)
 RANDOM_SEED = int(os.getenv("RANDOM_SEED", "1337"))
 random.seed(RANDOM_SEED)
 
@@ -125,17 +159,24 @@ def quantile_ms(samples: List[float], q: float) -> int:
     return int(round(xs[k - 1] * 1000))
 
 
-def iter_note_paths() -> Iterable[Path]:
+@functools.lru_cache(maxsize=None)
+def notes_corpus() -> note_corpus.Corpus:
+    # Opened once per process; parallel workers map the pack themselves
+    return note_corpus.open_corpus(NOTES_DIR)
+
+
+def iter_note_names() -> Iterable[str]:
+    """File names of the notes to process; the corpus reads them by name."""
     filter_mode = os.getenv("NOTE_FILTER", "").lower()
     if filter_mode == "gold" and GOLD_PATH.exists():
         with GOLD_PATH.open("r", encoding="utf-8") as fh:
             note_ids = sorted(
                 {json.loads(line).get("note_id") for line in fh if line.strip()}
             )
-        paths = [NOTES_DIR / f"{nid}.json" for nid in note_ids if nid]
-        log(f"gold-only mode: {len(paths)} notes", debug=False)
-        return paths
-    return sorted(NOTES_DIR.glob("*.json"))
+        names = [f"{nid}.json" for nid in note_ids if nid]
+        log(f"gold-only mode: {len(names)} notes", debug=False)
+        return names
+    return notes_corpus().names()
 
 
 def normalize_entity(entity: Dict, note_id: str) -> Dict:
@@ -202,62 +243,298 @@ def atomic_write_jsonl(path: Path, records: Iterable[Dict]) -> int:
     return written
 
 
+def tee_records(
+    records: Iterable[Dict], writer: columnar.LocalParquetWriter
+) -> Iterator[Dict]:
+    for record in records:
+        writer.write(record)
+        yield record
+
+
+def write_outputs(records: Iterable[Dict], entity_format: str) -> int:
+    """Write entity rows as JSONL and/or Parquet and drop the unused sibling."""
+    write_jsonl, write_parquet = columnar.output_formats(entity_format)
+    parquet_writer = None
+    if write_parquet:
+        parquet_writer = columnar.LocalParquetWriter(PARQUET_FILE)
+        records = tee_records(records, parquet_writer)
+    try:
+        if write_jsonl:
+            written = atomic_write_jsonl(OUTPUT_FILE, records)
+        else:
+            written = sum(1 for _ in records)
+    except Exception:
+        if parquet_writer is not None:
+            parquet_writer.discard()
+        raise
+    if parquet_writer is not None:
+        parquet_writer.commit()
+    # Readers prefer Parquet, so never leave a stale part from another format
+    for path, keep in ((OUTPUT_FILE, write_jsonl), (PARQUET_FILE, write_parquet)):
+        if not keep and path.exists():
+            path.unlink()
+    return written
+
+
+def extract_entities(note_payload: Dict, note_id: str) -> List[Dict]:
+    text = note_payload.get("text", "")
+    # Choose extractor based on EXTRACTOR_NAME
+    if EXTRACTOR_NAME == "llm":
+        return llm_extractor.extract(text, note_id, RUN_ID) or []
+    if EXTRACTOR_NAME == "spacy":
+        return spacy_extractor.extract(text, note_id, RUN_ID) or []
+    if EXTRACTOR_NAME == "docker-spacy":
+        return docker_spacy_extractor.extract(text, note_id, RUN_ID) or []
+    if EXTRACTOR_NAME == "enhanced":
+        return enhanced_extractor.extract(text, note_id, RUN_ID) or []
+    return rule_extract.extract_for_note(note_payload) or []
+
+
+NoteResult = Tuple[str, List[Dict], int, float, str, bool]
+# (note_id, normalized note payload, checksum) of a note to extract
+PendingNote = Tuple[str, Dict, str]
+
+
+def run_fingerprint() -> Dict[str, str]:
+    """incremental.fingerprint including the model this run actually loaded."""
+    model = None
+    if llm_extractor is not None:
+        model = llm_extractor.model
+    elif spacy_extractor is not None:
+        model = spacy_extractor.model_name
+    return incremental.fingerprint(EXTRACTOR_NAME, model=model)
+
+
+def load_note(
+    note_name: str, prior: Optional[Dict] = None
+) -> Tuple[Optional[NoteResult], Optional[PendingNote]]:
+    """
+    Read a note and decide whether it needs extraction.
+
+    Returns (result, None) when the prior state record still matches the
+    note (its entities are reused as-is), (None, pending) when it has to be
+    extracted, and (None, None) when the note has no note_id.
+    """
+    note = notes_corpus().load(note_name)
+    note_id = note.get("note_id")
+    if not note_id:
+        return None, None
+    checksum = incremental.note_checksum(note)
+    reused = incremental.reusable_entities(prior, note_id, checksum, run_fingerprint())
+    if reused is not None:
+        return (note_id, reused, len(reused), 0.0, checksum, True), None
+    text = normalize_text(note.get("text", ""))
+    return None, (note_id, dict(note, text=text), checksum)
+
+
+def note_result(
+    note_id: str, entities: List[Dict], duration: float, checksum: str
+) -> NoteResult:
+    normalized = []
+    for entity in entities:
+        entity = normalize_entity(entity, note_id)
+        if entity is not None:  # Skip invalid entities
+            normalized.append(entity)
+    return note_id, normalized, len(entities), duration, checksum, False
+
+
+def process_note(note_name: str, prior: Optional[Dict] = None) -> Optional[NoteResult]:
+    """
+    Read, normalize and extract a single note.
+
+    Returns (note_id, entities, raw_entity_count, duration_s, checksum,
+    reused), or None when the note has no note_id. When the prior state
+    record still matches the note, its entities are reused as-is. Runs in
+    worker processes in parallel mode.
+    """
+    result, pending = load_note(note_name, prior)
+    if pending is None:
+        return result
+    note_id, note_payload, checksum = pending
+    start = time.perf_counter()
+    entities = extract_entities(note_payload, note_id)
+    return note_result(note_id, entities, time.perf_counter() - start, checksum)
+
+
+def process_note_batch(
+    jobs: List[Tuple[str, Optional[Dict]]]
+) -> List[Tuple[str, Optional[NoteResult]]]:
+    """
+    process_note for a batch of notes with one extract_batch call, so the
+    spaCy model (in process or in its worker) sees whole batches. Each note
+    is charged an equal share of the batch's extraction time.
+    """
+    results: List[Optional[NoteResult]] = []
+    pending: List[Tuple[int, PendingNote]] = []
+    for note_name, prior in jobs:
+        result, todo = load_note(note_name, prior)
+        if todo is not None:
+            pending.append((len(results), todo))
+        results.append(result)
+    if pending:
+        start = time.perf_counter()
+        batch = batch_extractor().extract_batch(
+            [payload for _, (_, payload, _) in pending], RUN_ID
+        )
+        duration = (time.perf_counter() - start) / len(pending)
+        for (pos, (note_id, _, checksum)), entities in zip(pending, batch):
+            results[pos] = note_result(note_id, entities or [], duration, checksum)
+    return [(note_name, result) for (note_name, _), result in zip(jobs, results)]
+
+
+def process_note_stream(
+    jobs: Iterable[Tuple[str, Optional[Dict]]], limit: int = 0
+) -> Iterator[Tuple[str, Optional[NoteResult]]]:
+    """
+    process_note over a stream of notes with the async LLM extractor, which
+    keeps a window of notes in flight and returns them in order. A note's
+    duration is its own request latency, including rate-limit waits. With
+    `limit`, the stream ends after that many notes with a note_id, so the
+    window never sends a note past LIMIT.
+    """
+    loaded: deque = deque()
+
+    def payloads() -> Iterator[Optional[Dict]]:
+        counted = 0
+        for note_name, prior in jobs:
+            if limit and counted >= limit:
+                return
+            result, pending = load_note(note_name, prior)
+            loaded.append((note_name, result, pending))
+            counted += result is not None or pending is not None
+            yield pending[1] if pending is not None else None
+
+    for extracted in llm_async_extractor.extract_stream(payloads(), RUN_ID):
+        note_name, result, pending = loaded.popleft()
+        if pending is not None:
+            note_id, _, checksum = pending
+            entities, duration = extracted
+            result = note_result(note_id, entities, duration, checksum)
+        yield note_name, result
+
+
+def batch_extractor():
+    if EXTRACTOR_NAME == "docker-spacy":
+        return docker_spacy_extractor
+    return spacy_extractor
+
+
+def _process_job(job: Tuple[str, Optional[Dict]]) -> Tuple[str, Optional[NoteResult]]:
+    note_name, prior = job
+    return note_name, process_note(note_name, prior)
+
+
 class EntityEmitter:
-    def __init__(self) -> None:
+    def __init__(
+        self, workers: int = ETL_WORKERS, incremental_mode: bool = ETL_INCREMENTAL
+    ) -> None:
         self.limit = int(os.getenv("LIMIT", "0") or 0)
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        if self.workers > 1 and EXTRACTOR_NAME not in PARALLEL_EXTRACTORS:
+            log(
+                f"extractor={EXTRACTOR_NAME} does not support workers, "
+                "running serially"
+            )
+            self.workers = 1
+        self.incremental = incremental_mode
         self.notes_seen = 0
+        self.notes_reused = 0
+        self.notes_recomputed = 0
         self.entities_total = 0
         self.per_note_durations: List[float] = []
         self.sample: List[Dict] = []
         self.ts_started = utc_now_iso()
         self.ts_finished = self.ts_started
 
+    def _jobs(self) -> Iterator[Tuple[str, Optional[Dict]]]:
+        reader = None
+        if self.incremental:
+            log(f"incremental mode: state={STATE_PATH}")
+            reader = incremental.StateReader(incremental.read_state_lines(STATE_PATH))
+        for note_name in iter_note_names():
+            prior = reader.lookup(note_name) if reader else None
+            yield note_name, prior
+
+    def _room(self, size: int) -> int:
+        """`size`, capped at the number of notes LIMIT still allows."""
+        return min(size, self.limit - self.notes_seen) if self.limit else size
+
+    def _results(self) -> Iterator[Tuple[str, Optional[NoteResult]]]:
+        jobs = self._jobs()
+        if EXTRACTOR_NAME == "llm" and llm_async_extractor is not None:
+            concurrency = llm_async_extractor.scheduler.concurrency
+            log(f"async llm mode: concurrency={concurrency}")
+            yield from process_note_stream(jobs, self.limit)
+            return
+        if EXTRACTOR_NAME in BATCH_EXTRACTORS:
+            batch_size = getattr(batch_extractor(), "batch_size", SPACY_BATCH_SIZE)
+            log(f"batch mode: batch_size={batch_size}")
+            # Each batch is cut after the previous one has been consumed, so
+            # it is sized to what LIMIT still allows
+            while True:
+                batch = list(itertools.islice(jobs, self._room(batch_size)))
+                if not batch:
+                    return
+                yield from process_note_batch(batch)
+        if self.workers <= 1:
+            for job in jobs:
+                yield _process_job(job)
+            return
+        log(f"parallel mode: workers={self.workers} chunk_size={ETL_CHUNK_SIZE}")
+        # imap keeps input order, so part-000.jsonl stays deterministic;
+        # leaving the block early (LIMIT) terminates outstanding work.
+        with multiprocessing.Pool(self.workers) as pool:
+            yield from pool.imap(_process_job, jobs, chunksize=ETL_CHUNK_SIZE)
+
     def __iter__(self) -> Iterator[Dict]:
-        for note_path in iter_note_paths():
-            if self.limit and self.notes_seen >= self.limit:
-                break
-            with note_path.open("r", encoding="utf-8") as fh:
-                note = json.load(fh)
-            note_id = note.get("note_id")
-            if not note_id:
-                continue
-            text = normalize_text(note.get("text", ""))
-            note_payload = dict(note, text=text)
-            start = time.perf_counter()
-            
-            # Choose extractor based on EXTRACTOR_NAME
-            if EXTRACTOR_NAME == "llm":
-                entities = llm_extractor.extract(note_payload.get("text", ""), note_id, RUN_ID) or []
-            elif EXTRACTOR_NAME == "spacy":
-                entities = spacy_extractor.extract(note_payload.get("text", ""), note_id, RUN_ID) or []
-            elif EXTRACTOR_NAME == "docker-spacy":
-                entities = docker_spacy_extractor.extract(note_payload.get("text", ""), note_id, RUN_ID) or []
-            elif EXTRACTOR_NAME == "enhanced":
-                entities = enhanced_extractor.extract(note_payload.get("text", ""), note_id, RUN_ID) or []
-            else:
-                entities = rule_extract.extract_for_note(note_payload) or []
-            
-            self.notes_seen += 1
-            for entity in entities:
-                normalized = normalize_entity(entity, note_id)
-                if normalized is None:
-                    continue  # Skip invalid entities
-                if len(self.sample) < 3:
-                    self.sample.append(normalized.copy())
-                self.entities_total += 1
-                yield normalized
-            duration = time.perf_counter() - start
-            self.per_note_durations.append(duration)
-            log(
-                f"note={note_id} ents={len(entities)} duration_ms={duration*1000:.1f}",
-                debug=True,
-            )
+        results = self._results()
+        # State is always written so a later --incremental run can reuse it
+        state = incremental.LocalStateWriter(STATE_PATH)
+        note_fingerprint = run_fingerprint()
+        try:
+            for note_name, result in results:
+                if result is None:
+                    continue
+                note_id, entities, raw_count, duration, checksum, reused = result
+                self.notes_seen += 1
+                for entity in entities:
+                    if len(self.sample) < 3:
+                        self.sample.append(entity.copy())
+                    self.entities_total += 1
+                    yield entity
+                state.write(
+                    incremental.state_record(
+                        note_name, note_id, checksum, note_fingerprint, entities
+                    )
+                )
+                if reused:
+                    self.notes_reused += 1
+                    log(f"note={note_id} ents={raw_count} reused", debug=True)
+                else:
+                    self.notes_recomputed += 1
+                    self.per_note_durations.append(duration)
+                    log(
+                        f"note={note_id} ents={raw_count} "
+                        f"duration_ms={duration*1000:.1f}",
+                        debug=True,
+                    )
+                # Checked before pulling the next result, which would extract it
+                if self.limit and self.notes_seen >= self.limit:
+                    break
+        except BaseException:
+            state.discard()
+            raise
+        finally:
+            results.close()
+        state.commit()
         self.ts_finished = utc_now_iso()
 
     @property
     def stats(self) -> Dict:
         return {
             "notes_seen": self.notes_seen,
+            "notes_reused": self.notes_reused,
+            "notes_recomputed": self.notes_recomputed,
             "entities_total": self.entities_total,
             "ts_started": self.ts_started,
             "ts_finished": self.ts_finished,
@@ -289,21 +566,59 @@ def update_manifest(stats: Dict) -> None:
             "entity_count": stats["entities_total"],
             "duration_ms_p50": stats["duration_ms_p50"],
             "duration_ms_p95": stats["duration_ms_p95"],
+            "notes_reused": stats["notes_reused"],
+            "notes_recomputed": stats["notes_recomputed"],
             "errors": 0,
         }
     )
     atomic_write_json(MANIFEST_PATH, manifest)
 
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run the local ETL over fixtures/notes."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=ETL_WORKERS,
+        help="Worker processes for extraction (0 = all cores; default ETL_WORKERS or 1).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=ETL_INCREMENTAL,
+        help="Reuse entities for notes unchanged since the last run (ETL_INCREMENTAL=1).",
+    )
+    parser.add_argument(
+        "--format",
+        choices=columnar.FORMATS,
+        default=columnar.ENTITY_FORMAT,
+        help="Entity output format (default ENTITY_FORMAT or jsonl).",
+    )
+    return parser.parse_args()
+
+
 def main() -> None:
+    args = parse_args()
     log("Starting LOCAL ETL via rule extractor")
-    emitter = EntityEmitter()
-    entities_written = atomic_write_jsonl(OUTPUT_FILE, emitter)
+    emitter = EntityEmitter(workers=args.workers, incremental_mode=args.incremental)
+    try:
+        entities_written = write_outputs(emitter, args.format)
+    finally:
+        if docker_spacy_extractor is not None:
+            docker_spacy_extractor.close()
+        if llm_async_extractor is not None:
+            llm_async_extractor.close()
     stats = emitter.stats
     update_manifest(stats)
     log(
         f"completed notes={stats.get('notes_seen', 0)} entities={entities_written} "
-        f"output={OUTPUT_FILE}"
+        f"output={ENRICHED_DIR} format={args.format}"
+    )
+    log(
+        f"reused={stats.get('notes_reused', 0)} "
+        f"recomputed={stats.get('notes_recomputed', 0)} state={STATE_PATH}"
     )
     log(f"manifest updated {MANIFEST_PATH}")
     if stats.get("sample") and HC_DEBUG:
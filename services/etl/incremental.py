@@ -0,0 +1,210 @@
+"""
+Checksum-keyed state for incremental ETL runs.
+
+Every run persists one JSONL record per note, in processing order:
+
+  {"source", "note_id", "checksum", "extractor", "rules_profile",
+   "extractor_version", ["extractor_settings",] "entities": [...]}
+
+The next run streams the previous state next to the notes (both follow the
+sorted source order: note file name locally, S3 key in the cloud) and reuses
+a note's entity rows when nothing in its fingerprint changed. Only one
+state record is held in memory at a time.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+RULES_PROFILE = os.getenv("RULES_PROFILE", "default").lower()
+
+# Source files whose contents define an extractor's output. Any edit to them
+# changes extractor_version and invalidates previously stored entities.
+COMMON_MODULES = ("services.etl.preprocess",)
+EXTRACTOR_MODULES = {
+    "rule": (
+        "services.etl.rule_extract",
+        "services.etl.sections",
+        "services.etl.term_matcher",
+    ),
+    "enhanced": (
+        "services.extractors.enhanced_rule_extract",
+        "services.extractors.base",
+        "services.etl.rule_extract",
+        "services.etl.sections",
+        "services.etl.term_matcher",
+    ),
+    "spacy": ("services.extractors.spacy_extract",),
+    "docker-spacy": (
+        "services.extractors.docker_spacy_extract",
+        "services.extractors.spacy_extract_standalone",
+    ),
+    "llm": (
+        "services.extractors.llm_extract",
+        "services.extractors.llm_async",
+        "services.extractors.llm_chunk",
+        "services.etl.rule_extract",
+        "services.etl.sections",
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def extractor_version(extractor: str) -> str:
+    digest = hashlib.sha256(extractor.encode("utf-8"))
+    for module in COMMON_MODULES + EXTRACTOR_MODULES.get(extractor, ()):
+        spec = importlib.util.find_spec(module)
+        if spec is not None and spec.origin and os.path.exists(spec.origin):
+            digest.update(Path(spec.origin).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def extractor_settings(extractor: str, model: Optional[str] = None) -> Dict:
+    """Runtime settings that change an extractor's output but not its source."""
+    settings: Dict = {"model": model} if model else {}
+    if extractor == "llm":
+        from services.extractors import llm_chunk
+
+        settings["provider"] = os.getenv("EXTRACTOR_LLM", "openai").lower()
+        settings["chunk_chars"] = llm_chunk.LLM_CHUNK_CHARS
+        settings["chunk_overlap"] = llm_chunk.LLM_CHUNK_OVERLAP
+    return settings
+
+
+def fingerprint(
+    extractor: str, rules_profile: str = RULES_PROFILE, model: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    Everything a stored note's entities depend on besides the note itself.
+    `model` is the model the extractor actually loaded (spaCy picks the
+    first one installed), when the caller knows it.
+    """
+    note_fingerprint = {
+        "extractor": extractor,
+        "rules_profile": rules_profile,
+        "extractor_version": extractor_version(extractor),
+    }
+    settings = extractor_settings(extractor, model)
+    if settings:
+        note_fingerprint["extractor_settings"] = json.dumps(settings, sort_keys=True)
+    return note_fingerprint
+
+
+def note_checksum(note: Dict) -> str:
+    """Checksum written by ingest_mtsamples.py, or the same md5 of the text."""
+    checksum = note.get("checksum")
+    if checksum:
+        return str(checksum)
+    return hashlib.md5((note.get("text") or "").encode("utf-8")).hexdigest()
+
+
+def state_record(
+    source: str,
+    note_id: str,
+    checksum: str,
+    note_fingerprint: Dict[str, str],
+    entities: List[Dict],
+) -> Dict:
+    return dict(
+        note_fingerprint,
+        source=source,
+        note_id=note_id,
+        checksum=checksum,
+        entities=entities,
+    )
+
+
+def reusable_entities(
+    record: Optional[Dict],
+    note_id: str,
+    checksum: str,
+    note_fingerprint: Dict[str, str],
+) -> Optional[List[Dict]]:
+    """Return the stored entities if the note and extractor are unchanged."""
+    if record is None:
+        return None
+    if record.get("note_id") != note_id or record.get("checksum") != checksum:
+        return None
+    for key, value in note_fingerprint.items():
+        if record.get(key) != value:
+            return None
+    entities = record.get("entities")
+    return entities if isinstance(entities, list) else None
+
+
+class StateReader:
+    """
+    Merge-join lookup over a previous run's state records.
+
+    Lookups must come in ascending source order. A record that is out of
+    order is simply never found, so the note is recomputed rather than
+    reused with the wrong rows.
+    """
+
+    def __init__(self, lines: Iterable[str]) -> None:
+        self._records = self._parse(lines)
+        self._current = next(self._records, None)
+
+    @staticmethod
+    def _parse(lines: Iterable[str]) -> Iterator[Dict]:
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and record.get("source"):
+                yield record
+
+    def lookup(self, source: str) -> Optional[Dict]:
+        while self._current is not None and self._current["source"] < source:
+            self._current = next(self._records, None)
+        if self._current is not None and self._current["source"] == source:
+            return self._current
+        return None
+
+
+def read_state_lines(path: Path) -> Iterator[str]:
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8") as fh:
+        yield from fh
+
+
+class LocalStateWriter:
+    """Write state records to a temp file and swap it in on commit."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.records = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=str(path.parent), delete=False
+        )
+
+    def write(self, record: Dict) -> None:
+        self._fh.write(json.dumps(record, ensure_ascii=False))
+        self._fh.write("\n")
+        self.records += 1
+
+    def commit(self) -> None:
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        os.replace(self._fh.name, self.path)
+
+    def discard(self) -> None:
+        self._fh.close()
+        if os.path.exists(self._fh.name):
+            os.unlink(self._fh.name)
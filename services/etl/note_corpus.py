@@ -0,0 +1,182 @@
+"""
+Note corpus layouts.
+
+Notes live either as one <note_id>.json file per note (what the ingest
+scripts write) or packed into a single file that readers memory-map:
+
+    header   {"format": "hc-tap-notes", "version": 1}\\n
+    bodies   each note file's bytes verbatim, followed by \\n
+    index    {"entries": [[name, note_id, offset, length], ...]}\\n
+    footer   8-byte little-endian offset of the index line, then MAGIC
+
+Entries are sorted by file name, the order a directory scan yields, so both
+layouts produce the same note sequence; bodies are kept byte-for-byte, so
+unpacking restores the original files exactly.
+
+open_corpus() picks the layout from the path: a directory is read file by
+file, a regular file is read as a pack.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+
+FORMAT = "hc-tap-notes"
+VERSION = 1
+MAGIC = b"HCNPACK1"
+FOOTER = struct.Struct("<Q8s")
+
+PathLike = Union[str, Path]
+
+
+class NoteEntry(NamedTuple):
+    name: str  # original file name, e.g. note_001.json
+    note_id: Optional[str]
+    offset: int
+    length: int
+
+
+class DirectoryCorpus:
+    """One JSON file per note; the note_id is taken from the file name."""
+
+    layout = "files"
+
+    def __init__(self, path: PathLike) -> None:
+        self.path = Path(path)
+        self._names: Optional[List[str]] = None
+
+    def names(self) -> List[str]:
+        if self._names is None:
+            names: List[str] = []
+            if self.path.is_dir():
+                with os.scandir(self.path) as entries:
+                    names = [e.name for e in entries if e.name.endswith(".json")]
+            self._names = sorted(names)
+        return self._names
+
+    def note_ids(self) -> Dict[str, str]:
+        return {name[: -len(".json")]: name for name in self.names()}
+
+    def label(self, name: str) -> str:
+        return str(self.path / name)
+
+    def read_bytes(self, name: str) -> bytes:
+        with open(self.path / name, "rb") as fh:
+            return fh.read()
+
+    def load(self, name: str) -> Dict:
+        return json.loads(self.read_bytes(name))
+
+    def __len__(self) -> int:
+        return len(self.names())
+
+
+class PackedCorpus:
+    """A single pack file, memory-mapped; see the module docstring."""
+
+    layout = "packed"
+
+    def __init__(self, path: PathLike) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size < FOOTER.size:
+                raise ValueError(f"{self.path} is not a note pack")
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset, magic = FOOTER.unpack_from(self._map, size - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a note pack")
+        index = json.loads(self._map[index_offset : size - FOOTER.size])
+        self.entries = [NoteEntry(*entry) for entry in index["entries"]]
+        self._by_name = {entry.name: entry for entry in self.entries}
+
+    def names(self) -> List[str]:
+        return [entry.name for entry in self.entries]
+
+    def note_ids(self) -> Dict[str, str]:
+        return {e.note_id: e.name for e in self.entries if e.note_id is not None}
+
+    def label(self, name: str) -> str:
+        return f"{self.path}:{name}"
+
+    def read_bytes(self, name: str) -> bytes:
+        entry = self._by_name.get(name)
+        if entry is None:
+            raise FileNotFoundError(f"{name} is not in {self.path}")
+        return self._map[entry.offset : entry.offset + entry.length]
+
+    def load(self, name: str) -> Dict:
+        return json.loads(self.read_bytes(name))
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+Corpus = Union[DirectoryCorpus, PackedCorpus]
+
+
+def open_corpus(path: PathLike) -> Corpus:
+    if Path(path).is_file():
+        return PackedCorpus(path)
+    return DirectoryCorpus(path)
+
+
+def _note_id(raw: bytes) -> Optional[str]:
+    try:
+        note = json.loads(raw)
+    except ValueError:
+        return None
+    note_id = note.get("note_id") if isinstance(note, dict) else None
+    return note_id if isinstance(note_id, str) else None
+
+
+def pack(source: PathLike, dest: PathLike) -> int:
+    """
+    Pack every note of `source` (either layout) into `dest`. The pack is
+    written to a temp file and swapped in, so readers never see a partial
+    one. Returns the number of notes packed.
+    """
+    corpus = open_corpus(source)
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=str(dest.parent), prefix=f".{dest.name}.")
+    entries: List[NoteEntry] = []
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            header = {"format": FORMAT, "version": VERSION}
+            fh.write(json.dumps(header).encode("utf-8") + b"\n")
+            for name in corpus.names():
+                raw = corpus.read_bytes(name)
+                entries.append(NoteEntry(name, _note_id(raw), fh.tell(), len(raw)))
+                fh.write(raw)
+                fh.write(b"\n")
+            index_offset = fh.tell()
+            index = {"entries": [list(entry) for entry in entries]}
+            fh.write(json.dumps(index, ensure_ascii=False).encode("utf-8") + b"\n")
+            fh.write(FOOTER.pack(index_offset, MAGIC))
+        os.replace(tmp_name, dest)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    return len(entries)
+
+
+def unpack(source: PathLike, dest_dir: PathLike) -> int:
+    """Write every note of `source` back out as individual files."""
+    corpus = open_corpus(source)
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    for name in corpus.names():
+        with open(dest_dir / name, "wb") as fh:
+            fh.write(corpus.read_bytes(name))
+    return len(corpus)
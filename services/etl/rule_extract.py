@@ -11,6 +11,7 @@ from pathlib import Path
 from typing import Dict, Iterable, Iterator, List, Tuple
 
 from services.etl.sections import detect_sections, in_section
+from services.etl.term_matcher import compile_terms, ends_on_boundary
 
 PROFILE = os.getenv("RULES_PROFILE", "default").lower()
 PROFILE_STRICT = PROFILE == "strict"
@@ -56,6 +57,7 @@ MEDICATION_TERMS = [
     "tylenol",
 ]
 DOSAGE_RE = r"(?:\s+\d+\s*(?:mg|mcg|g|ml|units?|iu))?"
+DOSE_SUFFIX_RE = re.compile(rf"{DOSAGE_RE}\b", re.IGNORECASE)
 DRUG_SUFFIXES = ("pril", "sartan", "statin", "olol", "prazole", "dazole", "cillin")
 MED_STOPWORDS = {
     "history",
@@ -194,17 +196,28 @@ def load_notes() -> Iterator[Dict]:
 def find_spans(
     text: str, terms: Iterable[str], with_dose: bool = False
 ) -> Iterator[Tuple[int, int, str, str]]:
-    flags = re.IGNORECASE
-    for term in terms:
-        pattern = (
-            rf"\b({re.escape(term)}){DOSAGE_RE}\b"
-            if with_dose
-            else rf"\b({re.escape(term)})\b"
-        )
-        for match in re.finditer(pattern, text, flags):
-            yield match.start(), match.end(), text[
-                match.start() : match.end()
-            ], match.group(1).lower()
+    matcher = compile_terms(tuple(terms))
+    hits: List[Tuple[int, int, int, int]] = []
+    # Per-term regex scans never returned overlapping hits for the same term.
+    last_end: Dict[int, int] = {}
+    for idx, begin, stop in matcher.iter_hits(text):
+        if begin < last_end.get(idx, 0):
+            continue
+        if with_dose:
+            match = DOSE_SUFFIX_RE.match(text, stop)
+            if match is None:
+                continue
+            end = match.end()
+        elif ends_on_boundary(text, stop):
+            end = stop
+        else:
+            continue
+        last_end[idx] = end
+        hits.append((idx, begin, end, stop))
+    # Keep the historical ordering: dictionary order first, then position.
+    hits.sort()
+    for _, begin, end, stop in hits:
+        yield begin, end, text[begin:end], text[begin:stop].lower()
 
 
 def guess_section(text: str, begin: int) -> str:
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, Sequence, Tuple
+
+# Key under which a trie node stores the indices of the terms that end there.
+# The empty string can never be a character edge, so it cannot collide.
+_TERMINAL = ""
+WORD_BOUNDARY_RE = re.compile(r"\b")
+
+
+def fold_text(text: str) -> str:
+    """
+    Lowercase text without changing its length so offsets stay aligned.
+    """
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return "".join(
+        lowered if len(lowered) == 1 else ch
+        for ch, lowered in ((ch, ch.lower()) for ch in text)
+    )
+
+
+class TermMatcher:
+    """
+    Compiled multi-term dictionary matcher.
+
+    Terms are loaded into a character trie once. Every dictionary hit has to
+    start on a regex word boundary, so instead of feeding every character
+    through an Aho-Corasick automaton we let a single compiled regex find the
+    boundaries that can open a term and walk the trie from each of them. The
+    scan is one linear pass over the note regardless of dictionary size.
+    """
+
+    def __init__(self, terms: Sequence[str]) -> None:
+        self.terms: Tuple[str, ...] = tuple(terms)
+        self._root: Dict[str, Dict] = {}
+        first_chars = set()
+        for idx, term in enumerate(self.terms):
+            folded = fold_text(term)
+            if not folded:
+                continue
+            node = self._root
+            for ch in folded:
+                node = node.setdefault(ch, {})
+            node.setdefault(_TERMINAL, []).append(idx)
+            first_chars.add(folded[0])
+        if first_chars:
+            char_class = "".join(re.escape(ch) for ch in sorted(first_chars))
+            self._start_re = re.compile(rf"\b(?=[{char_class}])", re.IGNORECASE)
+        else:
+            self._start_re = None
+
+    def iter_hits(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yield (term_index, begin, end) for every term occurrence that starts
+        on a word boundary, ordered by begin. End boundaries are left to the
+        caller because the rule extractor allows an optional dosage suffix.
+        """
+        if self._start_re is None or not text:
+            return
+        folded = fold_text(text)
+        root = self._root
+        n = len(folded)
+        for match in self._start_re.finditer(text):
+            begin = match.start()
+            node = root
+            pos = begin
+            while pos < n:
+                node = node.get(folded[pos])
+                if node is None:
+                    break
+                pos += 1
+                hits = node.get(_TERMINAL)
+                if hits:
+                    for idx in hits:
+                        yield idx, begin, pos
+
+
+@lru_cache(maxsize=32)
+def compile_terms(terms: Tuple[str, ...]) -> TermMatcher:
+    """Build (or reuse) the matcher for a dictionary."""
+    return TermMatcher(terms)
+
+
+def ends_on_boundary(text: str, pos: int) -> bool:
+    return WORD_BOUNDARY_RE.match(text, pos) is not None
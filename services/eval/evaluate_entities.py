@@ -9,10 +9,18 @@ from __future__ import annotations
 import argparse
 import json
 import os
+import sys
 import tempfile
-from collections import Counter, defaultdict
 from pathlib import Path
-from typing import Dict, List, Sequence, Set, Tuple
+from typing import Dict, List, Sequence
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.etl import columnar  # noqa: E402
+from services.eval.matching import normalize_text  # noqa: E402
+from services.eval.scoring import evaluate_all  # noqa: E402
 
 DEFAULT_EXTRACTOR = os.getenv("EXTRACTOR", "LOCAL").lower()
 DEFAULT_PRED = Path(
@@ -51,76 +59,13 @@ def load_jsonl(path: Path) -> List[Dict]:
     return rows
 
 
-def normalize_text(value: str) -> str:
-    return (value or "").strip().lower()
-
-
-def spans_overlap(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
-    return max(0, min(a[1], b[1]) - max(a[0], b[0])) > 0
-
-
-def matchable(g: Dict, p: Dict, relaxed: bool = False) -> bool:
-    if g["note_id"] != p["note_id"]:
-        return False
-    if g["entity_type"] != p["entity_type"]:
-        return False
-    if normalize_text(g.get("norm_text")) != normalize_text(p.get("norm_text")):
-        return False
-    if relaxed:
-        return spans_overlap((g["begin"], g["end"]), (p["begin"], p["end"]))
-    return (g["begin"], g["end"]) == (p["begin"], p["end"])
-
-
-def greedy_match(
-    golds: List[Dict], preds: List[Dict], relaxed: bool = False
-) -> Tuple[Set[int], Set[int]]:
-    """Greedy 1:1 matching scoped by note + entity_type."""
-    used_pred: Set[int] = set()
-    used_gold: Set[int] = set()
-    buckets: Dict[Tuple[str, str], Dict[str, List[Tuple[int, Dict]]]] = defaultdict(
-        lambda: {"g": [], "p": []}
-    )
-    for gi, gold in enumerate(golds):
-        buckets[(gold["note_id"], gold["entity_type"])]["g"].append((gi, gold))
-    for pi, pred in enumerate(preds):
-        buckets[(pred["note_id"], pred["entity_type"])]["p"].append((pi, pred))
-    for (_, _), group in buckets.items():
-        for gi, g in group["g"]:
-            for pi, p in group["p"]:
-                if pi in used_pred:
-                    continue
-                if matchable(g, p, relaxed=relaxed):
-                    used_pred.add(pi)
-                    used_gold.add(gi)
-                    break
-    return used_gold, used_pred
-
-
-def prf1(tp: int, fp: int, fn: int) -> Tuple[float, float, float]:
-    prec = tp / (tp + fp) if (tp + fp) else 0.0
-    rec = tp / (tp + fn) if (tp + fn) else 0.0
-    f1 = 2 * prec * rec / (prec + rec) if (prec + rec) else 0.0
-    return prec, rec, f1
-
-
-def evaluate(
-    golds: List[Dict], preds: List[Dict], relaxed: bool = False
-) -> Tuple[Dict[str, Dict], Dict[str, float]]:
-    per_type: Dict[str, Dict] = {}
-    micro = Counter(tp=0, fp=0, fn=0)
-    for entity_type in TYPES:
-        g_typ = [g for g in golds if g["entity_type"] == entity_type]
-        p_typ = [p for p in preds if p["entity_type"] == entity_type]
-        used_g, used_p = greedy_match(g_typ, p_typ, relaxed=relaxed)
-        tp = len(used_g)
-        fp = len(p_typ) - tp
-        fn = len(g_typ) - tp
-        prec, rec, f1 = prf1(tp, fp, fn)
-        per_type[entity_type] = dict(tp=tp, fp=fp, fn=fn, P=prec, R=rec, F1=f1)
-        micro.update(tp=tp, fp=fp, fn=fn)
-    microP, microR, microF1 = prf1(micro["tp"], micro["fp"], micro["fn"])
-    macroF = sum(per_type[t]["F1"] for t in TYPES) / len(TYPES)
-    return per_type, dict(microP=microP, microR=microR, microF1=microF1, macroF1=macroF)
+def load_predictions(path: Path) -> List[Dict]:
+    """Load predictions, preferring a Parquet part over its JSONL sibling."""
+    parquet_path = columnar.parquet_sibling(path)
+    if columnar.pq is not None and parquet_path.exists():
+        log(f"Reading predictions from {parquet_path}", debug=True)
+        return columnar.read_parquet_rows(parquet_path)
+    return load_jsonl(path)
 
 
 def dedupe(rows: List[Dict]) -> List[Dict]:
@@ -145,12 +90,6 @@ def dedupe(rows: List[Dict]) -> List[Dict]:
     return unique
 
 
-def filter_by_notes(rows: List[Dict], allowed: Set[str]) -> List[Dict]:
-    if not allowed:
-        return []
-    return [row for row in rows if row.get("note_id") in allowed]
-
-
 def atomic_write_json(path: Path, payload: Dict) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     with tempfile.NamedTemporaryFile(
@@ -245,8 +184,9 @@ def build_report_payload(
     paths: Dict[str, str],
     coverage: Dict[str, int],
     metrics: Dict[str, Dict | None],
+    result: Dict | None = None,
 ) -> Dict:
-    return {
+    payload = {
         "extractor": extractor,
         "paths": paths,
         "coverage": coverage,
@@ -257,6 +197,12 @@ def build_report_payload(
             "intersection_relaxed": metrics["intersection_relaxed"],
         },
     }
+    if result:
+        payload["per_type"] = {
+            name: variant["per_type"] for name, variant in result["variants"].items()
+        }
+        payload["per_note"] = result["per_note"]
+    return payload
 
 
 def parse_args() -> argparse.Namespace:
@@ -292,7 +238,7 @@ def main() -> None:
 
     log(f"Evaluating run={extractor} predictions={pred_path}", debug=False)
 
-    preds = dedupe(load_jsonl(pred_path))
+    preds = dedupe(load_predictions(pred_path))
     golds = dedupe(load_jsonl(gold_path))
 
     gold_note_ids = {g.get("note_id") for g in golds if g.get("note_id")}
@@ -344,14 +290,13 @@ def main() -> None:
         )
         return
 
-    strict_exact_per, strict_exact_agg = evaluate(golds, preds, relaxed=False)
-    strict_relax_per, strict_relax_agg = evaluate(golds, preds, relaxed=True)
-
-    inter_ids = pred_note_ids & gold_note_ids
-    inter_golds = filter_by_notes(golds, inter_ids)
-    inter_preds = filter_by_notes(preds, inter_ids)
-    inter_exact_per, inter_exact_agg = evaluate(inter_golds, inter_preds, relaxed=False)
-    inter_relax_per, inter_relax_agg = evaluate(inter_golds, inter_preds, relaxed=True)
+    result = evaluate_all(golds, preds, TYPES)
+    variants = result["variants"]
+    strict_exact_per = variants["strict_exact"]["per_type"]
+    strict_exact_agg = variants["strict_exact"]["micro"]
+    strict_relax_agg = variants["strict_relaxed"]["micro"]
+    inter_exact_agg = variants["intersection_exact"]["micro"]
+    inter_relax_agg = variants["intersection_relaxed"]["micro"]
 
     def log_micro(label: str, agg: Dict[str, float]):
         log(
@@ -397,6 +342,7 @@ def main() -> None:
             {"pred": str(pred_path), "gold": str(gold_path)},
             coverage_stats,
             metrics,
+            result,
         )
         atomic_write_json(Path(args.report), report_payload)
 
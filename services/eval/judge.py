@@ -4,16 +4,35 @@ LLM-as-a-Judge Evaluator.
 
 Selects a random sample of processed notes and asks an LLM to evaluate
 the quality of extracted entities (Precision/Recall).
+
+Completions go through the shared LLM response cache
+(services/extractors/llm_cache.py). With JUDGE_SEED fixed, a rerun asks
+the same questions, so LLM_CACHE_MODE=replay reproduces it without any
+API calls.
 """
 
 import json
 import os
 import random
+import sys
 import time
-from typing import List
+from pathlib import Path
+from typing import List, Optional
 
 from dotenv import load_dotenv
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from services.etl import columnar  # noqa: E402
+from services.extractors.llm_cache import (  # noqa: E402
+    LLMCacheMiss,
+    LLMResponseCache,
+    request_hash,
+    shared_cache,
+)
+
 try:
     import anthropic
 except ImportError:
@@ -31,6 +50,11 @@ SAMPLE_SIZE = 5
 EXTRACTOR_RUN = os.getenv("EXTRACTOR", "spacy")
 ENRICHED_DIR = f"fixtures/enriched/entities/run={EXTRACTOR_RUN}"
 JUDGE_OUTPUT = f"fixtures/eval_judge_{EXTRACTOR_RUN}.json"
+# Seed for the note sample; unset draws a fresh sample each run
+JUDGE_SEED = os.getenv("JUDGE_SEED")
+# Provider whose cached completions a replay reads when no API key picks one
+JUDGE_LLM = os.getenv("JUDGE_LLM", "").lower()
+JUDGE_MODELS = {"anthropic": "claude-3-haiku-20240307", "openai": "gpt-4-turbo-preview"}
 
 
 def get_llm_client():
@@ -46,20 +70,24 @@ def get_llm_client():
         )
 
 
+def replay_client_type() -> str:
+    """The provider get_llm_client would pick, without needing its client."""
+    if JUDGE_LLM:
+        return JUDGE_LLM
+    if not os.getenv("ANTHROPIC_API_KEY") and os.getenv("OPENAI_API_KEY"):
+        return "openai"
+    return "anthropic"
+
+
 def load_enriched_data(limit=None) -> List[dict]:
     """Load all enriched entities and group by note_id."""
     path = os.path.join(ENRICHED_DIR, "part-000.jsonl")
-    if not os.path.exists(path):
+    if columnar.entity_part(path) is None:
         print(f"[judge] No enriched data found at {path}")
         return []
 
-    entities = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            try:
-                entities.append(json.loads(line))
-            except Exception:
-                pass
+    # Reads the Parquet part instead when the ETL wrote one
+    entities = columnar.read_entity_rows(path)
 
     # Group by note
     by_note = {}
@@ -80,8 +108,28 @@ def get_original_text(note_id: str) -> str:
     return ""
 
 
-def call_judge(client_type, client, text: str, entities: List[dict]) -> dict:
+def judge_request(client_type: str, prompt: str) -> dict:
+    """Keyword arguments of the provider's completion call."""
+    messages = [{"role": "user", "content": prompt}]
+    if client_type == "anthropic":
+        # Use Haiku for speed/cost or Sonnet for quality
+        return dict(model=JUDGE_MODELS[client_type], max_tokens=1024, messages=messages)
+    return dict(
+        model=JUDGE_MODELS[client_type],
+        messages=messages,
+        response_format={"type": "json_object"},
+    )
+
+
+def call_judge(
+    client_type,
+    client,
+    text: str,
+    entities: List[dict],
+    cache: Optional[LLMResponseCache] = None,
+) -> dict:
     """Ask the LLM to judge the extraction."""
+    cache = cache if cache is not None else shared_cache()
 
     entity_summary = json.dumps(
         [{"type": e["entity_type"], "text": e["text"]} for e in entities], indent=2
@@ -111,21 +159,18 @@ def call_judge(client_type, client, text: str, entities: List[dict]) -> dict:
     """
 
     content = ""
+    request = judge_request(client_type, prompt)
+    digest = request_hash(request)
     try:
-        if client_type == "anthropic":
-            msg = client.messages.create(
-                model="claude-3-haiku-20240307",  # Use Haiku for speed/cost or Sonnet for quality
-                max_tokens=1024,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            content = msg.content[0].text
-        elif client_type == "openai":
-            resp = client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[{"role": "user", "content": prompt}],
-                response_format={"type": "json_object"},
-            )
-            content = resp.choices[0].message.content
+        content = cache.get(client_type, request["model"], digest)
+        if content is None:
+            if client_type == "anthropic":
+                msg = client.messages.create(**request)
+                content = msg.content[0].text
+            elif client_type == "openai":
+                resp = client.chat.completions.create(**request)
+                content = resp.choices[0].message.content or ""
+            cache.put(client_type, request["model"], digest, content)
 
         # Parse JSON (handle markdown wrap)
         if "```json" in content:
@@ -135,6 +180,8 @@ def call_judge(client_type, client, text: str, entities: List[dict]) -> dict:
 
         return json.loads(content)
 
+    except LLMCacheMiss:
+        raise
     except Exception as e:
         print(f"[judge] Error calling LLM: {e}")
         return {"precision_score": 0, "recall_score": 0, "reasoning": f"Error: {e}"}
@@ -144,19 +191,29 @@ def main():
     print(
         f"[judge] Starting evaluation for run={EXTRACTOR_RUN} (Sample={SAMPLE_SIZE})..."
     )
+    cache = shared_cache()
+    if cache.replay and JUDGE_SEED is None:
+        # Without a seed the sample differs from the recorded run and misses
+        raise SystemExit(
+            "[judge] LLM_CACHE_MODE=replay needs the JUDGE_SEED of the recorded run"
+        )
 
     by_note = load_enriched_data()
     if not by_note:
         return
 
     # Random sample
-    all_note_ids = list(by_note.keys())
+    all_note_ids = sorted(by_note.keys())
     if len(all_note_ids) > SAMPLE_SIZE:
-        sample_ids = random.sample(all_note_ids, SAMPLE_SIZE)
+        sample_ids = random.Random(JUDGE_SEED).sample(all_note_ids, SAMPLE_SIZE)
     else:
         sample_ids = all_note_ids
 
-    client_type, client = get_llm_client()
+    if cache.replay:
+        # Every completion comes from the cache, so no API key is needed
+        client_type, client = replay_client_type(), None
+    else:
+        client_type, client = get_llm_client()
 
     results = []
     print(f"[judge] Evaluating {len(sample_ids)} notes...")
@@ -167,7 +224,8 @@ def main():
             continue
 
         ents = by_note[nid]
-        evaluation = call_judge(client_type, client, text, ents)
+        hits = cache.hits
+        evaluation = call_judge(client_type, client, text, ents, cache)
 
         evaluation["note_id"] = nid
         evaluation["entity_count"] = len(ents)
@@ -175,7 +233,8 @@ def main():
         print(
             f"  - Note {nid}: P={evaluation.get('precision_score')} R={evaluation.get('recall_score')}"
         )
-        time.sleep(0.5)  # Rate limit niceness
+        if cache.hits == hits:
+            time.sleep(0.5)  # Rate limit niceness
 
     # Aggregate
     if results:
@@ -195,6 +254,7 @@ def main():
             json.dump(report, f, indent=2)
 
         print(f"\n[judge] Report saved to {JUDGE_OUTPUT}")
+        print(f"[judge] LLM cache: {cache.stats()}")
         print(f"Average Precision: {avg_p:.1f}/10")
         print(f"Average Recall:    {avg_r:.1f}/10")
 
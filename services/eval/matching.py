@@ -0,0 +1,120 @@
+"""
+Indexed greedy 1:1 matching of predicted entities against gold labels.
+
+Shared by services/eval/evaluate_entities.py and services/etl/etl_cloud.py.
+The result is identical to walking every gold item over every prediction
+in its (note_id, entity_type) bucket and taking the first unused prediction
+that is `matchable`; the indexes only avoid looking at predictions that
+cannot match:
+
+- strict: predictions are keyed by (note, type, begin, end, norm_text), so a
+  gold item finds its candidates with one dict lookup.
+- relaxed: predictions are grouped by (note, type, norm_text) and sorted by
+  begin; a gold item only inspects the window of predictions whose begin
+  falls inside (gold.begin - longest span, gold.end).
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Sequence, Set, Tuple
+
+
+def normalize_text(value: str) -> str:
+    return (value or "").strip().lower()
+
+
+def spans_overlap(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
+    return max(0, min(a[1], b[1]) - max(a[0], b[0])) > 0
+
+
+def matchable(g: Dict, p: Dict, relaxed: bool = False) -> bool:
+    if g["note_id"] != p["note_id"]:
+        return False
+    if g["entity_type"] != p["entity_type"]:
+        return False
+    if normalize_text(g.get("norm_text")) != normalize_text(p.get("norm_text")):
+        return False
+    if relaxed:
+        return spans_overlap((g["begin"], g["end"]), (p["begin"], p["end"]))
+    return (g["begin"], g["end"]) == (p["begin"], p["end"])
+
+
+def _group_key(row: Dict) -> Tuple[str, str, str]:
+    return (row["note_id"], row["entity_type"], normalize_text(row.get("norm_text")))
+
+
+def _match_strict(
+    golds: Sequence[Dict], preds: Sequence[Dict]
+) -> Tuple[Set[int], Set[int]]:
+    # Pending prediction indices per exact key, in prediction order, so the
+    # left-most entry is always the first unused candidate.
+    index: Dict[Tuple, Deque[int]] = defaultdict(deque)
+    for pi, pred in enumerate(preds):
+        index[_group_key(pred) + (pred["begin"], pred["end"])].append(pi)
+
+    used_gold: Set[int] = set()
+    used_pred: Set[int] = set()
+    for gi, gold in enumerate(golds):
+        pending = index.get(_group_key(gold) + (gold["begin"], gold["end"]))
+        if pending:
+            used_pred.add(pending.popleft())
+            used_gold.add(gi)
+    return used_gold, used_pred
+
+
+class _SpanGroup:
+    """Predictions sharing (note, type, norm_text), sorted by begin."""
+
+    __slots__ = ("begins", "entries", "max_len")
+
+    def __init__(self, entries: List[Tuple[int, int, int]]) -> None:
+        entries.sort()
+        self.entries = entries  # (begin, end, pred_index)
+        self.begins = [begin for begin, _, _ in entries]
+        self.max_len = max((end - begin for begin, end, _ in entries), default=0)
+
+    def first_overlap(self, begin: int, end: int, used: Set[int]) -> int | None:
+        """Lowest unused prediction index whose span overlaps [begin, end)."""
+        if end <= begin or self.max_len <= 0:
+            return None
+        lo = bisect_right(self.begins, begin - self.max_len)
+        hi = bisect_left(self.begins, end)
+        best = None
+        for p_begin, p_end, pi in self.entries[lo:hi]:
+            if p_end <= begin or p_end <= p_begin or pi in used:
+                continue
+            if best is None or pi < best:
+                best = pi
+        return best
+
+
+def _match_relaxed(
+    golds: Sequence[Dict], preds: Sequence[Dict]
+) -> Tuple[Set[int], Set[int]]:
+    grouped: Dict[Tuple[str, str, str], List[Tuple[int, int, int]]] = defaultdict(list)
+    for pi, pred in enumerate(preds):
+        grouped[_group_key(pred)].append((pred["begin"], pred["end"], pi))
+    index = {key: _SpanGroup(entries) for key, entries in grouped.items()}
+
+    used_gold: Set[int] = set()
+    used_pred: Set[int] = set()
+    for gi, gold in enumerate(golds):
+        group = index.get(_group_key(gold))
+        if group is None:
+            continue
+        pi = group.first_overlap(gold["begin"], gold["end"], used_pred)
+        if pi is not None:
+            used_pred.add(pi)
+            used_gold.add(gi)
+    return used_gold, used_pred
+
+
+def greedy_match(
+    golds: Sequence[Dict], preds: Sequence[Dict], relaxed: bool = False
+) -> Tuple[Set[int], Set[int]]:
+    """Greedy 1:1 matching scoped by note + entity_type."""
+    if relaxed:
+        return _match_relaxed(golds, preds)
+    return _match_strict(golds, preds)
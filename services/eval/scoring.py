@@ -0,0 +1,116 @@
+"""
+Single-pass scoring of predictions against gold labels.
+
+Greedy matching never crosses a (note_id, entity_type) bucket, so the four
+reported variants can share one grouping: every bucket is matched once in
+exact and once in relaxed mode, and its counts are added to the full
+("strict_*") totals and, when the note has both gold and predictions, to the
+"intersection_*" totals. Per-type and per-note counts fall out of the same
+loop.
+"""
+
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from services.eval.matching import greedy_match
+
+TYPES: Sequence[str] = ("PROBLEM", "MEDICATION")
+MODES: Sequence[Tuple[str, bool]] = (("exact", False), ("relaxed", True))
+VARIANTS: Sequence[str] = (
+    "strict_exact",
+    "strict_relaxed",
+    "intersection_exact",
+    "intersection_relaxed",
+)
+
+
+def prf1(tp: int, fp: int, fn: int) -> Tuple[float, float, float]:
+    prec = tp / (tp + fp) if (tp + fp) else 0.0
+    rec = tp / (tp + fn) if (tp + fn) else 0.0
+    f1 = 2 * prec * rec / (prec + rec) if (prec + rec) else 0.0
+    return prec, rec, f1
+
+
+def _note_ids(rows: Iterable[Dict]) -> set:
+    return {row.get("note_id") for row in rows if row.get("note_id")}
+
+
+def _summarize(
+    counts: Mapping[str, Counter], types: Sequence[str]
+) -> Tuple[Dict[str, Dict], Dict[str, float]]:
+    per_type: Dict[str, Dict] = {}
+    micro = Counter(tp=0, fp=0, fn=0)
+    for entity_type in types:
+        row = counts[entity_type]
+        tp, fp, fn = row["tp"], row["fp"], row["fn"]
+        prec, rec, f1 = prf1(tp, fp, fn)
+        per_type[entity_type] = dict(tp=tp, fp=fp, fn=fn, P=prec, R=rec, F1=f1)
+        micro.update(tp=tp, fp=fp, fn=fn)
+    microP, microR, microF1 = prf1(micro["tp"], micro["fp"], micro["fn"])
+    macroF = sum(per_type[t]["F1"] for t in types) / len(types) if types else 0.0
+    return per_type, dict(microP=microP, microR=microR, microF1=microF1, macroF1=macroF)
+
+
+def evaluate_all(
+    golds: List[Dict],
+    preds: List[Dict],
+    types: Sequence[str] = TYPES,
+    extra_fp: Mapping[str, int] | None = None,
+) -> Dict:
+    """
+    Score all four variants in one traversal.
+
+    extra_fp counts, per entity type, predictions that were not passed in
+    because their notes have no gold labels. They can only be false
+    positives and only affect the strict_* variants.
+
+    Returns {"variants": {name: {"per_type", "micro"}}, "per_note": {...},
+    "intersection_notes": int}.
+    """
+    allowed = set(types)
+    intersection = _note_ids(golds) & _note_ids(preds)
+
+    buckets: Dict[Tuple, Tuple[List[Dict], List[Dict]]] = defaultdict(lambda: ([], []))
+    for gold in golds:
+        if gold["entity_type"] in allowed:
+            buckets[(gold["note_id"], gold["entity_type"])][0].append(gold)
+    for pred in preds:
+        if pred["entity_type"] in allowed:
+            buckets[(pred["note_id"], pred["entity_type"])][1].append(pred)
+
+    counts = {
+        variant: {t: Counter(tp=0, fp=0, fn=0) for t in types} for variant in VARIANTS
+    }
+    per_note: Dict[str, Dict[str, Counter]] = {}
+    for (note_id, entity_type), (g_rows, p_rows) in buckets.items():
+        note_counts = per_note.setdefault(
+            note_id, {mode: Counter(tp=0, fp=0, fn=0) for mode, _ in MODES}
+        )
+        for mode, relaxed in MODES:
+            used_g, _ = greedy_match(g_rows, p_rows, relaxed=relaxed)
+            tp = len(used_g)
+            row = dict(tp=tp, fp=len(p_rows) - tp, fn=len(g_rows) - tp)
+            note_counts[mode].update(row)
+            counts[f"strict_{mode}"][entity_type].update(row)
+            if note_id in intersection:
+                counts[f"intersection_{mode}"][entity_type].update(row)
+
+    for entity_type, n in (extra_fp or {}).items():
+        if entity_type in allowed:
+            for mode, _ in MODES:
+                counts[f"strict_{mode}"][entity_type]["fp"] += n
+
+    variants = {}
+    for variant in VARIANTS:
+        per_type, micro = _summarize(counts[variant], types)
+        variants[variant] = {"per_type": per_type, "micro": micro}
+    return {
+        "variants": variants,
+        "per_note": {
+            note_id: {mode: dict(c) for mode, c in modes.items()}
+            for note_id, modes in per_note.items()
+        },
+        "intersection_notes": len(intersection),
+    }
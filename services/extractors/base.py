@@ -22,3 +22,34 @@ class Extractor(Protocol):
         Should return list of dicts matching the Entity schema (serialized).
         """
         ...
+
+
+def resolve_overlaps(entities: List[dict]) -> List[dict]:
+    """
+    Remove overlapping entities with a sorted sweep in O(n log n).
+
+    Candidates are visited by begin offset, preferring longer spans and then
+    higher scores at the same offset. Kept spans never overlap each other, so
+    a candidate only has to be checked against the furthest kept end.
+
+    Used by EnhancedRuleExtractor. The rule extractor and LLM chunk merging
+    (llm_chunk.merge_chunks) only drop exact duplicates and keep nested or
+    cross-type spans, so they do not call it.
+    """
+    ordered = sorted(
+        entities,
+        key=lambda e: (
+            e["begin"],
+            -(e["end"] - e["begin"]),
+            -float(e.get("score") or 0.0),
+        ),
+    )
+    result: List[dict] = []
+    kept_end = None
+    for entity in ordered:
+        if kept_end is not None and entity["begin"] < kept_end:
+            continue
+        result.append(entity)
+        if kept_end is None or entity["end"] > kept_end:
+            kept_end = entity["end"]
+    return result
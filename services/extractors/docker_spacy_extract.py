@@ -2,20 +2,178 @@
 """
 Docker-based spaCy extractor that runs spaCy in a container.
 Bypasses local ARM64/Python compatibility issues.
+
+One long-lived worker (spacy_extract_standalone.py --serve) loads the model
+once and answers line-delimited JSON over stdin/stdout, instead of a fresh
+`docker run` and model load per note. SPACY_WORKER=docker (default) runs
+the worker in the hc-tap-spacy container; SPACY_WORKER=local runs it as a
+subprocess of this interpreter. A batch of notes is written to the worker
+in one go and the responses read back in order, so IPC round trips overlap
+with extraction.
+
+The image is tagged with a hash of Dockerfile.spacy and the standalone
+script (see image_tag), so an image built from older sources, e.g. one
+without --serve, is rebuilt rather than reused.
 """
 
+import hashlib
 import json
 import logging
+import os
+import queue
 import subprocess
 import sys
+import threading
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, List, Optional
 
 logger = logging.getLogger("docker_spacy_extract")
 
 # Docker image name
 DOCKER_IMAGE = "hc-tap-spacy"
 DOCKERFILE_PATH = Path(__file__).resolve().parents[2] / "Dockerfile.spacy"
+STANDALONE_PATH = Path(__file__).resolve().parent / "spacy_extract_standalone.py"
+SPACY_WORKER = os.getenv("SPACY_WORKER", "docker").lower()
+# Seconds to wait for the model to load, and for each note's result
+WORKER_START_TIMEOUT = float(os.getenv("SPACY_WORKER_START_TIMEOUT", "300") or 300)
+WORKER_REQUEST_TIMEOUT = float(os.getenv("SPACY_WORKER_TIMEOUT", "60") or 60)
+
+
+def image_tag() -> str:
+    """DOCKER_IMAGE tagged with a hash of the files the image is built from."""
+    digest = hashlib.sha256()
+    for path in (DOCKERFILE_PATH, STANDALONE_PATH):
+        digest.update(path.read_bytes())
+    return f"{DOCKER_IMAGE}:{digest.hexdigest()[:12]}"
+
+
+def worker_command(mode: str) -> List[str]:
+    if mode == "local":
+        return [sys.executable, "-u", str(STANDALONE_PATH), "--serve"]
+    if mode == "docker":
+        return [
+            "docker", "run",
+            "--rm",  # Remove container when the worker exits
+            "-i",    # Interactive (accept stdin)
+            "--platform", "linux/amd64",  # Force x86_64 platform
+            image_tag(),
+            "spacy_extract.py", "--serve",
+        ]
+    raise ValueError(f"unknown SPACY_WORKER {mode!r}; use docker or local")
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class SpacyWorker:
+    """
+    Client for one `--serve` worker process, started on first use and
+    restarted after it dies or stops answering. Safe to share between
+    threads; requests are serialized.
+    """
+
+    def __init__(
+        self,
+        command: List[str],
+        start_timeout: float = WORKER_START_TIMEOUT,
+        request_timeout: float = WORKER_REQUEST_TIMEOUT,
+    ):
+        self.command = command
+        self.start_timeout = start_timeout
+        self.request_timeout = request_timeout
+        self.model_name: Optional[str] = None
+        self.model_version: Optional[str] = None
+        self.starts = 0
+        self._proc: Optional[subprocess.Popen] = None
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        # Caller holds self._lock
+        self._lines = queue.Queue()
+        self._proc = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        self.starts += 1
+        # Drain stdout continuously so the worker never blocks on a full pipe
+        threading.Thread(
+            target=self._pump,
+            args=(self._proc.stdout, self._lines),
+            name="spacy-worker-reader",
+            daemon=True,
+        ).start()
+        ready = self._read(self.start_timeout)
+        if not ready.get("ready"):
+            raise WorkerError(f"unexpected worker greeting: {ready}")
+        self.model_name = ready.get("model")
+        self.model_version = ready.get("version")
+        logger.info(f"spaCy worker ready (model={self.model_name})")
+
+    @staticmethod
+    def _pump(stream, lines: "queue.Queue[Optional[str]]") -> None:
+        for line in stream:
+            lines.put(line)
+        lines.put(None)
+
+    def _read(self, timeout: float) -> Dict:
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            raise WorkerError(f"spaCy worker did not answer within {timeout:g}s")
+        if line is None:
+            raise WorkerError("spaCy worker exited")
+        return json.loads(line)
+
+    def request(self, payloads: List[Dict]) -> List[List[dict]]:
+        """Send every payload, then read the entity lists back in order."""
+        with self._lock:
+            try:
+                if self._proc is None or self._proc.poll() is not None:
+                    self._start()
+                first_id = self._next_id
+                self._next_id += len(payloads)
+                for offset, payload in enumerate(payloads):
+                    request = dict(payload, id=first_id + offset)
+                    self._proc.stdin.write(json.dumps(request) + "\n")
+                self._proc.stdin.flush()
+                results = []
+                for offset in range(len(payloads)):
+                    response = self._read(self.request_timeout)
+                    if response.get("id") != first_id + offset:
+                        raise WorkerError(f"out-of-order worker response: {response}")
+                    if "error" in response:
+                        raise WorkerError(response["error"])
+                    results.append(response.get("entities") or [])
+                return results
+            except (OSError, ValueError, WorkerError):
+                # Leave no half-read responses behind; the next call restarts
+                self._stop()
+                raise
+
+    def _stop(self) -> None:
+        # Caller holds self._lock
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    def close(self) -> None:
+        with self._lock:
+            self._stop()
 
 
 class DockerSpacyExtractor:
@@ -26,41 +184,56 @@ class DockerSpacyExtractor:
     a controlled Docker container with Python 3.11.
     """
     
-    def __init__(self):
-        """Initialize Docker-based extractor."""
-        self._ensure_image_built()
+    def __init__(self, mode: Optional[str] = None):
+        """Initialize the extractor and start its worker."""
+        self.mode = (mode or SPACY_WORKER).lower()
+        if self.mode == "docker":
+            self._ensure_image_built()
+        self.worker = SpacyWorker(worker_command(self.mode))
+        # Load the model now rather than on the first note
+        self.worker.request([])
+    
+    @property
+    def model_name(self) -> Optional[str]:
+        return self.worker.model_name
+    
+    @property
+    def model_version(self) -> Optional[str]:
+        return self.worker.model_version
     
     def _ensure_image_built(self):
-        """Ensure Docker image is built."""
+        """Ensure the image for the current sources is built."""
+        tag = image_tag()
         # Check if image exists
         try:
             result = subprocess.run(
-                ["docker", "images", "-q", DOCKER_IMAGE],
+                ["docker", "images", "-q", tag],
                 capture_output=True,
                 text=True,
                 check=True
             )
             
             if result.stdout.strip():
-                logger.info(f"Docker image {DOCKER_IMAGE} already exists")
+                logger.info(f"Docker image {tag} already exists")
                 return
         except (subprocess.CalledProcessError, FileNotFoundError) as e:
             logger.warning(f"Failed to check Docker image: {e}")
         
-        # Build image if it doesn't exist
-        logger.info(f"Building Docker image {DOCKER_IMAGE}...")
+        # Build image if it doesn't exist or predates the current sources
+        logger.info(f"Building Docker image {tag}...")
         try:
             subprocess.run(
                 [
                     "docker", "build",
                     "-f", str(DOCKERFILE_PATH),
+                    "-t", tag,
                     "-t", DOCKER_IMAGE,
                     "."
                 ],
                 check=True,
                 cwd=str(DOCKERFILE_PATH.parent)
             )
-            logger.info(f"Successfully built Docker image {DOCKER_IMAGE}")
+            logger.info(f"Successfully built Docker image {tag}")
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"Failed to build Docker image: {e}")
     
@@ -79,67 +252,35 @@ class DockerSpacyExtractor:
         if not text or not text.strip():
             return []
         
-        # Prepare input data
-        input_data = {
-            "text": text,
-            "note_id": note_id,
-            "run_id": run_id
-        }
-        
-        try:
-            # Run Docker container with input
-            result = subprocess.run(
-                [
-                    "docker", "run",
-                    "--rm",  # Remove container after run
-                    "-i",    # Interactive (accept stdin)
-                    "--platform", "linux/amd64",  # Force x86_64 platform
-                    DOCKER_IMAGE,
-                    "-c",
-                    """
-import sys
-import json
-from spacy_extract import SpacyExtractor
-
-# Read input
-input_data = json.loads(sys.stdin.read())
+        return self.extract_batch([{"text": text, "note_id": note_id}], run_id)[0]
 
-# Extract entities
-extractor = SpacyExtractor()
-entities = extractor.extract(
-    input_data['text'],
-    input_data['note_id'],
-    input_data['run_id']
-)
+    def extract_batch(self, notes: Iterable[Dict], run_id: str) -> List[List[dict]]:
+        """
+        Extract entities for many notes in one pipelined exchange with the
+        worker; returns one entity list per note, in input order.
+        """
+        notes = list(notes)
+        payloads = [
+            {
+                "text": note.get("text") or "",
+                "note_id": note.get("note_id"),
+                "run_id": run_id,
+            }
+            for note in notes
+        ]
+        for attempt in (1, 2):
+            try:
+                results = self.worker.request(payloads)
+                logger.debug(f"Extracted entities for {len(notes)} notes")
+                return results
+            except (OSError, ValueError, WorkerError) as e:
+                # The worker is restarted on the next request; retry once
+                logger.error(f"spaCy worker failed (attempt {attempt}): {e}")
+        return [[] for _ in notes]
 
-# Output as JSON
-print(json.dumps(entities))
-"""
-                ],
-                input=json.dumps(input_data),
-                capture_output=True,
-                text=True,
-                check=True,
-                timeout=60  # 60 second timeout
-            )
-            
-            # Parse output
-            entities = json.loads(result.stdout.strip())
-            logger.debug(f"Extracted {len(entities)} entities from note {note_id}")
-            return entities
-            
-        except subprocess.TimeoutExpired:
-            logger.error(f"Docker extraction timed out for note {note_id}")
-            return []
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Docker extraction failed for note {note_id}: {e.stderr}")
-            return []
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse Docker output for note {note_id}: {e}")
-            return []
-        except Exception as e:
-            logger.error(f"Unexpected error in Docker extraction for note {note_id}: {e}")
-            return []
+    def close(self):
+        """Stop the worker."""
+        self.worker.close()
 
 
 def build_image():
@@ -150,6 +291,7 @@ def build_image():
             [
                 "docker", "build",
                 "-f", str(DOCKERFILE_PATH),
+                "-t", image_tag(),
                 "-t", DOCKER_IMAGE,
                 "."
             ],
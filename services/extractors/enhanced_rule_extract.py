@@ -10,9 +10,11 @@ This improves on the basic rule extractor by:
 
 import logging
 import re
-from typing import List, Set, Tuple
+from typing import Dict, List, Set, Tuple
 
 from services.etl.rule_extract import guess_section
+from services.etl.term_matcher import TermMatcher, ends_on_boundary
+from services.extractors.base import resolve_overlaps
 
 logger = logging.getLogger("enhanced_rule_extract")
 
@@ -41,6 +43,20 @@ class EnhancedRuleExtractor:
             re.IGNORECASE
         )
         
+        # Compiled dictionary engine: every problem, medication and test
+        # term lives in one trie so a note is scanned once for all three.
+        # Entry order doubles as the tie-break rank for equal-length hits.
+        self._entries: List[Tuple[str, str]] = [
+            (term, entity_type)
+            for entity_type, dictionary in (
+                ("PROBLEM", self.problems),
+                ("MEDICATION", self.medications),
+                ("TEST", self.tests),
+            )
+            for term in sorted(dictionary)
+        ]
+        self._matcher = TermMatcher([term for term, _ in self._entries])
+        
     def _build_problem_dict(self) -> Set[str]:
         """Build dictionary of common medical problems."""
         problems = {
@@ -183,23 +199,10 @@ class EnhancedRuleExtractor:
         if not text or not text.strip():
             return []
         
-        entities = []
         text_lower = text.lower()
         
-        # Extract problems
-        entities.extend(self._extract_by_dictionary(
-            text, text_lower, self.problems, "PROBLEM", note_id, run_id
-        ))
-        
-        # Extract medications (with dosage handling)
-        entities.extend(self._extract_medications(
-            text, text_lower, note_id, run_id
-        ))
-        
-        # Extract tests
-        entities.extend(self._extract_by_dictionary(
-            text, text_lower, self.tests, "TEST", note_id, run_id
-        ))
+        # Match problems, medications (with dosage) and tests in one pass
+        entities = self._match_dictionaries(text, text_lower, note_id, run_id)
         
         # Deduplicate overlapping entities (keep longer spans)
         entities = self._deduplicate_entities(entities)
@@ -207,89 +210,79 @@ class EnhancedRuleExtractor:
         logger.debug(f"Extracted {len(entities)} entities from note {note_id}")
         return entities
     
-    def _extract_by_dictionary(
-        self, 
-        text: str, 
-        text_lower: str, 
-        dictionary: Set[str],
-        entity_type: str,
+    def _match_dictionaries(
+        self,
+        text: str,
+        text_lower: str,
         note_id: str,
         run_id: str
     ) -> List[dict]:
-        """Extract entities by dictionary matching."""
-        entities = []
+        """
+        Extract entities for all dictionaries in a single scan.
         
-        # Sort by length (longest first) to prefer longer matches
-        terms_sorted = sorted(dictionary, key=len, reverse=True)
+        Hits that start at the same offset are resolved inline: only the
+        longest one survives (problem, then medication, then test on ties),
+        since the shorter ones would be dropped by deduplication anyway.
+        """
+        entities = []
+        last_end: Dict[int, int] = {}
+        best = None  # (begin, end, idx) of the longest hit at this begin
         
-        for term in terms_sorted:
-            # Use word boundaries for matching
-            pattern = r'\b' + re.escape(term) + r'\b'
-            for match in re.finditer(pattern, text_lower):
-                begin = match.start()
-                end = match.end()
-                original_text = text[begin:end]
-                
-                entities.append({
-                    "note_id": note_id,
-                    "run_id": run_id,
-                    "entity_type": entity_type,
-                    "text": original_text,
-                    "norm_text": term,  # Already normalized
-                    "begin": begin,
-                    "end": end,
-                    "score": 1.0,
-                    "section": guess_section(text, begin),
-                    "source": "enhanced-rule",
-                })
+        for idx, begin, stop in self._matcher.iter_hits(text_lower):
+            # Same-term hits never overlap, matching per-term finditer scans
+            if begin < last_end.get(idx, 0):
+                continue
+            if not ends_on_boundary(text_lower, stop):
+                continue
+            last_end[idx] = stop
+            
+            end = stop
+            if self._entries[idx][1] == "MEDICATION":
+                end = self._dosage_end(text, stop)
+            
+            if best is not None and best[0] != begin:
+                entities.append(self._make_entity(text, best, note_id, run_id))
+                best = None
+            if best is None or (end, -idx) > (best[1], -best[2]):
+                best = (begin, end, idx)
         
+        if best is not None:
+            entities.append(self._make_entity(text, best, note_id, run_id))
         return entities
     
-    def _extract_medications(
-        self, 
-        text: str, 
-        text_lower: str, 
-        note_id: str, 
+    def _dosage_end(self, text: str, end: int) -> int:
+        """Extend a medication span over a dosage within 20 chars."""
+        context_end = min(end + 20, len(text))
+        dosage_match = self.dosage_pattern.search(text[end:context_end])
+        if dosage_match:
+            return end + dosage_match.end()
+        return end
+    
+    def _make_entity(
+        self,
+        text: str,
+        hit: Tuple[int, int, int],
+        note_id: str,
         run_id: str
-    ) -> List[dict]:
-        """Extract medications with dosage awareness."""
-        entities = []
-        
-        # Sort medications by length
-        meds_sorted = sorted(self.medications, key=len, reverse=True)
-        
-        for med in meds_sorted:
-            pattern = r'\b' + re.escape(med) + r'\b'
-            for match in re.finditer(pattern, text_lower):
-                begin = match.start()
-                end = match.end()
-                
-                # Check if followed by dosage within 20 chars
-                context_end = min(end + 20, len(text))
-                context = text[end:context_end]
-                dosage_match = self.dosage_pattern.search(context)
-                
-                if dosage_match:
-                    # Include dosage in entity
-                    end_with_dosage = end + dosage_match.end()
-                    original_text = text[begin:end_with_dosage].strip()
-                else:
-                    original_text = text[begin:end]
-                
-                entities.append({
-                    "note_id": note_id,
-                    "run_id": run_id,
-                    "entity_type": "MEDICATION",
-                    "text": original_text,
-                    "norm_text": med,  # Normalized without dosage
-                    "begin": begin,
-                    "end": end if not dosage_match else end_with_dosage,
-                    "score": 1.0,
-                    "section": guess_section(text, begin),
-                    "source": "enhanced-rule",
-                })
-        
-        return entities
+    ) -> dict:
+        begin, end, idx = hit
+        term, entity_type = self._entries[idx]
+        original_text = text[begin:end]
+        if entity_type == "MEDICATION":
+            # Medication spans may include a dosage suffix
+            original_text = original_text.strip()
+        return {
+            "note_id": note_id,
+            "run_id": run_id,
+            "entity_type": entity_type,
+            "text": original_text,
+            "norm_text": term,  # Already normalized (without dosage)
+            "begin": begin,
+            "end": end,
+            "score": 1.0,
+            "section": guess_section(text, begin),
+            "source": "enhanced-rule",
+        }
     
     def _deduplicate_entities(self, entities: List[dict]) -> List[dict]:
         """
@@ -299,39 +292,7 @@ class EnhancedRuleExtractor:
         1. Longer spans
         2. Higher confidence
         """
-        if not entities:
-            return []
-        
-        # Sort by begin position, then by span length (descending)
-        sorted_entities = sorted(
-            entities,
-            key=lambda e: (e['begin'], -(e['end'] - e['begin']))
-        )
-        
-        result = []
-        for entity in sorted_entities:
-            # Check if overlaps with any already added entity
-            overlaps = False
-            for existing in result:
-                if self._spans_overlap(
-                    entity['begin'], entity['end'],
-                    existing['begin'], existing['end']
-                ):
-                    overlaps = True
-                    break
-            
-            if not overlaps:
-                result.append(entity)
-        
-        return result
-    
-    def _spans_overlap(
-        self, 
-        begin1: int, end1: int,
-        begin2: int, end2: int
-    ) -> bool:
-        """Check if two spans overlap."""
-        return not (end1 <= begin2 or end2 <= begin1)
+        return resolve_overlaps(entities)
 
 
 # Convenience function for backward compatibility
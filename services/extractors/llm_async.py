@@ -0,0 +1,293 @@
+"""
+Concurrent LLM extraction on an asyncio event loop.
+
+LLMExtractor.extract waits on one HTTP round trip per note. Here many
+notes are in flight at once, paced by RateScheduler:
+
+- token buckets for requests per minute (LLM_RPM) and tokens per minute
+  (LLM_TPM, charged with an estimate of prompt plus completion tokens);
+- at most LLM_CONCURRENCY requests open at a time;
+- a 429 pauses every request until its Retry-After has passed, and
+  retries back off with full jitter, so clients do not retry in lockstep.
+
+Long notes are split into overlapping chunks whose requests are scheduled
+like any other, so one long note no longer serializes its own latency.
+
+extract_stream() drives this from synchronous code such as the ETL loops:
+the event loop runs on a background thread, a bounded window of notes is
+kept in flight, and results come back in input order.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.extractors.llm_chunk import chunk_spans, merge_chunks
+from services.extractors.llm_extract import MAX_OUTPUT_TOKENS, LLMExtractor
+
+logger = logging.getLogger("llm_async")
+
+LLM_ASYNC = os.getenv("LLM_ASYNC", "1") == "1"
+LLM_RPM = float(os.getenv("LLM_RPM", "500") or 500)
+LLM_TPM = float(os.getenv("LLM_TPM", "100000") or 100000)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8") or 8)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5") or 5)
+# Full-jitter backoff: sleep uniform(0, min(cap, base * 2**attempt))
+BACKOFF_BASE_S = 1.0
+BACKOFF_CAP_S = 30.0
+# Rough characters per token for budgeting against LLM_TPM
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(prompt: str) -> int:
+    return len(prompt) // CHARS_PER_TOKEN + MAX_OUTPUT_TOKENS
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    return getattr(exc, "status_code", None)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Rate limits, server errors and transport failures are retried."""
+    status = status_code(exc)
+    if status is None:
+        return True
+    return status in (408, 409, 429) or status >= 500
+
+
+def retry_after_s(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """`per_minute` units, refilled continuously; bursts up to a minute's worth."""
+
+    def __init__(
+        self, per_minute: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateScheduler:
+    """Admit requests within RPM, TPM and concurrency limits, in FIFO order."""
+
+    def __init__(self, rpm: float, tpm: float, concurrency: int) -> None:
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = max(1, concurrency)
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._turn: Optional[asyncio.Lock] = None
+
+    async def acquire(self, tokens: int) -> None:
+        if self._slots is None:
+            # Created on first use so they bind to the running loop
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._turn = asyncio.Lock()
+        await self._slots.acquire()
+        try:
+            async with self._turn:
+                while True:
+                    wait = max(
+                        self.paused_until - time.monotonic(),
+                        self.requests.wait_time(1),
+                        self.tokens.wait_time(tokens),
+                    )
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+        except BaseException:
+            self._slots.release()
+            raise
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every new request for `seconds` (after a 429)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AsyncLLMExtractor:
+    def __init__(
+        self,
+        extractor: LLMExtractor,
+        rpm: float = LLM_RPM,
+        tpm: float = LLM_TPM,
+        concurrency: int = LLM_CONCURRENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+    ) -> None:
+        self.extractor = extractor
+        self.scheduler = RateScheduler(rpm, tpm, concurrency)
+        self.max_retries = max_retries
+        self.retries = 0
+        self.failures = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def extract(self, text: str, note_id: str, run_id: str) -> List[dict]:
+        """Extract one note, with its chunks (see llm_chunk.py) in parallel."""
+        spans = chunk_spans(text)
+        if len(spans) == 1:
+            return await self._extract_text(text, note_id, run_id)
+        results = await asyncio.gather(
+            *(self._extract_text(text[b:e], note_id, run_id) for b, e in spans)
+        )
+        return merge_chunks(text, spans, results)
+
+    async def _extract_text(self, text: str, note_id: str, run_id: str) -> List[dict]:
+        """One prompt; failures are logged and yield no entities."""
+        if not text or not text.strip():
+            return []
+        prompt = self.extractor.build_prompt(text)
+        # Cache hits skip the scheduler; a replay-mode miss propagates
+        cached = await asyncio.to_thread(self.extractor.cached, prompt)
+        if cached is not None:
+            return self.extractor.parse_response(cached, text, note_id, run_id)
+        tokens = estimate_tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.acquire(tokens)
+            try:
+                content = await self.extractor.acomplete(prompt)
+                return self.extractor.parse_response(content, text, note_id, run_id)
+            except Exception as e:
+                error = e
+            finally:
+                self.scheduler.release()
+            if not is_retryable(error) or attempt == self.max_retries:
+                break
+            self.retries += 1
+            delay = retry_after_s(error)
+            if status_code(error) == 429:
+                # The provider's limit is lower than ours; slow everyone down
+                self.scheduler.pause(delay if delay is not None else BACKOFF_BASE_S)
+            if delay is None:
+                cap = min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2**attempt)
+                delay = random.uniform(0, cap)
+            logger.warning(
+                f"LLM call for note {note_id} failed (attempt {attempt + 1}), "
+                f"retrying in {delay:.2f}s: {error}"
+            )
+            await asyncio.sleep(delay)
+        self.failures += 1
+        logger.error(f"LLM extraction failed for note {note_id}: {error}")
+        return []
+
+    async def _timed(self, note: Dict, run_id: str) -> Tuple[List[dict], float]:
+        start = time.perf_counter()
+        text = note.get("text") or ""
+        entities = await self.extract(text, note.get("note_id"), run_id)
+        return entities, time.perf_counter() - start
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._loop.run_forever, name="llm-async", daemon=True
+            )
+            self._thread.start()
+        return self._loop
+
+    def extract_stream(
+        self,
+        notes: Iterable[Optional[Dict]],
+        run_id: str,
+        window: Optional[int] = None,
+    ) -> Iterator[Optional[Tuple[List[dict], float]]]:
+        """
+        Yield (entities, seconds) per note in input order, keeping up to
+        `window` notes (default twice the concurrency) in flight. A None
+        note yields None, so callers can pass through notes they skip.
+        """
+        loop = self._event_loop()
+        window = max(1, window or 2 * self.scheduler.concurrency)
+        pending: deque = deque()
+        notes = iter(notes)
+        done = object()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < window:
+                    note = next(notes, done)
+                    if note is done:
+                        exhausted = True
+                    elif note is None:
+                        pending.append(None)
+                    else:
+                        pending.append(
+                            asyncio.run_coroutine_threadsafe(
+                                self._timed(note, run_id), loop
+                            )
+                        )
+                if not pending:
+                    return
+                future = pending.popleft()
+                yield None if future is None else future.result()
+        finally:
+            for future in pending:
+                if future is not None:
+                    future.cancel()
+
+    def extract_batch(self, notes: Iterable[Dict], run_id: str) -> List[List[dict]]:
+        return [result[0] for result in self.extract_stream(notes, run_id)]
+
+    def close(self) -> None:
+        if self._loop is None:
+            return
+        client, self.extractor.async_client = self.extractor.async_client, None
+        if client is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(client.close(), self._loop).result(5)
+            except Exception as e:
+                logger.warning(f"Failed to close LLM client: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+        self._loop = self._thread = None
+
+    def stats(self) -> Dict:
+        return {
+            "retries": self.retries,
+            "failures": self.failures,
+            "max_in_flight": self.scheduler.max_in_flight,
+        }
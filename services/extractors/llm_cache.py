@@ -0,0 +1,213 @@
+"""
+Content-addressed cache of raw LLM completions.
+
+Entries are keyed on (provider, model, sha256 of the request), where the
+request is the canonical JSON of the messages and sampling parameters, so
+editing the prompt template or e.g. the temperature is a miss rather than
+a stale hit. The completion text is stored as returned, before any
+parsing, which lets parser fixes take effect without paying again.
+
+The store is one SQLite file (LLM_CACHE_DB) shared by the extractor and
+the judge. It is bounded by LLM_CACHE_MAX_BYTES of stored completions;
+past that the least recently used rows are evicted. LLM_CACHE_MODE picks
+how it is used:
+
+- readwrite (default): serve hits, store misses;
+- replay: read-only, and a miss raises LLMCacheMiss instead of calling
+  the provider, so a rerun either reproduces the first pass exactly or
+  fails loudly;
+- off: no cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger("llm_cache")
+
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "readwrite").lower()
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "fixtures/llm_cache.sqlite")
+LLM_CACHE_MAX_BYTES = int(
+    os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)) or 256 * 1024 * 1024
+)
+MODES = ("readwrite", "replay", "off")
+
+
+class LLMCacheMiss(RuntimeError):
+    """A replay-mode lookup found no stored completion."""
+
+
+def request_hash(request: Dict) -> str:
+    """sha256 of the request body (messages and sampling parameters)."""
+    body = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(
+        self,
+        path: Optional[str],
+        mode: str = "readwrite",
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM_CACHE_MODE: {mode} (expected {MODES})")
+        self.path = path or None
+        self.mode = mode if self.path else "off"
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if self.mode == "off":
+            return
+        try:
+            self._db = self._open(self.path, readonly=self.mode == "replay")
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache {self.path} unavailable: {e}")
+            if not self.replay:
+                self.mode = "off"
+            # In replay mode every lookup now misses, and so raises
+            return
+        self.bytes = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    @staticmethod
+    def _open(path: str, readonly: bool) -> sqlite3.Connection:
+        if readonly:
+            uri = f"{Path(path).resolve().as_uri()}?mode=ro"
+            return sqlite3.connect(uri, uri=True, check_same_thread=False)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (provider TEXT NOT NULL, "
+            "model TEXT NOT NULL, request_hash TEXT NOT NULL, "
+            "completion TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, used REAL NOT NULL, "
+            "PRIMARY KEY (provider, model, request_hash))"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+        return db
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        return cls(LLM_CACHE_DB, LLM_CACHE_MODE, LLM_CACHE_MAX_BYTES)
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == "replay"
+
+    def get(self, provider: str, model: str, digest: str) -> Optional[str]:
+        """Stored completion, or None; in replay mode a miss raises."""
+        if self._db is None and not self.replay:
+            return None
+        key = (provider, model, digest)
+        with self._lock:
+            row = None
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT completion FROM responses "
+                    "WHERE provider = ? AND model = ? AND request_hash = ?",
+                    key,
+                ).fetchone()
+            if row is None:
+                self.misses += 1
+                if self.replay:
+                    raise LLMCacheMiss(
+                        f"No cached {provider}/{model} completion for {digest[:12]} "
+                        f"in {self.path} (LLM_CACHE_MODE=replay)"
+                    )
+                return None
+            self.hits += 1
+            if not self.replay:
+                self._db.execute(
+                    "UPDATE responses SET used = ? "
+                    "WHERE provider = ? AND model = ? AND request_hash = ?",
+                    (time.time(), *key),
+                )
+            return row[0]
+
+    def put(self, provider: str, model: str, digest: str, completion: str) -> None:
+        if self._db is None or self.replay:
+            return
+        size = len(completion.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            try:
+                old = self._db.execute(
+                    "SELECT size FROM responses "
+                    "WHERE provider = ? AND model = ? AND request_hash = ?",
+                    (provider, model, digest),
+                ).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses "
+                    "(provider, model, request_hash, completion, size, created, used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (provider, model, digest, completion, size, now, now),
+                )
+                self.bytes += size - (old[0] if old else 0)
+                if self.bytes > self.max_bytes:
+                    self._evict()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache write failed: {e}")
+
+    def _evict(self) -> None:
+        # Caller holds self._lock; drop least recently used rows until under
+        rows = self._db.execute("SELECT rowid, size FROM responses ORDER BY used")
+        doomed = []
+        for rowid, size in rows:
+            if self.bytes <= self.max_bytes:
+                break
+            doomed.append((rowid,))
+            self.bytes -= size
+        rows.close()
+        self._db.executemany("DELETE FROM responses WHERE rowid = ?", doomed)
+        self.evicted += len(doomed)
+
+    def close(self) -> None:
+        with self._lock:
+            db, self._db = self._db, None
+        if db is not None:
+            db.close()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "hit_ratio": self.hits / lookups if lookups else None,
+        }
+
+
+_shared: Optional[LLMResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache() -> LLMResponseCache:
+    """The process-wide cache configured from the LLM_CACHE_* env vars."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = LLMResponseCache.from_env()
+        return _shared
@@ -0,0 +1,102 @@
+"""
+Split long notes into overlapping chunks for LLM extraction.
+
+One prompt per note caps the answer at MAX_OUTPUT_TOKENS, so long notes
+lose entities off the end of the list, and the prompt itself can outgrow
+the context. Notes longer than LLM_CHUNK_CHARS are cut at section
+boundaries (services/etl/sections.detect_sections), or at a line break or
+space when a single section is too long. Consecutive chunks share
+LLM_CHUNK_OVERLAP characters, so an entity cut by one seam is still
+whole in the neighbouring chunk.
+
+merge_chunks() shifts chunk offsets back onto the full note and keeps
+each entity from one chunk only: a chunk owns the text up to the middle
+of its overlap with the next, and entities that begin outside that range
+are dropped as seam duplicates. Offsets come from the first occurrence of
+the entity text in the chunk, so an entity placed outside the owned range
+is first moved to a repeat of the same text inside it, if there is one.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from bisect import bisect_right
+from typing import Dict, List, Sequence, Tuple
+
+from services.etl.rule_extract import guess_section
+from services.etl.sections import detect_sections
+
+LLM_CHUNK_CHARS = int(os.getenv("LLM_CHUNK_CHARS", "4000") or 0)
+LLM_CHUNK_OVERLAP = int(os.getenv("LLM_CHUNK_OVERLAP", "200") or 0)
+# Threads per note for the synchronous extractor; the async one uses its scheduler
+MAX_CHUNK_WORKERS = 4
+
+Span = Tuple[int, int]
+WHITESPACE_RE = re.compile(r"\s")
+
+
+def _break_point(text: str, lo: int, hi: int) -> int:
+    """Last line break, else space, in text[lo:hi]; hi if there is neither."""
+    for sep in ("\n", " "):
+        pos = text.rfind(sep, lo, hi)
+        if pos > lo:
+            return pos
+    return hi
+
+
+def chunk_spans(
+    text: str, max_chars: int = LLM_CHUNK_CHARS, overlap: int = LLM_CHUNK_OVERLAP
+) -> List[Span]:
+    """(start, end) spans covering `text`; one span when it fits in max_chars."""
+    n = len(text)
+    if max_chars <= 0 or n <= max_chars:
+        return [(0, n)]
+    overlap = max(0, min(overlap, max_chars // 2))
+    cuts = sorted({start for _, start, _ in detect_sections(text) if 0 < start < n})
+    spans: List[Span] = []
+    start = 0
+    while start + max_chars < n:
+        limit = start + max_chars
+        # Ending past start + overlap guarantees the next chunk moves forward
+        lo = start + overlap + 1
+        idx = bisect_right(cuts, limit) - 1
+        if idx >= 0 and cuts[idx] >= lo:
+            end = cuts[idx]
+        else:
+            end = _break_point(text, lo, limit)
+        spans.append((start, end))
+        start = end - overlap
+        # Start the next chunk on a word boundary
+        match = WHITESPACE_RE.search(text, start, end)
+        if match is not None:
+            start = match.end()
+    spans.append((start, n))
+    return spans
+
+
+def merge_chunks(
+    text: str, spans: Sequence[Span], results: Sequence[List[Dict]]
+) -> List[Dict]:
+    """Per-chunk entities mapped onto `text`, with seam duplicates removed."""
+    merged: Dict[Tuple[int, int, str], Dict] = {}
+    for idx, ((start, end), entities) in enumerate(zip(spans, results)):
+        lo = 0 if idx == 0 else (spans[idx - 1][1] + start) // 2
+        hi = len(text) if idx == len(spans) - 1 else (end + spans[idx + 1][0]) // 2
+        for ent in entities:
+            begin = ent["begin"] + start
+            length = ent["end"] - ent["begin"]
+            if not lo <= begin < hi:
+                # A mention repeated across the seam was placed at its first
+                # occurrence; keep the repeat that starts in the owned range
+                begin = text.find(text[begin : begin + length], lo, end)
+                if not lo <= begin < hi:
+                    continue
+            row = dict(
+                ent,
+                begin=begin,
+                end=begin + length,
+                section=guess_section(text, begin),
+            )
+            merged.setdefault((row["begin"], row["end"], row["entity_type"]), row)
+    return sorted(merged.values(), key=lambda e: (e["begin"], e["end"]))
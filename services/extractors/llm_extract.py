@@ -1,14 +1,23 @@
+import asyncio
 import json
 import logging
 import os
 import time
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
 from services.etl.rule_extract import guess_section
+from services.extractors.llm_cache import (
+    LLMCacheMiss,
+    LLMResponseCache,
+    request_hash,
+    shared_cache,
+)
+from services.extractors.llm_chunk import MAX_CHUNK_WORKERS, chunk_spans, merge_chunks
 
 try:
     import openai
-    from openai import OpenAI
+    from openai import AsyncOpenAI, OpenAI
 except ImportError:
     openai = None
 
@@ -19,15 +28,21 @@ except ImportError:
 
 logger = logging.getLogger("llm_extract")
 
+# Completion budget per call on the Anthropic path
+MAX_OUTPUT_TOKENS = 1024
+
 
 class LLMExtractor:
-    def __init__(self):
+    def __init__(self, cache: Optional[LLMResponseCache] = None):
         self.provider = os.getenv("EXTRACTOR_LLM", "openai").lower()
+        self.async_client = None
+        self.cache = cache if cache is not None else shared_cache()
 
         if self.provider == "openai":
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 raise RuntimeError("OPENAI_API_KEY not set in .env")
+            self.api_key = api_key
             self.client = OpenAI(api_key=api_key)
             self.model = "gpt-4-turbo-preview"  # Or gpt-3.5-turbo
 
@@ -36,14 +51,15 @@ class LLMExtractor:
             if not api_key:
                 raise RuntimeError("ANTHROPIC_API_KEY not set in .env")
             # Anthropic 0.34.2 uses api_key parameter only
+            self.api_key = api_key
             self.client = anthropic.Anthropic(api_key=api_key)
             self.model = "claude-3-haiku-20240307"  # Fast & cheap
 
         else:
             raise ValueError(f"Unknown EXTRACTOR_LLM provider: {self.provider}")
 
-    def extract(self, text: str, note_id: str, run_id: str) -> List[dict]:
-        prompt = f"""You are a clinical NER system. Extract medical entities with EXACT text spans from clinical notes.
+    def build_prompt(self, text: str) -> str:
+        return f"""You are a clinical NER system. Extract medical entities with EXACT text spans from clinical notes.
 
 ENTITY TYPES:
 - PROBLEM: diseases, symptoms, diagnoses, conditions (e.g., "hypertension", "chest pain", "diabetes")
@@ -92,10 +108,31 @@ Now extract from this clinical note:
 
 Return ONLY a JSON array of entities, no explanation."""
 
+    def extract(self, text: str, note_id: str, run_id: str) -> List[dict]:
+        spans = chunk_spans(text)
+        if len(spans) == 1:
+            return self._extract_text(text, note_id, run_id)
+        # Long note: one prompt per chunk, sent concurrently
+        workers = min(len(spans), MAX_CHUNK_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(
+                pool.map(
+                    lambda span: self._extract_text(
+                        text[span[0] : span[1]], note_id, run_id
+                    ),
+                    spans,
+                )
+            )
+        return merge_chunks(text, spans, results)
+
+    def _extract_text(self, text: str, note_id: str, run_id: str) -> List[dict]:
+        prompt = self.build_prompt(text)
         retries = 3
         for i in range(retries):
             try:
                 return self._call_llm(prompt, text, note_id, run_id)
+            except LLMCacheMiss:
+                raise
             except openai.RateLimitError if openai else Exception as e:
                 # Retry on rate limit errors
                 logger.warning(f"LLM call failed (attempt {i+1}): {e}")
@@ -122,10 +159,13 @@ Return ONLY a JSON array of entities, no explanation."""
     def _call_llm(
         self, prompt: str, original_text: str, note_id: str, run_id: str
     ) -> List[dict]:
-        content = ""
+        content = self._complete(prompt)
+        return self.parse_response(content, original_text, note_id, run_id)
 
+    def _request(self, prompt: str) -> dict:
+        """Keyword arguments of the provider's completion call."""
         if self.provider == "openai":
-            response = self.client.chat.completions.create(
+            return dict(
                 model=self.model,
                 messages=[
                     {
@@ -137,16 +177,63 @@ Return ONLY a JSON array of entities, no explanation."""
                 response_format={"type": "json_object"},
                 temperature=0,
             )
-            content = response.choices[0].message.content
+        return dict(
+            model=self.model,
+            max_tokens=MAX_OUTPUT_TOKENS,
+            messages=[{"role": "user", "content": prompt}],
+        )
 
-        elif self.provider == "anthropic":
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=1024,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            content = message.content[0].text
+    def _content(self, response) -> str:
+        if self.provider == "openai":
+            return response.choices[0].message.content or ""
+        return response.content[0].text
 
+    def cached(self, prompt: str) -> Optional[str]:
+        """Stored completion for `prompt`; raises LLMCacheMiss in replay mode."""
+        digest = request_hash(self._request(prompt))
+        return self.cache.get(self.provider, self.model, digest)
+
+    def _store(self, prompt: str, content: str) -> None:
+        digest = request_hash(self._request(prompt))
+        self.cache.put(self.provider, self.model, digest, content)
+
+    def _complete(self, prompt: str) -> str:
+        content = self.cached(prompt)
+        if content is not None:
+            return content
+        if self.provider == "openai":
+            response = self.client.chat.completions.create(**self._request(prompt))
+        else:
+            response = self.client.messages.create(**self._request(prompt))
+        content = self._content(response)
+        self._store(prompt, content)
+        return content
+
+    async def acomplete(self, prompt: str) -> str:
+        """
+        _complete on the provider's async client. The caller checks
+        cached() first, so a hit never waits on the rate limiter; retries
+        are also left to it (see llm_async.py), so the SDK's own are off.
+        """
+        if self.async_client is None:
+            if self.provider == "openai":
+                self.async_client = AsyncOpenAI(api_key=self.api_key, max_retries=0)
+            else:
+                self.async_client = anthropic.AsyncAnthropic(
+                    api_key=self.api_key, max_retries=0
+                )
+        if self.provider == "openai":
+            create = self.async_client.chat.completions.create
+        else:
+            create = self.async_client.messages.create
+        content = self._content(await create(**self._request(prompt)))
+        # SQLite writes (and evictions) would stall every request on the loop
+        await asyncio.to_thread(self._store, prompt, content)
+        return content
+
+    def parse_response(
+        self, content: str, original_text: str, note_id: str, run_id: str
+    ) -> List[dict]:
         # Parse JSON
         try:
             # Clean up Markdown code blocks if present
@@ -1,10 +1,15 @@
 """
 spaCy-based medical entity extractor using scispaCy models.
+
+Only doc.ents is used, so components NER does not depend on are disabled
+after loading. extract_batch() runs notes through nlp.pipe, which batches
+them through the model (and optionally across processes) instead of one
+nlp(text) call per note.
 """
 
 import logging
 import os
-from typing import List
+from typing import Dict, Iterable, List, Optional
 
 from services.etl.rule_extract import guess_section
 
@@ -16,6 +21,19 @@ except ImportError:
 
 logger = logging.getLogger("spacy_extract")
 
+# Notes per nlp.pipe batch and worker processes for nlp.pipe
+SPACY_BATCH_SIZE = int(os.getenv("SPACY_BATCH_SIZE", "32") or 32)
+SPACY_N_PROCESS = int(os.getenv("SPACY_N_PROCESS", "1") or 1)
+# Pipeline components that do not feed doc.ents
+NON_NER_COMPONENTS = (
+    "parser",
+    "tagger",
+    "lemmatizer",
+    "attribute_ruler",
+    "morphologizer",
+    "senter",
+)
+
 
 class SpacyExtractor:
     """
@@ -25,7 +43,9 @@ class SpacyExtractor:
     Best models: en_core_sci_sm, en_ner_bc5cdr_md
     """
     
-    def __init__(self):
+    def __init__(
+        self, batch_size: Optional[int] = None, n_process: Optional[int] = None
+    ):
         if spacy is None:
             raise RuntimeError("spaCy not installed. Run: pip install spacy")
         
@@ -42,6 +62,7 @@ class SpacyExtractor:
                 logger.info(f"Attempting to load spaCy model: {model_name}")
                 self.nlp = spacy.load(model_name)
                 self.model_name = model_name
+                self.model_version = self.nlp.meta.get("version")
                 logger.info(f"Successfully loaded spaCy model: {model_name}")
                 break
             except OSError:
@@ -57,6 +78,18 @@ class SpacyExtractor:
                 "  OR (fallback):\n"
                 "  python -m spacy download en_core_web_sm"
             )
+
+        self.batch_size = batch_size or SPACY_BATCH_SIZE
+        self.n_process = n_process or SPACY_N_PROCESS
+        # Disabled rather than excluded, so a listener-based pipeline still
+        # loads; tok2vec and ner stay on
+        self.disabled_components = [
+            name for name in self.nlp.pipe_names if name in NON_NER_COMPONENTS
+        ]
+        for name in self.disabled_components:
+            self.nlp.disable_pipe(name)
+        if self.disabled_components:
+            logger.info(f"Disabled non-NER components: {self.disabled_components}")
         
         # Entity type mapping
         # spaCy BC5CDR labels: DISEASE, CHEMICAL
@@ -102,38 +135,76 @@ class SpacyExtractor:
         try:
             # Process text with spaCy
             doc = self.nlp(text)
-            
-            entities = []
-            for ent in doc.ents:
-                # Map entity label to our types
-                entity_type = self._map_entity_type(ent.label_)
-                
-                # Skip unmapped types
-                if entity_type is None:
-                    continue
-                
-                # Extract normalized text (lowercase, basic cleanup)
-                norm_text = self._normalize_text(ent.text)
-                
-                entities.append({
-                    "note_id": note_id,
-                    "run_id": run_id,
-                    "entity_type": entity_type,
-                    "text": ent.text,
-                    "norm_text": norm_text,
-                    "begin": ent.start_char,
-                    "end": ent.end_char,
-                    "score": 1.0,  # spaCy doesn't provide confidence scores for NER
-                    "section": guess_section(text, ent.start_char),
-                    "source": f"spacy-{self.model_name}",
-                })
-            
+            entities = self._doc_entities(doc, text, note_id, run_id)
             logger.debug(f"Extracted {len(entities)} entities from note {note_id}")
             return entities
             
         except Exception as e:
             logger.error(f"spaCy extraction failed for note {note_id}: {e}")
             return []
+
+    def extract_batch(self, notes: Iterable[Dict], run_id: str) -> List[List[dict]]:
+        """
+        Extract entities for many notes with nlp.pipe.
+
+        Args:
+            notes: Dicts with "note_id" and (normalized) "text"
+            run_id: ETL run identifier
+
+        Returns:
+            One entity list per note, in input order
+        """
+        notes = list(notes)
+        results: List[List[dict]] = [[] for _ in notes]
+        todo = [
+            (note.get("text") or "", i)
+            for i, note in enumerate(notes)
+            if (note.get("text") or "").strip()
+        ]
+        try:
+            docs = self.nlp.pipe(
+                todo,
+                as_tuples=True,
+                batch_size=self.batch_size,
+                n_process=self.n_process,
+            )
+            for doc, i in docs:
+                results[i] = self._doc_entities(
+                    doc, doc.text, notes[i].get("note_id"), run_id
+                )
+        except Exception as e:
+            # One bad note should not cost the batch; redo it note by note
+            logger.error(f"spaCy batch extraction failed, retrying per note: {e}")
+            for text, i in todo:
+                results[i] = self.extract(text, notes[i].get("note_id"), run_id)
+        return results
+
+    def _doc_entities(self, doc, text: str, note_id: str, run_id: str) -> List[dict]:
+        entities = []
+        for ent in doc.ents:
+            # Map entity label to our types
+            entity_type = self._map_entity_type(ent.label_)
+            
+            # Skip unmapped types
+            if entity_type is None:
+                continue
+            
+            # Extract normalized text (lowercase, basic cleanup)
+            norm_text = self._normalize_text(ent.text)
+            
+            entities.append({
+                "note_id": note_id,
+                "run_id": run_id,
+                "entity_type": entity_type,
+                "text": ent.text,
+                "norm_text": norm_text,
+                "begin": ent.start_char,
+                "end": ent.end_char,
+                "score": 1.0,  # spaCy doesn't provide confidence scores for NER
+                "section": guess_section(text, ent.start_char),
+                "source": f"spacy-{self.model_name}",
+            })
+        return entities
     
     def _map_entity_type(self, spacy_label: str) -> str:
         """
@@ -1,10 +1,18 @@
 """
 Standalone spaCy extractor for Docker container.
 No external dependencies except spaCy.
+
+Run with --serve to keep one model loaded and answer line-delimited JSON
+requests on stdin ({"id", "text", "note_id", "run_id"}) with one
+{"id", "entities"} line each on stdout, in request order. A first
+{"ready": true, "model": ..., "version": ...} line announces that the
+model is loaded.
 """
 
+import json
 import logging
-from typing import List
+import sys
+from typing import IO, List
 
 try:
     import spacy
@@ -62,6 +70,7 @@ class SpacyExtractor:
                 logger.info(f"Loading spaCy model: {model_name}")
                 self.nlp = spacy.load(model_name)
                 self.model_name = model_name
+                self.model_version = self.nlp.meta.get("version")
                 logger.info(f"Successfully loaded: {model_name}")
                 break
             except OSError:
@@ -135,3 +144,39 @@ class SpacyExtractor:
             return "TEST"
         
         return None
+
+
+def serve(stdin: IO[str] = sys.stdin, stdout: IO[str] = sys.stdout) -> None:
+    """Answer extraction requests until stdin closes."""
+    extractor = SpacyExtractor()
+    ready = {
+        "ready": True,
+        "model": extractor.model_name,
+        "version": extractor.model_version,
+    }
+    stdout.write(json.dumps(ready) + "\n")
+    stdout.flush()
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = {"id": None, "error": f"invalid request: {e}"}
+        else:
+            entities = extractor.extract(
+                request.get("text") or "",
+                request.get("note_id"),
+                request.get("run_id", "spacy"),
+            )
+            response = {"id": request.get("id"), "entities": entities}
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    # Logs go to stderr; stdout carries only the protocol
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    if "--serve" in sys.argv[1:]:
+        serve()
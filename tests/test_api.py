@@ -1,3 +1,19 @@
+import asyncio
+import json
+import os
+import time
+
+from services.api import app as api_app
+from services.api import extractor_registry
+from services.api.batch_extract import CharQuota
+from services.api.extract_pool import ExtractPool, extract_note
+from services.api.extractor_registry import ExtractorRegistry
+from services.api.note_store import NoteStore
+from services.api.result_cache import ExtractCache
+from services.api.search_index import EntityIndex
+from services.etl import note_corpus
+
+
 def test_get_note_not_found(api_client):
     # Should return 404 for non-existent note
     resp = api_client.get("/notes/missing_note_999")
@@ -17,3 +33,369 @@ def test_stats_missing_run(api_client):
     resp = api_client.get("/stats/run/INVALID_RUN")
     assert resp.status_code == 404
     assert resp.json()["error"] == "not_found"
+
+
+def test_search_index_matches_scan():
+    ents = [
+        {"note_id": "n1", "entity_type": "PROBLEM", "norm_text": "chest pain"},
+        {"note_id": "n1", "entity_type": "MEDICATION", "norm_text": "aspirin"},
+        {"note_id": "n2", "entity_type": "PROBLEM", "norm_text": "back pain"},
+        {"note_id": "n2", "entity_type": "PROBLEM", "norm_text": None},
+        {"note_id": "n3", "entity_type": "PROBLEM", "norm_text": "Pain"},
+        {"note_id": "n3", "entity_type": "MEDICATION", "norm_text": "aspirin"},
+    ]
+    index = EntityIndex(ents)
+
+    def scan(q, entity_type, limit):
+        items = [e for e in ents if not entity_type or e["entity_type"] == entity_type]
+        if q:
+            items = [e for e in items if e["norm_text"] and q.lower() in e["norm_text"]]
+        return items[:limit]
+
+    for q in (None, "", "pain", "PAIN", "in", "p", "aspirin", "ain ", "missing"):
+        for entity_type in (None, "PROBLEM", "MEDICATION"):
+            for limit in (1, 50):
+                assert index.search(q, entity_type, limit) == scan(
+                    q, entity_type, limit
+                )
+
+
+def test_data_store_tails_appends_and_reloads_replaced_files(tmp_path, monkeypatch):
+    notes_dir = tmp_path / "notes"
+    notes_dir.mkdir()
+    (notes_dir / "n1.json").write_text(json.dumps({"note_id": "n1", "text": "x"}))
+    part = tmp_path / "part-000.jsonl"
+    row = {"note_id": "n1", "entity_type": "PROBLEM", "norm_text": "asthma"}
+    part.write_text(json.dumps(row) + "\n")
+    monkeypatch.setattr(api_app, "NOTES_DIR", str(notes_dir))
+    monkeypatch.setattr(api_app, "ENRICHED_FILE", str(part))
+    monkeypatch.setattr(api_app, "ENRICHED_PARQUET", str(tmp_path / "part-000.parquet"))
+    monkeypatch.setattr(api_app, "RUN_MANIFEST", str(tmp_path / "missing.json"))
+
+    store = api_app.DataStore()
+    first = store.snapshot
+    assert len(first.all_ents) == 1 and first.manifest_error == "manifest not found"
+    assert store.refresh() is False
+
+    with part.open("a") as fh:
+        fh.write(json.dumps(dict(row, norm_text="cough")) + "\n")
+        fh.write('{"note_id": "n1", "entity_')  # writer still mid-line
+    assert store.refresh() is True
+    assert [e["norm_text"] for e in store.snapshot.all_ents] == ["asthma", "cough"]
+    assert store.snapshot.notes is first.notes
+    assert len(first.all_ents) == 1  # earlier snapshot is never mutated
+    assert store.snapshot.index.search("cou", None, 10)[0]["norm_text"] == "cough"
+
+    replacement = tmp_path / "tmp.jsonl"
+    replacement.write_text(json.dumps(dict(row, note_id="n2")) + "\n")
+    os.replace(replacement, part)
+    assert store.refresh() is True
+    assert [e["note_id"] for e in store.snapshot.all_ents] == ["n2"]
+    assert list(store.snapshot.by_note) == ["n2"]
+
+
+def test_note_store_loads_lazily_with_bounded_lru(tmp_path):
+    for i in range(3):
+        note = {"note_id": f"n{i}", "text": "x" * 100}
+        (tmp_path / f"n{i}.json").write_text(json.dumps(note))
+    size = len(json.dumps({"note_id": "n0", "text": "x" * 100}))
+    store = NoteStore(str(tmp_path), max_bytes=2 * size)
+
+    assert len(store) == 3 and store.stats()["cached_notes"] == 0
+    assert store.get("n0")["note_id"] == "n0"
+    assert store.get("n0")["note_id"] == "n0"
+    store.get("n1")
+    store.get("n2")  # evicts n0, the least recently used
+    assert store.get("missing") is None
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 4)
+    assert stats["cached_notes"] == 2 and stats["cached_bytes"] <= 2 * size
+    store.get("n0")
+    assert store.stats()["misses"] == 5
+
+
+def test_health_reports_note_cache(api_client):
+    resp = api_client.get("/health")
+    cache = resp.json()["checks"]["note_cache"]
+    assert {"hits", "misses", "cached_bytes", "max_bytes"} <= set(cache)
+    notes = resp.json()["checks"]["notes_dir"]
+    assert notes["count"] == len(api_app.DATA_STORE.snapshot.notes)
+
+
+def test_note_store_reads_packed_corpus(tmp_path):
+    notes_dir = tmp_path / "notes"
+    notes_dir.mkdir()
+    (notes_dir / "n1.json").write_text(json.dumps({"note_id": "n1", "text": "x"}))
+    pack_path = tmp_path / "notes.pack"
+    note_corpus.pack(notes_dir, pack_path)
+
+    store = NoteStore(str(pack_path), max_bytes=1024)
+    assert len(store) == 1 and "n1" in store
+    assert store.get("n1") == {"note_id": "n1", "text": "x"}
+    assert store.get("n2") is None
+    assert store.stats()["layout"] == "packed"
+
+
+def test_extract_batch_streams_ndjson_and_charges_characters(api_client, monkeypatch):
+    monkeypatch.setattr(api_app, "BATCH_QUOTA", CharQuota(200))
+    note = {"note_id": "b1", "specialty": "x", "checksum": "c"}
+    notes = [
+        dict(note, text="Patient has asthma and takes albuterol."),
+        dict(note, note_id="b2", text="No complaints."),
+        {"note_id": "bad", "text": "missing fields"},
+    ]
+    resp = api_client.post("/extract/batch", json={"notes": notes})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    summary = rows.pop()
+    by_index = {row["index"]: row for row in rows}
+    assert sorted(by_index) == [0, 1, 2]
+    assert by_index[2]["error"] == "invalid_note"
+    assert "asthma" in {e["norm_text"] for e in by_index[0]["entities"]}
+    assert by_index[0]["entities"] == extract_note(notes[0])
+    charged = len(notes[0]["text"]) + len(notes[1]["text"])
+    assert summary["done"] and summary["errors"] == 1 and summary["chars"] == charged
+    assert resp.headers["X-Quota-Remaining-Chars"] == str(200 - charged)
+
+    resp = api_client.post("/extract/batch", json={"notes": notes[:1] * 5})
+    assert resp.status_code == 429 and int(resp.headers["Retry-After"]) >= 1
+    resp = api_client.post("/extract/batch", json={"notes": notes[:1] * 6})
+    assert resp.status_code == 413
+    assert api_client.post("/extract/batch", json={"notes": []}).status_code == 400
+
+
+def test_char_quota_drops_refilled_buckets():
+    quota = CharQuota(100, window_s=0.05)
+    assert quota.acquire("a", 60)[0] and quota.acquire("b", 100)[0]
+    assert not quota.acquire("b", 1)[0]
+    time.sleep(0.1)
+    assert quota.acquire("c", 10) == (True, 0.0, 90)
+    assert set(quota._buckets) == {"c"}
+
+
+def test_extract_reports_timing_and_applies_backpressure(api_client, monkeypatch):
+    pool = ExtractPool(workers=1, max_queue=0, timeout_s=30)
+    monkeypatch.setattr(api_app, "EXTRACT_POOL", pool)
+    monkeypatch.setattr(api_app, "EXTRACT_CACHE", ExtractCache(0))
+    body = {"text": "Patient has asthma and takes albuterol."}
+
+    resp = api_client.post("/extract", json=body)
+    assert resp.status_code == 200
+    assert resp.json()["entities"] == extract_note(dict(body, note_id="demo"))
+    timing = dict(
+        part.strip().split(";dur=") for part in resp.headers["Server-Timing"].split(",")
+    )
+    assert set(timing) == {"queue", "compute", "total"}
+    assert float(timing["total"]) >= float(timing["compute"])
+    assert pool.stats()["completed"] == 1 and pool.in_flight == 0
+
+    pool.in_flight = pool.capacity  # every worker and queue slot taken
+    resp = api_client.post("/extract", json=body)
+    assert resp.status_code == 429 and int(resp.headers["Retry-After"]) >= 1
+    assert pool.stats()["rejected"] == 1
+    pool.in_flight = 0
+
+    pool.timeout_s = 0.000001
+    resp = api_client.post("/extract", json=body)
+    assert resp.status_code == 503 and "Retry-After" in resp.headers
+    pool.shutdown()
+
+
+def test_extract_selects_warm_backend_with_concurrency_limit(api_client, monkeypatch):
+    class FakeModel:
+        def extract(self, text, note_id, run_id):
+            return [{"note_id": note_id, "norm_text": text.split()[-1]}]
+
+    monkeypatch.setitem(extractor_registry.LOADERS, "llm", FakeModel)
+    registry = ExtractorRegistry(["rule", "enhanced", "llm"], {"llm": 1})
+    pool = ExtractPool(workers=1, max_queue=0, timeout_s=30)
+    monkeypatch.setattr(api_app, "EXTRACTORS", registry)
+    monkeypatch.setattr(api_app, "EXTRACT_POOL", pool)
+    monkeypatch.setattr(api_app, "EXTRACT_CACHE", ExtractCache(0))
+    body = {"text": "Patient has asthma and takes albuterol.", "extractor": "enhanced"}
+
+    # enhanced is pure Python, so it runs on the pool rather than a thread
+    resp = api_client.post("/extract", json=body)
+    assert resp.status_code == 200
+    assert "asthma" in {e["norm_text"] for e in resp.json()["entities"]}
+    assert pool.stats()["completed"] == 1
+    info = api_client.get("/config").json()["EXTRACTORS"]
+    assert info["rule"]["mode"] == info["enhanced"]["mode"] == "process_pool"
+    assert info["llm"]["mode"] == "in_process"
+
+    resp = api_client.post("/extract", json=dict(body, extractor="llm"))
+    assert resp.status_code == 200
+    llm = registry.get("llm")
+    assert llm.state == "ready" and llm.in_flight == 0
+    assert (
+        api_client.get("/config").json()["EXTRACTORS"]["llm"]["startup_ms"] is not None
+    )
+
+    llm.in_flight = 1  # the only slot is taken
+    resp = api_client.post("/extract", json=dict(body, extractor="llm"))
+    assert resp.status_code == 429 and llm.rejected == 1
+    llm.in_flight = 0
+
+    resp = api_client.post("/extract", json=dict(body, extractor="nope"))
+    assert resp.status_code == 400
+
+    monkeypatch.setattr(api_app, "EXTRACTORS", ExtractorRegistry(["enhanced"]))
+    resp = api_client.post("/extract", json={"text": body["text"]})
+    assert resp.status_code == 400
+    assert resp.json()["error"] == "extractor_disabled"
+    assert "'rule'" in resp.json()["message"] and "enhanced" in resp.json()["message"]
+    pool.shutdown()
+
+
+def test_extract_cache_serves_repeats_across_restarts(
+    api_client, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(api_app.limiter, "enabled", False)
+    db_path = str(tmp_path / "extract_cache.sqlite")
+    monkeypatch.setattr(api_app, "EXTRACT_CACHE", ExtractCache(8, 3600, db_path))
+    body = {"text": "Patient has  asthma and takes albuterol.", "note_id": "c1"}
+
+    first = api_client.post("/extract", json=body)
+    assert first.status_code == 200 and first.headers["X-Cache"] == "MISS"
+    # Same text after whitespace normalization, different note
+    repeat = dict(body, text=body["text"] + " ", note_id="c2")
+    again = api_client.post("/extract", json=repeat)
+    assert again.headers["X-Cache"] == "HIT"
+    assert again.json()["entities"] == [
+        dict(ent, note_id="c2") for ent in first.json()["entities"]
+    ]
+    other = api_client.post("/extract", json=dict(body, extractor="enhanced"))
+    assert other.headers["X-Cache"] == "MISS"
+
+    api_app.EXTRACT_CACHE.close()
+    restarted = ExtractCache(8, 3600, db_path)
+    monkeypatch.setattr(api_app, "EXTRACT_CACHE", restarted)
+    on_loop = []
+    get = restarted.get
+
+    def spy_get(*args):
+        # SQLite lookups must not run on the event loop
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return get(*args)
+
+    monkeypatch.setattr(restarted, "get", spy_get)
+    assert api_client.post("/extract", json=body).headers["X-Cache"] == "HIT"
+    assert on_loop == [False]
+    assert restarted.stats()["disk_hits"] == 1
+    cache = api_client.get("/health").json()["checks"]["extract_cache"]
+    assert cache["hit_ratio"] == 1.0
+
+    # An in-process backend's results are keyed on the model it loaded
+    class FakeSpacy:
+        model_name, model_version = "en_core_sci_sm", "0.5.4"
+
+        def extract(self, text, note_id, run_id):
+            return [{"note_id": note_id, "source": self.model_name}]
+
+    monkeypatch.setitem(extractor_registry.LOADERS, "spacy", FakeSpacy)
+    registry = ExtractorRegistry(["rule", "spacy"])
+    monkeypatch.setattr(api_app, "EXTRACTORS", registry)
+    body = dict(body, extractor="spacy")
+    assert api_client.post("/extract", json=body).headers["X-Cache"] == "MISS"
+    assert api_client.post("/extract", json=body).headers["X-Cache"] == "HIT"
+    assert registry.info()["spacy"]["model"] == "en_core_sci_sm-0.5.4"
+    registry.get("spacy").instance.model_version = "0.5.5"
+    assert api_client.post("/extract", json=body).headers["X-Cache"] == "MISS"
+
+    expired = ExtractCache(8, ttl_s=0.000001)
+    expired.put("k", [{"note_id": "a"}])
+    time.sleep(0.001)
+    assert expired.get("k", "b") is None and expired.stats()["expired"] == 1
+
+
+def test_metrics_exposes_route_latency_and_data_gauges(api_client, monkeypatch):
+    monkeypatch.setattr(api_app.limiter, "enabled", False)
+    monkeypatch.setattr(api_app, "EXTRACT_CACHE", ExtractCache(0))
+    api_client.get("/notes/missing_note_999")
+    api_client.post("/extract", json={"text": "Patient has asthma."})
+
+    resp = api_client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    lines = resp.text.splitlines()
+    assert any(
+        line.startswith("hctap_http_requests_total{")
+        and 'route="/notes/{note_id}"' in line
+        and 'status="404"' in line
+        for line in lines
+    )
+    assert any(
+        line.startswith("hctap_http_request_duration_seconds_bucket{")
+        and 'route="/extract"' in line
+        and 'le="+Inf"' in line
+        for line in lines
+    )
+    assert any(line.startswith("hctap_extract_entities_count{") for line in lines)
+    assert any(line.startswith("hctap_data_age_seconds ") for line in lines)
+    entities = next(line for line in lines if line.startswith("hctap_index_entities "))
+    assert float(entities.split()[1]) == len(api_app.DATA_STORE.snapshot.all_ents)
+
+
+def test_search_and_note_entities_page_with_cursors(api_client, monkeypatch, tmp_path):
+    notes_dir = tmp_path / "notes"
+    notes_dir.mkdir()
+    (notes_dir / "n1.json").write_text(json.dumps({"note_id": "n1", "text": "x"}))
+    part = tmp_path / "part-000.jsonl"
+    rows = [
+        {"note_id": f"n{i % 2}", "entity_type": "MEDICATION", "norm_text": f"drug{i}"}
+        for i in range(7)
+    ]
+    part.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    monkeypatch.setattr(api_app, "NOTES_DIR", str(notes_dir))
+    monkeypatch.setattr(api_app, "ENRICHED_FILE", str(part))
+    monkeypatch.setattr(api_app, "ENRICHED_PARQUET", str(tmp_path / "part-000.parquet"))
+    monkeypatch.setattr(api_app, "RUN_MANIFEST", str(tmp_path / "missing.json"))
+    store = api_app.DataStore()
+    monkeypatch.setattr(api_app, "DATA_STORE", store)
+
+    params = {"type": "MEDICATION", "q": "drug", "limit": 3}
+    seen, pages = [], 0
+    while True:
+        resp = api_client.get("/search", params=params)
+        assert resp.status_code == 200
+        seen += resp.json()
+        pages += 1
+        if "X-Next-Cursor" not in resp.headers:
+            break
+        params["cursor"] = resp.headers["X-Next-Cursor"]
+    assert seen == rows and pages == 3
+
+    resp = api_client.get("/notes/n1/entities", params={"limit": 2})
+    page = resp.json()
+    assert page["entities"] == rows[1:4:2] and page["next_cursor"]
+    resp = api_client.get(
+        "/notes/n1/entities", params={"limit": 2, "cursor": page["next_cursor"]}
+    )
+    assert resp.json()["entities"] == rows[5:6] and resp.json()["next_cursor"] is None
+
+    resp = api_client.get("/export/entities", params={"note_id": ["n0", "n1"]})
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in resp.text.splitlines()]
+    assert exported == rows[0::2] + rows[1::2]
+    resp = api_client.get("/export/entities", params={"run_id": api_app.APP_RUN_ID})
+    assert [json.loads(line) for line in resp.text.splitlines()] == rows
+
+    # Appends keep cursors valid; a replaced file invalidates them
+    resp = api_client.get("/search", params={"limit": 1})
+    cursor = resp.headers["X-Next-Cursor"]
+    with part.open("a") as fh:
+        fh.write(json.dumps(rows[0]) + "\n")
+    assert store.refresh() is True
+    assert api_client.get("/search", params={"cursor": cursor}).status_code == 200
+    replacement = tmp_path / "tmp.jsonl"
+    replacement.write_text(json.dumps(rows[0]) + "\n")
+    os.replace(replacement, part)
+    assert store.refresh() is True
+    resp = api_client.get("/search", params={"cursor": cursor})
+    assert resp.status_code == 410 and resp.json()["error"] == "cursor_expired"
+    assert api_client.get("/search", params={"cursor": "%%%"}).status_code == 400
@@ -1,7 +1,28 @@
+import json
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+import boto3
+import pandas as pd
+import pytest
+
+from services.analytics.io_utils import load_entities_for_run
+from services.etl import columnar, etl_cloud, incremental, note_corpus
 from services.etl.preprocess import normalize_text
-from services.etl.rule_extract import (MEDICATION_TERMS, PROBLEM_TERMS,
-                                       find_spans)
+from services.etl.rule_extract import (
+    DOSAGE_RE,
+    MEDICATION_TERMS,
+    PROBLEM_TERMS,
+    find_spans,
+)
 from services.etl.spacy_extract import extract_entities
+from services.eval.matching import greedy_match, matchable
+from services.eval.scoring import evaluate_all
+from services.extractors.base import resolve_overlaps
+from services.extractors.enhanced_rule_extract import EnhancedRuleExtractor
 
 
 def test_normalize_text():
@@ -28,6 +49,449 @@ def test_rule_extract_medication():
     assert "metformin" in found
 
 
+def _regex_find_spans(text, terms, with_dose=False):
+    # Reference implementation: one regex scan per dictionary term.
+    for term in terms:
+        pattern = (
+            rf"\b({re.escape(term)}){DOSAGE_RE}\b"
+            if with_dose
+            else rf"\b({re.escape(term)})\b"
+        )
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            yield match.start(), match.end(), text[
+                match.start() : match.end()
+            ], match.group(1).lower()
+
+
+def test_find_spans_matches_regex_scan():
+    texts = [
+        "Insulin 10 units then insulin 5 unitsx; INSULIN.",
+        "Metformin 500mgx metformin 5 MG. metformin_xr",
+        "Back  pain, back pain and backpain; Chest Tightness.",
+        "Cough-cough cough's coughing",
+    ]
+    for path in sorted(Path("fixtures/notes").glob("*.json"))[:50]:
+        with path.open("r", encoding="utf-8") as fh:
+            texts.append(json.load(fh).get("text", ""))
+    for text in texts:
+        for terms, with_dose in (
+            (PROBLEM_TERMS, False),
+            (MEDICATION_TERMS, True),
+            (MEDICATION_TERMS + ["insulin", "back pain", "back"], True),
+        ):
+            expected = list(_regex_find_spans(text, terms, with_dose=with_dose))
+            assert list(find_spans(text, terms, with_dose=with_dose)) == expected
+
+
+def test_enhanced_extract_single_pass():
+    text = "Chronic chest pain. Started aspirin 81 mg; CBC ordered."
+    ents = EnhancedRuleExtractor().extract(text, "test_note", "ENHANCED")
+    found = {(e["entity_type"], e["norm_text"], e["text"]) for e in ents}
+    # Longest dictionary match wins over "chest pain" / "pain"
+    assert ("PROBLEM", "chronic chest pain", "Chronic chest pain") in found
+    assert ("MEDICATION", "aspirin", "aspirin 81 mg") in found
+    assert ("TEST", "cbc", "CBC") in found
+    assert len(ents) == 3
+
+
+def test_resolve_overlaps_prefers_longer_then_higher_score():
+    ents = [
+        {"begin": 0, "end": 5, "score": 0.9, "norm_text": "short"},
+        {"begin": 0, "end": 10, "score": 0.5, "norm_text": "long"},
+        {"begin": 8, "end": 12, "score": 1.0, "norm_text": "overlap"},
+        {"begin": 12, "end": 15, "score": 0.4, "norm_text": "low"},
+        {"begin": 12, "end": 15, "score": 0.8, "norm_text": "high"},
+        {"begin": 20, "end": 25, "score": 1.0, "norm_text": "apart"},
+    ]
+    kept = [e["norm_text"] for e in resolve_overlaps(ents)]
+    assert kept == ["long", "high", "apart"]
+
+
+@pytest.fixture
+def local_notes(tmp_path, monkeypatch):
+    """etl_local reading 24 fixture notes (and one without a note_id)."""
+    from services.etl import etl_local
+
+    notes_dir = tmp_path / "notes"
+    notes_dir.mkdir()
+    (notes_dir / "note_000.json").write_text(json.dumps({"text": "no id"}))
+    for path in sorted(Path("fixtures/notes").glob("*.json"))[:24]:
+        (notes_dir / path.name).write_text(path.read_text())
+    monkeypatch.setattr(etl_local, "NOTES_DIR", notes_dir)
+    monkeypatch.setattr(etl_local, "STATE_PATH", tmp_path / "state.jsonl")
+    monkeypatch.setattr(etl_local, "ETL_CHUNK_SIZE", 2)
+    monkeypatch.delenv("LIMIT", raising=False)
+    etl_local.notes_corpus.cache_clear()
+    yield etl_local
+    etl_local.notes_corpus.cache_clear()
+
+
+def test_local_workers_match_serial_output_and_order(local_notes):
+    serial = list(local_notes.EntityEmitter(workers=1))
+    parallel = local_notes.EntityEmitter(workers=3)
+    assert serial and list(parallel) == serial
+    assert parallel.notes_seen == 24
+
+
+def test_prefetch_s3_notes_keeps_order_and_bounds_in_flight(monkeypatch):
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+
+    def fake_read(bucket, key):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.005)
+        with lock:
+            state["active"] -= 1
+        return {"note_id": key}
+
+    monkeypatch.setattr(etl_cloud, "read_s3_json", fake_read)
+    keys = [f"notes/note_{i:03d}.json" for i in range(25)]
+    fetched = [
+        (key, future.result())
+        for key, future in etl_cloud.prefetch_s3_notes("bucket", keys, 4)
+    ]
+    assert [key for key, _ in fetched] == keys
+    assert all(note["note_id"] == key for key, note in fetched)
+    assert state["peak"] <= 4
+
+
+def test_extracted_notes_reports_failures_per_note(monkeypatch):
+    from concurrent.futures import Future
+
+    def flaky_extract(note):
+        if note["note_id"] == "b":
+            raise ValueError("bad note")
+        return [{"note_id": note["note_id"], "text": note["text"]}]
+
+    def fetched(note):
+        future = Future()
+        future.set_result(note)
+        return future
+
+    monkeypatch.setattr(etl_cloud, "EXTRACTOR_NAME", "rule")
+    monkeypatch.setattr(etl_cloud, "extract_for_note", flaky_extract)
+    prefetched = [
+        (f"notes/{nid}.json", fetched({"note_id": nid, "text": nid})) for nid in "abc"
+    ]
+    rows = list(etl_cloud.extracted_notes(prefetched, None, {}))
+    assert [row[0] for row in rows] == ["notes/a.json", "notes/b.json", "notes/c.json"]
+    (_, _, _, a_ents, a_s, a_err), (_, _, _, b_ents, b_s, b_err), c = rows
+    assert a_ents == [{"note_id": "a", "text": "a"}] and a_s >= 0 and a_err is None
+    assert b_ents is None and b_s is None and isinstance(b_err, ValueError)
+    assert c[3] == [{"note_id": "c", "text": "c"}] and c[5] is None
+
+
+def test_s3_part_writer_rolls_parts_and_drops_stale(monkeypatch):
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    with moto.mock_aws():
+        s3 = boto3.client("s3")
+        monkeypatch.setattr(etl_cloud, "s3", s3)
+        s3.create_bucket(Bucket="enriched")
+        prefix = "entities/run=TEST"
+        s3.put_object(Bucket="enriched", Key=f"{prefix}/part-00009.jsonl", Body=b"")
+
+        writer = etl_cloud.S3PartWriter("enriched", prefix, max_bytes=200)
+        rows = [{"note_id": f"note_{i:03d}", "norm_text": "x" * 40} for i in range(10)]
+        for row in rows:
+            writer.write(row)
+        writer.close()
+
+        listed = s3.list_objects_v2(Bucket="enriched", Prefix=f"{prefix}/")
+        keys = sorted(obj["Key"] for obj in listed["Contents"])
+        assert keys == writer.keys and len(keys) > 1
+        read_back = []
+        for key in keys:
+            body = s3.get_object(Bucket="enriched", Key=key)["Body"].read()
+            read_back.extend(json.loads(line) for line in body.splitlines())
+        assert read_back == rows
+
+
+def test_cloud_runs_replace_previous_state_generation(monkeypatch):
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    with moto.mock_aws():
+        s3 = boto3.client("s3")
+        monkeypatch.setattr(etl_cloud, "s3", s3)
+        monkeypatch.setattr(etl_cloud, "RAW_BUCKET", "raw")
+        monkeypatch.setattr(etl_cloud, "ENRICHED_BUCKET", "enriched")
+        monkeypatch.setattr(etl_cloud, "ETL_INCREMENTAL", False)
+        monkeypatch.setattr(etl_cloud, "EXTRACTOR_NAME", "rule")
+        monkeypatch.setattr(etl_cloud, "RUN_ID", "cloud-rule")
+        s3.create_bucket(Bucket="raw")
+        s3.create_bucket(Bucket="enriched")
+        note = {"note_id": "note_001", "text": "Patient has asthma."}
+        s3.put_object(Bucket="raw", Key="raw/note_001.json", Body=json.dumps(note))
+
+        def state_generations():
+            listed = s3.list_objects_v2(Bucket="enriched", Prefix="state/")
+            keys = [obj["Key"] for obj in listed.get("Contents", [])]
+            return {key.rsplit("/", 1)[0] for key in keys if "/gen=" in key}
+
+        etl_cloud.main()
+        first = state_generations()
+        etl_cloud.main()
+        second = state_generations()
+        pointer = etl_cloud.read_state_pointer("enriched", "cloud-rule")
+        assert len(first) == 1 and len(second) == 1 and first != second
+        assert second == {pointer}
+
+
+def test_incremental_state_reuses_only_unchanged_notes():
+    fp = incremental.fingerprint("rule", "default")
+    ents = [{"note_id": "b", "norm_text": "cough"}]
+    lines = [
+        json.dumps(incremental.state_record("a.json", "a", "c1", fp, [])),
+        json.dumps(incremental.state_record("b.json", "b", "c2", fp, ents)),
+        json.dumps(incremental.state_record("d.json", "d", "c4", fp, [])),
+    ]
+    reader = incremental.StateReader(lines)
+
+    assert reader.lookup("b.json")["entities"] == ents
+    assert reader.lookup("c.json") is None
+    record = reader.lookup("d.json")
+    assert incremental.reusable_entities(record, "d", "c4", fp) == []
+    assert incremental.reusable_entities(record, "d", "changed", fp) is None
+    strict = incremental.fingerprint("rule", "strict")
+    assert incremental.reusable_entities(record, "d", "c4", strict) is None
+    assert reader.lookup("e.json") is None
+
+
+def test_llm_fingerprint_tracks_chunk_modules_and_settings(monkeypatch):
+    from services.extractors import llm_chunk
+
+    assert "services.extractors.llm_chunk" in incremental.EXTRACTOR_MODULES["llm"]
+    assert "services.extractors.llm_async" in incremental.EXTRACTOR_MODULES["llm"]
+    fp = incremental.fingerprint("llm")
+    monkeypatch.setattr(llm_chunk, "LLM_CHUNK_CHARS", llm_chunk.LLM_CHUNK_CHARS + 1)
+    record = incremental.state_record("a.json", "a", "c1", fp, [])
+    changed = incremental.fingerprint("llm")
+    assert incremental.reusable_entities(record, "a", "c1", fp) == []
+    assert incremental.reusable_entities(record, "a", "c1", changed) is None
+
+
+def test_fingerprint_tracks_provider_model_and_sections(monkeypatch):
+    assert "services.etl.sections" in incremental.EXTRACTOR_MODULES["enhanced"]
+    monkeypatch.setenv("EXTRACTOR_LLM", "openai")
+    openai_fp = incremental.fingerprint("llm", model="gpt-4-turbo-preview")
+    monkeypatch.setenv("EXTRACTOR_LLM", "anthropic")
+    assert incremental.fingerprint("llm", model="gpt-4-turbo-preview") != openai_fp
+    sm = incremental.fingerprint("spacy", model="en_core_sci_sm")
+    assert incremental.fingerprint("spacy", model="en_core_web_sm") != sm
+    record = incremental.state_record("a.json", "a", "c1", sm, [])
+    assert incremental.reusable_entities(record, "a", "c1", sm) == []
+
+
+def test_local_limit_extracts_exactly_limit_notes(local_notes, monkeypatch):
+    extracted = []
+    extract = local_notes.extract_entities
+
+    def counting_extract(note_payload, note_id):
+        extracted.append(note_id)
+        return extract(note_payload, note_id)
+
+    monkeypatch.setattr(local_notes, "extract_entities", counting_extract)
+    monkeypatch.setenv("LIMIT", "5")
+    emitter = local_notes.EntityEmitter(workers=1)
+    rows = list(emitter)
+    assert emitter.notes_seen == 5 and len(extracted) == 5
+    assert {row["note_id"] for row in rows} <= set(extracted)
+
+    pooled = local_notes.EntityEmitter(workers=2)
+    assert list(pooled) == rows and pooled.notes_seen == 5
+
+
+def test_local_limit_sizes_batches_to_what_is_left(local_notes, monkeypatch):
+    class FakeBatchExtractor:
+        model_name = "fake"
+        batch_size = 4
+
+        def __init__(self):
+            self.batches = []
+
+        def extract_batch(self, notes, run_id):
+            self.batches.append([note["note_id"] for note in notes])
+            return [[] for _ in notes]
+
+    fake = FakeBatchExtractor()
+    monkeypatch.setattr(local_notes, "EXTRACTOR_NAME", "spacy")
+    monkeypatch.setattr(local_notes, "spacy_extractor", fake)
+    monkeypatch.setenv("LIMIT", "5")
+    emitter = local_notes.EntityEmitter(workers=1)
+    list(emitter)
+    # note_000 has no note_id, so the first batch holds only three notes
+    assert fake.batches == [
+        ["note_001", "note_002", "note_003"],
+        ["note_004", "note_005"],
+    ]
+    assert emitter.notes_seen == 5
+
+
+def test_packed_corpus_round_trips_and_reads_like_directory(tmp_path):
+    notes_dir = tmp_path / "notes"
+    notes_dir.mkdir()
+    (notes_dir / "n2.json").write_text(json.dumps({"note_id": "n2", "text": "é"}))
+    (notes_dir / "n1.json").write_text('{\n  "note_id": "n1",\n  "text": "x"\n}')
+    (notes_dir / "broken.json").write_text("{not json")
+    pack_path = tmp_path / "notes.pack"
+    assert note_corpus.pack(notes_dir, pack_path) == 3
+
+    files = note_corpus.open_corpus(notes_dir)
+    packed = note_corpus.open_corpus(pack_path)
+    assert packed.layout == "packed" and files.layout == "files"
+    assert packed.names() == files.names() == ["broken.json", "n1.json", "n2.json"]
+    for name in ("n1.json", "n2.json"):
+        assert packed.read_bytes(name) == files.read_bytes(name)
+        assert packed.load(name) == files.load(name)
+    assert packed.note_ids() == {"n1": "n1.json", "n2": "n2.json"}
+    with pytest.raises(json.JSONDecodeError):
+        packed.load("broken.json")
+    with pytest.raises(FileNotFoundError):
+        packed.read_bytes("missing.json")
+
+    out = tmp_path / "unpacked"
+    assert note_corpus.unpack(pack_path, out) == 3
+    for path in notes_dir.iterdir():
+        assert (out / path.name).read_bytes() == path.read_bytes()
+    (tmp_path / "not-a-pack").write_text("{}")
+    with pytest.raises(ValueError):
+        note_corpus.open_corpus(tmp_path / "not-a-pack")
+
+
+def _pairwise_greedy_match(golds, preds, relaxed=False):
+    # Reference implementation: first unused matchable prediction per gold.
+    used_gold, used_pred = set(), set()
+    for gi, g in enumerate(golds):
+        for pi, p in enumerate(preds):
+            if pi not in used_pred and matchable(g, p, relaxed=relaxed):
+                used_gold.add(gi)
+                used_pred.add(pi)
+                break
+    return used_gold, used_pred
+
+
+def test_indexed_greedy_match_matches_pairwise_scan():
+    rng = random.Random(0)
+
+    def row():
+        begin = rng.randint(0, 40)
+        return {
+            "note_id": rng.choice(["n1", "n2"]),
+            "entity_type": rng.choice(["PROBLEM", "MEDICATION"]),
+            "norm_text": rng.choice(["cough", " Cough", "fever"]),
+            "begin": begin,
+            "end": begin + rng.randint(0, 10),
+        }
+
+    for _ in range(300):
+        golds = [row() for _ in range(rng.randint(0, 15))]
+        preds = [row() for _ in range(rng.randint(0, 15))]
+        for relaxed in (False, True):
+            expected = _pairwise_greedy_match(golds, preds, relaxed=relaxed)
+            assert greedy_match(golds, preds, relaxed=relaxed) == expected
+
+
+def test_evaluate_all_matches_per_variant_evaluation():
+    rng = random.Random(1)
+    golds, preds = [], []
+    for rows, notes in ((golds, ["n1", "n2", "n3"]), (preds, ["n2", "n3", "n4"])):
+        for _ in range(80):
+            begin = rng.randint(0, 60)
+            rows.append(
+                {
+                    "note_id": rng.choice(notes),
+                    "entity_type": rng.choice(["PROBLEM", "MEDICATION", "TEST"]),
+                    "norm_text": rng.choice(["cough", "fever", "aspirin"]),
+                    "begin": begin,
+                    "end": begin + rng.randint(1, 8),
+                }
+            )
+
+    def counts(g_rows, p_rows, relaxed):
+        tp = fp = fn = 0
+        for entity_type in ("PROBLEM", "MEDICATION"):
+            g_typ = [g for g in g_rows if g["entity_type"] == entity_type]
+            p_typ = [p for p in p_rows if p["entity_type"] == entity_type]
+            used_g, _ = greedy_match(g_typ, p_typ, relaxed=relaxed)
+            tp += len(used_g)
+            fp += len(p_typ) - len(used_g)
+            fn += len(g_typ) - len(used_g)
+        return tp, fp, fn
+
+    shared = {"n2", "n3"}
+    inter_g = [g for g in golds if g["note_id"] in shared]
+    inter_p = [p for p in preds if p["note_id"] in shared]
+    result = evaluate_all(golds, preds, extra_fp={"PROBLEM": 5})
+    for variant, (g_rows, p_rows, relaxed, extra) in {
+        "strict_exact": (golds, preds, False, 5),
+        "strict_relaxed": (golds, preds, True, 5),
+        "intersection_exact": (inter_g, inter_p, False, 0),
+        "intersection_relaxed": (inter_g, inter_p, True, 0),
+    }.items():
+        tp, fp, fn = counts(g_rows, p_rows, relaxed)
+        per_type = result["variants"][variant]["per_type"].values()
+        assert sum(row["tp"] for row in per_type) == tp
+        assert sum(row["fp"] for row in per_type) == fp + extra
+        assert sum(row["fn"] for row in per_type) == fn
+    assert result["intersection_notes"] == 2
+    assert etl_cloud.evaluate_all is evaluate_all
+    assert (
+        sum(c["exact"]["tp"] for c in result["per_note"].values())
+        == counts(golds, preds, False)[0]
+    )
+
+
+def test_parquet_part_round_trips_and_is_preferred(tmp_path):
+    pytest.importorskip("pyarrow")
+    rows = [
+        {
+            "note_id": "n1",
+            "run_id": "T",
+            "entity_type": "PROBLEM",
+            "text": "Asthma",
+            "norm_text": "asthma",
+            "begin": 3,
+            "end": 9,
+            "score": 0.9,
+            "section": "plan",
+        },
+        {
+            "note_id": "n2",
+            "run_id": "T",
+            "entity_type": "MEDICATION",
+            "text": "aspirin",
+            "norm_text": "aspirin",
+            "begin": 0,
+            "end": 7,
+            "score": 1.0,
+            "section": "plan",
+            "source": "enhanced-rule",
+        },
+    ]
+    run_dir = tmp_path / "run=T"
+    run_dir.mkdir()
+    (run_dir / "part-000.jsonl").write_text(json.dumps(rows[0]) + "\n")
+    writer = columnar.LocalParquetWriter(run_dir / "part-000.parquet", batch_rows=1)
+    for row in rows:
+        writer.write(row)
+    writer.commit()
+
+    assert columnar.read_parquet_rows(run_dir / "part-000.parquet") == rows
+    df = load_entities_for_run(str(tmp_path), "T")
+    assert list(df["note_id"]) == ["n1", "n2"]
+    assert isinstance(df["entity_type"].dtype, pd.CategoricalDtype)
+    assert columnar.read_entity_rows(run_dir / "part-000.jsonl") == rows
+    (run_dir / "part-000.parquet").unlink()
+    assert columnar.read_entity_rows(run_dir / "part-000.jsonl") == rows[:1]
+    assert columnar.read_entity_rows(tmp_path / "run=none" / "part-000.jsonl") == []
+
+
 def test_spacy_extract_basic():
     # Basic smoke test for Spacy extractor
     text = "Patient has diabetes and takes metformin 500mg."
@@ -35,3 +499,393 @@ def test_spacy_extract_basic():
 
     # Just ensure it runs without error and returns list
     assert isinstance(ents, list)
+
+
+def test_spacy_extract_batch_matches_per_note():
+    from services.extractors.spacy_extract import SpacyExtractor
+
+    extractor = SpacyExtractor(batch_size=2)
+    assert "parser" not in extractor.nlp.pipe_names
+    notes = [
+        {"note_id": "s1", "text": "Patient has diabetes and takes metformin 500mg."},
+        {"note_id": "s2", "text": "   "},
+        {"note_id": "s3", "text": "Asthma treated with albuterol; denies fever."},
+    ]
+    batch = extractor.extract_batch(notes, "TEST")
+    assert batch == [extractor.extract(n["text"], n["note_id"], "TEST") for n in notes]
+    assert batch[1] == []
+
+
+FAKE_SPACY_WORKER = """
+import json, sys
+print(json.dumps({"ready": True, "model": "fake"}), flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    if request["text"] == "crash":
+        sys.exit(1)
+    entities = [{"note_id": request["note_id"], "text": request["text"]}]
+    print(json.dumps({"id": request["id"], "entities": entities}), flush=True)
+"""
+
+
+def test_spacy_worker_pipelines_requests_and_restarts():
+    import sys
+
+    from services.extractors.docker_spacy_extract import SpacyWorker, WorkerError
+
+    worker = SpacyWorker([sys.executable, "-c", FAKE_SPACY_WORKER], request_timeout=10)
+    payloads = [{"text": f"t{i}", "note_id": f"n{i}"} for i in range(500)]
+    results = worker.request(payloads)
+    assert [r[0]["note_id"] for r in results] == [p["note_id"] for p in payloads]
+    assert worker.model_name == "fake" and worker.starts == 1
+
+    with pytest.raises(WorkerError):
+        worker.request([{"text": "crash", "note_id": "x"}])
+    assert worker.request(payloads[:1]) == [[{"note_id": "n0", "text": "t0"}]]
+    assert worker.starts == 2
+    worker.close()
+
+
+def test_docker_spacy_rebuilds_image_when_sources_change(monkeypatch, tmp_path):
+    import subprocess
+    from types import SimpleNamespace
+
+    from services.extractors import docker_spacy_extract as docker_spacy
+
+    dockerfile, script = tmp_path / "Dockerfile.spacy", tmp_path / "standalone.py"
+    dockerfile.write_text("FROM python:3.11-slim\n")
+    script.write_text("print('v1')\n")
+    monkeypatch.setattr(docker_spacy, "DOCKERFILE_PATH", dockerfile)
+    monkeypatch.setattr(docker_spacy, "STANDALONE_PATH", script)
+    built = set()
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        if cmd[:2] == ["docker", "images"]:
+            return SimpleNamespace(stdout="abc123\n" if cmd[-1] in built else "")
+        built.update(cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-t")
+        return SimpleNamespace(stdout="")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    extractor = object.__new__(docker_spacy.DockerSpacyExtractor)
+    first = docker_spacy.image_tag()
+    extractor._ensure_image_built()
+    extractor._ensure_image_built()
+    assert [c[1] for c in calls] == ["images", "build", "images"]
+    assert first in built and first in docker_spacy.worker_command("docker")
+
+    # An image built from an older standalone script is not reused
+    script.write_text("print('v2')\n")
+    assert docker_spacy.image_tag() != first
+    extractor._ensure_image_built()
+    assert [c[1] for c in calls[3:]] == ["images", "build"]
+
+
+def test_spacy_standalone_serve_answers_in_order():
+    import io
+
+    from services.extractors import spacy_extract_standalone as standalone
+
+    requests = [
+        {"id": 0, "text": "Patient has diabetes.", "note_id": "a", "run_id": "T"},
+        {"id": 1, "text": "", "note_id": "b", "run_id": "T"},
+    ]
+    stdin = io.StringIO("".join(json.dumps(r) + "\n" for r in requests) + "bad\n")
+    stdout = io.StringIO()
+    standalone.serve(stdin, stdout)
+    lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert lines[0]["ready"] is True
+    assert [line["id"] for line in lines[1:]] == [0, 1, None]
+    assert lines[2]["entities"] == [] and "error" in lines[3]
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """A local OpenAI-compatible server that the real SDK client talks to."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Provider:
+        lock = threading.Lock()
+        rate_limited = 0  # 429s to answer before serving completions
+        retry_after = "0"
+        requests = in_flight = max_in_flight = 0
+        notes: list = []  # note text of every completed request
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with Provider.lock:
+                Provider.requests += 1
+                Provider.in_flight += 1
+                Provider.max_in_flight = max(Provider.max_in_flight, Provider.in_flight)
+                limited = Provider.rate_limited > 0
+                Provider.rate_limited -= limited
+            time.sleep(0.02)
+            if limited:
+                status, headers = 429, {"Retry-After": Provider.retry_after}
+                payload = {"error": {"message": "slow down", "type": "requests"}}
+            else:
+                status, headers = 200, {}
+                prompt = body["messages"][-1]["content"]
+                note = prompt.split("clinical note:\n\n")[1].split("\n\nReturn")[0]
+                Provider.notes.append(note)
+                content = json.dumps([{"text": note, "entity_type": "PROBLEM"}])
+                payload = {
+                    "id": f"chatcmpl-{Provider.requests}",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                }
+            with Provider.lock:
+                Provider.in_flight -= 1
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("EXTRACTOR_LLM", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    try:
+        yield Provider
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_async_llm_extractor_bounds_concurrency_and_retries_429(fake_openai):
+    import asyncio
+
+    import openai
+
+    from services.extractors.llm_async import (
+        AsyncLLMExtractor,
+        retry_after_s,
+        status_code,
+    )
+    from services.extractors.llm_cache import LLMResponseCache
+    from services.extractors.llm_extract import LLMExtractor
+
+    # The SDK's own exception carries the status and Retry-After we act on
+    fake_openai.rate_limited, fake_openai.retry_after = 1, "1.5"
+    with pytest.raises(openai.RateLimitError) as raised:
+        asyncio.run(LLMExtractor(cache=LLMResponseCache(None)).acomplete("x"))
+    assert status_code(raised.value) == 429
+    assert retry_after_s(raised.value) == 1.5
+
+    fake_openai.rate_limited, fake_openai.retry_after = 1, "0"
+    fake_openai.requests = fake_openai.max_in_flight = 0
+    llm = LLMExtractor(cache=LLMResponseCache(None))
+    extractor = AsyncLLMExtractor(llm, rpm=6000, tpm=1e9, concurrency=4)
+    notes = [{"note_id": f"n{i}", "text": f"asthma {i}"} for i in range(20)]
+    notes[5] = None
+    try:
+        results = list(extractor.extract_stream(notes, "TEST"))
+    finally:
+        extractor.close()
+    assert results[5] is None
+    for note, result in zip(notes, results):
+        if note is not None:
+            assert [e["text"] for e in result[0]] == [note["text"]]
+            assert result[0][0]["note_id"] == note["note_id"]
+    assert extractor.retries == 1 and extractor.failures == 0
+    assert extractor.scheduler.paused_until > 0
+    assert fake_openai.requests == 20
+    assert 1 < fake_openai.max_in_flight <= 4
+
+
+def test_local_limit_stops_the_async_llm_feed(fake_openai, local_notes, monkeypatch):
+    from services.extractors.llm_async import AsyncLLMExtractor
+    from services.extractors.llm_cache import LLMResponseCache
+    from services.extractors.llm_extract import LLMExtractor
+
+    llm = LLMExtractor(cache=LLMResponseCache(None))
+    extractor = AsyncLLMExtractor(llm, rpm=6000, tpm=1e9, concurrency=4)
+    monkeypatch.setattr(local_notes, "EXTRACTOR_NAME", "llm")
+    monkeypatch.setattr(local_notes, "llm_extractor", llm)
+    monkeypatch.setattr(local_notes, "llm_async_extractor", extractor)
+    monkeypatch.setenv("LIMIT", "3")
+    emitter = local_notes.EntityEmitter(workers=1)
+    try:
+        rows = list(emitter)
+    finally:
+        extractor.close()
+    # The window holds 8 notes, but only the first 3 are ever requested
+    first = [f"note_00{i}" for i in (1, 2, 3)]
+    texts = [
+        normalize_text(local_notes.notes_corpus().load(f"{nid}.json")["text"])
+        for nid in first
+    ]
+    assert emitter.notes_seen == 3
+    assert {row["note_id"] for row in rows} <= set(first)
+    assert fake_openai.notes
+    assert all(any(note in text for text in texts) for note in fake_openai.notes)
+
+
+def test_llm_response_cache_evicts_lru_and_replays(tmp_path):
+    from services.extractors.llm_cache import (
+        LLMCacheMiss,
+        LLMResponseCache,
+        request_hash,
+    )
+
+    path = str(tmp_path / "llm.sqlite")
+    cache = LLMResponseCache(path, max_bytes=25)
+    keys = [request_hash({"messages": [{"content": f"p{i}"}]}) for i in range(3)]
+    cache.put("openai", "m", keys[0], "a" * 10)
+    cache.put("openai", "m", keys[1], "b" * 10)
+    assert cache.get("openai", "m", keys[0]) == "a" * 10
+    assert cache.get("anthropic", "m", keys[0]) is None
+    cache.put("openai", "m", keys[2], "c" * 10)
+    # keys[1] was least recently used
+    assert cache.get("openai", "m", keys[1]) is None
+    assert cache.evicted == 1 and cache.bytes == 20
+    cache.close()
+
+    replay = LLMResponseCache(path, mode="replay")
+    assert replay.get("openai", "m", keys[2]) == "c" * 10
+    replay.put("openai", "m", keys[1], "b" * 10)
+    with pytest.raises(LLMCacheMiss):
+        replay.get("openai", "m", keys[1])
+    replay.close()
+    with pytest.raises(LLMCacheMiss):
+        LLMResponseCache(str(tmp_path / "missing.sqlite"), mode="replay").get(
+            "openai", "m", keys[0]
+        )
+
+
+def test_llm_merge_chunks_keeps_a_term_repeated_across_the_seam():
+    from services.extractors.llm_chunk import merge_chunks
+
+    filler = "Seen today, doing well. " * 4
+    text = f"wheezing at night. {filler}wheezing on exam. {filler}wheezing persists."
+    first, second, third = (m.start() for m in re.finditer("wheezing", text))
+    # The second mention sits in the overlap, before its midpoint
+    spans = [(0, second + 40), (second - 10, len(text))]
+    assert (spans[0][1] + spans[1][0]) // 2 > second
+    # parse_response places each chunk's entity at its first occurrence
+    results = [
+        [{"text": "wheezing", "entity_type": "PROBLEM", "begin": 0, "end": 8}],
+        [
+            {
+                "text": "wheezing",
+                "entity_type": "PROBLEM",
+                "begin": second - spans[1][0],
+                "end": second - spans[1][0] + 8,
+            }
+        ],
+    ]
+    merged = merge_chunks(text, spans, results)
+    assert [e["begin"] for e in merged] == [first, third]
+    assert all(text[e["begin"] : e["end"]] == "wheezing" for e in merged)
+
+
+def test_judge_replays_from_cache_without_an_api_key(tmp_path, monkeypatch):
+    from services.eval import judge
+    from services.extractors.llm_cache import LLMResponseCache
+
+    class RecordingClient:
+        class messages:
+            @staticmethod
+            def create(**request):
+                reply = {"precision_score": 7, "recall_score": 6, "reasoning": "ok"}
+                text = json.dumps(reply)
+                return type("Msg", (), {"content": [type("C", (), {"text": text})]})
+
+    by_note = {
+        f"n{i}": [{"entity_type": "PROBLEM", "text": "asthma"}] for i in range(8)
+    }
+    monkeypatch.setattr(judge, "load_enriched_data", lambda: by_note)
+    monkeypatch.setattr(judge, "get_original_text", lambda nid: f"{nid}: asthma")
+    monkeypatch.setattr(judge, "JUDGE_OUTPUT", str(tmp_path / "judge.json"))
+    monkeypatch.setattr(judge, "JUDGE_SEED", "7")
+    monkeypatch.setattr(judge.time, "sleep", lambda s: None)
+    path = str(tmp_path / "llm.sqlite")
+    monkeypatch.setattr(judge, "shared_cache", lambda: LLMResponseCache(path))
+    monkeypatch.setattr(
+        judge, "get_llm_client", lambda: ("anthropic", RecordingClient())
+    )
+    judge.main()
+    recorded = json.loads((tmp_path / "judge.json").read_text())
+
+    def no_client():
+        raise RuntimeError("No API key found for LLM Judge")
+
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(judge, "get_llm_client", no_client)
+    replay = LLMResponseCache(path, mode="replay")
+    monkeypatch.setattr(judge, "shared_cache", lambda: replay)
+    judge.main()
+    replayed = json.loads((tmp_path / "judge.json").read_text())
+    assert replayed["details"] == recorded["details"]
+    assert replay.hits == 5 and replay.misses == 0
+
+    monkeypatch.setattr(judge, "JUDGE_SEED", None)
+    with pytest.raises(SystemExit):
+        judge.main()
+
+
+def test_llm_chunked_extract_maps_offsets_and_drops_seam_duplicates(monkeypatch):
+    from services.extractors import llm_extract
+    from services.extractors.llm_cache import LLMResponseCache
+    from services.extractors.llm_chunk import chunk_spans
+
+    terms = ["asthma", "metformin", "chest pain"]
+
+    class FakeLLM(llm_extract.LLMExtractor):
+        def __init__(self):
+            self.provider = self.model = "fake"
+            self.cache = LLMResponseCache(None)
+            self.prompts = []
+
+        def build_prompt(self, text):
+            return text
+
+        def _complete(self, prompt):
+            self.prompts.append(prompt)
+            found = [
+                {"text": t, "entity_type": "PROBLEM"} for t in terms if t in prompt
+            ]
+            return json.dumps(found)
+
+    filler = "Patient was seen today and is doing well overall. " * 12
+    text = (
+        f"History of present illness: {filler}asthma since childhood.\n"
+        f"Medications: {filler}metformin daily.\n"
+        f"Assessment: {filler}no chest pain."
+    )
+    spans = chunk_spans(text, max_chars=800, overlap=120)
+    assert len(spans) == 3 and spans[0][0] == 0 and spans[-1][1] == len(text)
+    assert all(e - b <= 800 for b, e in spans)
+    assert all(b < prev_end for (_, prev_end), (b, _) in zip(spans, spans[1:]))
+    # Chunks end at section headings, and "asthma" sits in the first overlap
+    assert text[spans[0][1] :].startswith("Medications")
+    assert text.index("asthma") >= spans[1][0]
+
+    monkeypatch.setattr(llm_extract, "chunk_spans", lambda t: chunk_spans(t, 800, 120))
+    llm = FakeLLM()
+    entities = llm.extract(text, "n1", "TEST")
+    assert len(llm.prompts) == 3
+    assert [e["text"] for e in entities] == terms
+    for ent in entities:
+        assert text[ent["begin"] : ent["end"]] == ent["text"]
+        assert ent["note_id"] == "n1"